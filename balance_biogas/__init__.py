@@ -0,0 +1,70 @@
+# balance_biogas/__init__.py
+"""Motor de cálculo del balance energético de plantas de biogás (sin dependencia de Streamlit).
+
+Las funciones escalares solo dependen de la biblioteca estándar y se importan
+de inmediato; el motor vectorizado (NumPy) y los exportadores se cargan la
+primera vez que se accede a ellos, para que importar el paquete sea casi
+instantáneo.
+"""
+from importlib import import_module
+
+from .calculos import (
+    CLAVES_DIMENSIONES,
+    CLAVES_RESULTADOS,
+    ENTRADAS_POR_DEFECTO,
+    PCI_CH4_MJ_NM3,
+    calcular_dimensiones_digestor,
+    realizar_calculos_balance,
+)
+
+# Nombre público -> submódulo que lo define (carga diferida)
+_ATRIBUTOS_DIFERIDOS = {
+    "calcular_dimensiones_digestor_lote": ".vectorizado",
+    "evaluar_escenarios_lote": ".vectorizado",
+    "realizar_calculos_balance_lote": ".vectorizado",
+    "sanitize_text_for_fpdf": ".exportar",
+    "generar_excel_bytes": ".exportar",
+    "generar_pdf_bytes": ".exportar",
+    "generar_excel_bytes_cacheado": ".exportar",
+    "generar_pdf_bytes_cacheado": ".exportar",
+    "generar_excel_escenarios": ".exportar",
+    "generar_informes_zip": ".informes",
+    "resolver_equilibrio": ".solver",
+    "resolver_equilibrio_lote": ".solver",
+    "CatalogoSustratos": ".sustratos",
+    "evaluar_mezclas": ".sustratos",
+    "balance_mezclas": ".sustratos",
+    "buscar_mezcla_optima": ".sustratos",
+    "analisis_tornado": ".sensibilidad",
+    "barrido_parametro": ".sensibilidad",
+    "rejilla_sensibilidad": ".sensibilidad",
+    "Perfilador": ".perfilado",
+    "ServicioBalance": ".servicio",
+    "GrafoBalance": ".grafo",
+    "AlmacenEscenarios": ".almacen",
+    "simular_transitorio": ".transitorio",
+    "simular_transitorio_lote": ".transitorio",
+}
+
+__all__ = [
+    "CLAVES_DIMENSIONES",
+    "CLAVES_RESULTADOS",
+    "ENTRADAS_POR_DEFECTO",
+    "PCI_CH4_MJ_NM3",
+    "calcular_dimensiones_digestor",
+    "realizar_calculos_balance",
+    *_ATRIBUTOS_DIFERIDOS,
+]
+
+
+def __getattr__(nombre):
+    modulo = _ATRIBUTOS_DIFERIDOS.get(nombre)
+    if modulo is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+    valor = getattr(import_module(modulo, __name__), nombre)
+    globals()[nombre] = valor
+    return valor
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
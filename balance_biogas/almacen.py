@@ -0,0 +1,243 @@
+# balance_biogas/almacen.py
+"""Almacén persistente de escenarios con esquema numérico fijo y columnas en memoria mapeada.
+
+    almacen = AlmacenEscenarios("escenarios/")
+    almacen.agregar(inputs_balance, results, dim_digestor, etiqueta="Planta A")
+    almacen.agregar_lote(columnas, etiqueta="Cartera 2025")     # entradas + salidas del motor vectorizado
+    deficit = almacen.filtrar({"calor_neto_disponible_mj_dia": (-500, 0)})
+    mejores = almacen.top("electricidad_neta_exportable_kwh_dia", 10)
+    tabla = almacen.filas(mejores)                               # array estructurado solo con esas filas
+
+El esquema (``ESQUEMA_ESCENARIOS``) tiene la fecha, las entradas numéricas y
+las salidas en float64, más una etiqueta de 32 bytes (UTF-8). Cada campo se
+guarda en su propio fichero binario (``<campo>.bin``) dentro del directorio y
+se lee con ``numpy.memmap``: un filtro solo toca las columnas que usa y
+``filas`` solo las filas que se muestran. Las consultas recorren las columnas
+por bloques, con memoria acotada aunque haya millones de escenarios.
+
+Las filas se añaden al final de cada columna; al abrir el almacén se recortan
+las columnas más largas que la más corta, así que una escritura interrumpida
+no deja filas a medias. Los campos nuevos del esquema se añaden a un almacén
+existente rellenos con NaN. Solo un proceso debe escribir a la vez.
+
+La aplicación usa el directorio de la variable de entorno ``BALANCE_ALMACEN``
+(por defecto ``~/.balance_biogas/escenarios``).
+"""
+import datetime
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from .calculos import CLAVES_DIMENSIONES, CLAVES_RESULTADOS, ENTRADAS_POR_DEFECTO
+
+CAMPOS_ENTRADA = tuple(ENTRADAS_POR_DEFECTO) + ("densidad_sustrato_kg_m3",)
+CAMPOS_SALIDA = CLAVES_DIMENSIONES + CLAVES_RESULTADOS
+ESQUEMA_ESCENARIOS = np.dtype(
+    [("fecha_unix", "f8")] + [(campo, "f8") for campo in CAMPOS_ENTRADA + CAMPOS_SALIDA] + [("etiqueta", "S32")]
+)
+TAM_BLOQUE_CONSULTA = 1_000_000
+RUTA_ALMACEN_POR_DEFECTO = os.environ.get("BALANCE_ALMACEN", os.path.join(os.path.expanduser("~"), ".balance_biogas", "escenarios"))
+_FICHERO_ESQUEMA = "esquema.json"
+
+
+def _codificar_etiqueta(etiqueta, tamano):
+    # Recorte en bytes sin partir caracteres UTF-8
+    return str(etiqueta).encode("utf-8")[:tamano].decode("utf-8", "ignore").encode("utf-8")
+
+
+class AlmacenEscenarios:
+    """Escenarios del balance en un directorio, una columna por fichero (ver el docstring del módulo)."""
+
+    def __init__(self, ruta, esquema=ESQUEMA_ESCENARIOS):
+        self.ruta = ruta
+        self.esquema = esquema
+        self._cerrojo = threading.Lock()
+        self._mapas = {}
+        os.makedirs(ruta, exist_ok=True)
+
+        ruta_esquema = os.path.join(ruta, _FICHERO_ESQUEMA)
+        guardado = {}
+        if os.path.exists(ruta_esquema):
+            with open(ruta_esquema, encoding="utf-8") as fichero:
+                guardado = dict(json.load(fichero)["campos"])
+        distintos = [campo for campo in esquema.names if campo in guardado and np.dtype(guardado[campo]) != esquema[campo]]
+        if distintos:
+            raise ValueError(f"El almacén de {ruta} tiene otro tipo para: {', '.join(distintos)}")
+        self._n = min((self._filas_en_fichero(campo) for campo in esquema.names if campo in guardado), default=0)
+        for campo in esquema.names:
+            with open(self._ruta_campo(campo), "ab") as fichero:
+                if campo not in guardado:
+                    fichero.write(self._relleno(campo, self._n).tobytes())
+                fichero.truncate(self._n * esquema[campo].itemsize)
+        temporal = f"{ruta_esquema}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as fichero:
+            json.dump({"version": 1, "campos": [[campo, esquema[campo].str] for campo in esquema.names]}, fichero, indent=1)
+        os.replace(temporal, ruta_esquema)
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def campos_numericos(self):
+        return tuple(campo for campo in self.esquema.names if self.esquema[campo].kind == "f")
+
+    def _ruta_campo(self, campo):
+        return os.path.join(self.ruta, f"{campo}.bin")
+
+    def _filas_en_fichero(self, campo):
+        ruta = self._ruta_campo(campo)
+        return os.path.getsize(ruta) // self.esquema[campo].itemsize if os.path.exists(ruta) else 0
+
+    def _relleno(self, campo, n):
+        return np.full(n, b"" if self.esquema[campo].kind == "S" else np.nan, dtype=self.esquema[campo])
+
+    def recargar(self):
+        """Vuelve a contar las filas (p. ej. tras añadir escenarios desde otro proceso)."""
+        n = min(self._filas_en_fichero(campo) for campo in self.esquema.names)
+        if n != self._n:
+            with self._cerrojo:
+                self._n = n
+                self._mapas.clear()
+        return n
+
+    def columna(self, campo):
+        """Columna completa como ``memmap`` de solo lectura (no se copia a memoria)."""
+        if campo not in self.esquema.names:
+            raise ValueError(f"Campo desconocido: {campo!r}")
+        mapa = self._mapas.get(campo)
+        if mapa is None or len(mapa) != self._n:
+            if self._n == 0:
+                return np.empty(0, dtype=self.esquema[campo])
+            mapa = np.memmap(self._ruta_campo(campo), dtype=self.esquema[campo], mode="r", shape=(self._n,))
+            self._mapas[campo] = mapa
+        return mapa
+
+    def agregar_lote(self, columnas, etiqueta="", fecha_unix=None):
+        """Añade una fila por elemento de ``columnas`` (campo -> array o escalar) y devuelve el rango de ids.
+
+        Los campos ausentes quedan en NaN; las columnas de texto que no son del
+        esquema se ignoran. ``etiqueta`` puede ser un texto o uno por fila.
+        Todas las columnas se convierten antes de escribir; si una escritura
+        falla, los ficheros vuelven a su longitud anterior.
+        """
+        columnas = {campo: valor for campo, valor in columnas.items() if campo in self.esquema.names and campo != "etiqueta"}
+        if isinstance(etiqueta, str):
+            etiqueta = [etiqueta]
+        columnas["etiqueta"] = [_codificar_etiqueta(texto, self.esquema["etiqueta"].itemsize) for texto in etiqueta]
+        columnas.setdefault("fecha_unix", time.time() if fecha_unix is None else fecha_unix)
+        n_nuevas = max(np.size(valor) for valor in columnas.values())
+        bloques = {
+            campo: self._relleno(campo, n_nuevas) if campo not in columnas
+            else np.ascontiguousarray(np.broadcast_to(np.asarray(columnas[campo], dtype=self.esquema[campo]), (n_nuevas,)))
+            for campo in self.esquema.names
+        }
+        with self._cerrojo:
+            primera = self._n
+            try:
+                for campo in self.esquema.names:
+                    with open(self._ruta_campo(campo), "ab") as fichero:
+                        fichero.write(bloques[campo].tobytes())
+            except BaseException:
+                self._truncar(primera)
+                raise
+            self._n += n_nuevas
+            self._mapas.clear()
+        return range(primera, primera + n_nuevas)
+
+    def _truncar(self, n):
+        for campo in self.esquema.names:
+            with open(self._ruta_campo(campo), "ab") as fichero:
+                fichero.truncate(n * self.esquema[campo].itemsize)
+
+    def agregar(self, entradas, resultados, dimensiones=None, etiqueta=""):
+        """Añade un escenario a partir de los diccionarios de la interfaz y devuelve su id."""
+        fila = {**entradas, **(dimensiones or {}), **resultados}
+        fila = {campo: valor for campo, valor in fila.items() if not isinstance(valor, str)}
+        return self.agregar_lote(fila, etiqueta)[0]
+
+    def _mascara(self, filtros, inicio, fin):
+        mascara = np.ones(fin - inicio, dtype=bool)
+        for campo, (minimo, maximo) in filtros.items():
+            if campo not in self.campos_numericos:
+                raise ValueError(f"No se puede filtrar por {campo!r}")
+            valores = self.columna(campo)[inicio:fin]
+            if minimo is not None:
+                mascara &= valores >= minimo
+            if maximo is not None:
+                mascara &= valores <= maximo
+        return mascara
+
+    def filtrar(self, filtros=None, limite=None):
+        """Ids (ascendentes) de los escenarios que cumplen ``filtros`` = {campo: (mínimo, máximo)}; ``None`` = sin límite."""
+        filtros = filtros or {}
+        encontrados = []
+        total = 0
+        for inicio in range(0, self._n, TAM_BLOQUE_CONSULTA):
+            ids = np.flatnonzero(self._mascara(filtros, inicio, min(inicio + TAM_BLOQUE_CONSULTA, self._n))) + inicio
+            encontrados.append(ids)
+            total += len(ids)
+            if limite is not None and total >= limite:
+                break
+        ids = np.concatenate(encontrados) if encontrados else np.empty(0, dtype=np.int64)
+        return ids if limite is None else ids[:limite]
+
+    def contar(self, filtros=None):
+        filtros = filtros or {}
+        return sum(
+            int(np.count_nonzero(self._mascara(filtros, inicio, min(inicio + TAM_BLOQUE_CONSULTA, self._n))))
+            for inicio in range(0, self._n, TAM_BLOQUE_CONSULTA)
+        )
+
+    def top(self, campo, n=10, filtros=None, descendente=True):
+        """Ids de los ``n`` escenarios con mayor (o menor) ``campo`` entre los que cumplen ``filtros``, ordenados."""
+        if campo not in self.campos_numericos:
+            raise ValueError(f"No se puede ordenar por {campo!r}")
+        filtros = filtros or {}
+        signo = -1.0 if descendente else 1.0
+        candidatos_ids, candidatos_valores = [], []
+        for inicio in range(0, self._n, TAM_BLOQUE_CONSULTA):
+            fin = min(inicio + TAM_BLOQUE_CONSULTA, self._n)
+            valores = signo * np.asarray(self.columna(campo)[inicio:fin])
+            ids = np.flatnonzero(self._mascara(filtros, inicio, fin) & ~np.isnan(valores))
+            if len(ids) > n:
+                ids = ids[np.argpartition(valores[ids], n - 1)[:n]]
+            candidatos_ids.append(ids + inicio)
+            candidatos_valores.append(valores[ids])
+        if not candidatos_ids:
+            return np.empty(0, dtype=np.int64)
+        ids, valores = np.concatenate(candidatos_ids), np.concatenate(candidatos_valores)
+        orden = np.argsort(valores, kind="stable")[:n]
+        return ids[orden]
+
+    def filas(self, ids, campos=None):
+        """Array estructurado (con ``id``) de las filas ``ids``; solo se leen esas filas de cada columna."""
+        ids = np.asarray(ids, dtype=np.int64)
+        campos = list(self.esquema.names if campos is None else campos)
+        resultado = np.empty(len(ids), dtype=[("id", "i8")] + [(campo, self.esquema[campo]) for campo in campos])
+        resultado["id"] = ids
+        for campo in campos:
+            resultado[campo] = self.columna(campo)[ids]
+        return resultado
+
+    def claves_registros(self, campos=None):
+        """Claves, en orden, de los diccionarios que devuelve ``registros`` con estos ``campos``."""
+        campos = list(self.esquema.names if campos is None else campos)
+        claves = ["id"] + [campo for campo in campos if campo != "fecha_unix"]
+        return claves + ["fecha"] if "fecha_unix" in campos else claves
+
+    def registros(self, ids, campos=None):
+        """Como ``filas`` pero en diccionarios, con la etiqueta como texto y la fecha en ISO 8601."""
+        filas = self.filas(ids, campos)
+        registros = []
+        for fila in filas.tolist():
+            registro = dict(zip(filas.dtype.names, fila))
+            if "etiqueta" in registro:
+                registro["etiqueta"] = registro["etiqueta"].decode("utf-8", "ignore")
+            if "fecha_unix" in registro:
+                fecha = registro.pop("fecha_unix")
+                registro["fecha"] = datetime.datetime.fromtimestamp(fecha).isoformat(timespec="seconds") if fecha == fecha else None
+            registros.append(registro)
+        return registros
@@ -0,0 +1,67 @@
+# balance_biogas/cache.py
+"""Caché LRU acotada y hash de contenido para memoizar resultados costosos."""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+def hash_contenido(*objetos):
+    """Hash estable (SHA-256) de estructuras JSON-serializables (dicts, listas, números, texto)."""
+    contenido = json.dumps(objetos, sort_keys=True, ensure_ascii=False, default=str, separators=(",", ":"))
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+class CacheLRU:
+    """Diccionario con expulsión del elemento usado hace más tiempo al superar ``max_entradas``.
+
+    Es segura entre hilos (Streamlit atiende cada sesión en un hilo distinto).
+    """
+
+    def __init__(self, max_entradas=64):
+        if max_entradas < 1:
+            raise ValueError("max_entradas debe ser al menos 1")
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()
+        self._cerrojo = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def __len__(self):
+        return len(self._datos)
+
+    def __contains__(self, clave):
+        return clave in self._datos
+
+    def get(self, clave, por_defecto=None):
+        with self._cerrojo:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return self._datos[clave]
+            self.fallos += 1
+            return por_defecto
+
+    def put(self, clave, valor):
+        with self._cerrojo:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def obtener_o_calcular(self, clave, funcion, *args, **kwargs):
+        """Devuelve el valor cacheado o lo calcula con ``funcion`` y lo guarda (salvo si es ``None``)."""
+        valor = self.get(clave, _AUSENTE)
+        if valor is _AUSENTE:
+            valor = funcion(*args, **kwargs)
+            if valor is not None:
+                self.put(clave, valor)
+        return valor
+
+    def clear(self):
+        with self._cerrojo:
+            self._datos.clear()
+            self.aciertos = self.fallos = 0
+
+
+_AUSENTE = object()
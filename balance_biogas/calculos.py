@@ -0,0 +1,155 @@
+# balance_biogas/calculos.py
+"""Funciones de cálculo escalares del balance (solo biblioteca estándar)."""
+import math
+
+from .upgrading import CLAVES_UPGRADING, calcular_upgrading
+
+PCI_CH4_MJ_NM3 = 35.8
+
+# Índice = uso_biogas_opcion_idx
+OPCIONES_USO_BIOGAS = ("Cogeneración (CHP)", "Caldera", "Upgrading a Biometano")
+
+# Claves de salida de calcular_dimensiones_digestor y realizar_calculos_balance, en orden
+CLAVES_DIMENSIONES = (
+    "volumen_digestor_m3",
+    "diametro_digestor_m",
+    "altura_digestor_m",
+    "area_superficial_digestor_m2",
+)
+CLAVES_RESULTADOS = (
+    "sv_alimentado_kg_dia",
+    "ch4_producido_nm3_dia",
+    "biogas_producido_nm3_dia",
+    "pci_biogas_mj_nm3",
+    "energia_bruta_biogas_mj_dia",
+    "energia_bruta_biogas_kwh_dia",
+    "calor_calentar_sustrato_mj_dia",
+    "perdidas_calor_digestor_mj_dia",
+    "demanda_termica_total_digestor_mj_dia",
+    "demanda_termica_total_digestor_kwh_dia",
+    "electricidad_generada_bruta_kwh_dia",
+    "calor_util_generado_mj_dia",
+    "consumo_electrico_aux_total_kwh_dia",
+    "electricidad_neta_exportable_kwh_dia",
+    "calor_neto_disponible_mj_dia",
+    "calor_neto_disponible_kwh_dia",
+    "consumo_electrico_upgrading_kwh_dia",
+    "consumo_electrico_compresion_kwh_dia",
+    "calor_upgrading_mj_dia",
+    "ch4_perdido_upgrading_nm3_dia",
+    "biometano_neto_nm3_dia",
+    "energia_biometano_kwh_dia",
+)
+
+# Valores por defecto de la interfaz, usados cuando una entrada no se indica
+ENTRADAS_POR_DEFECTO = {
+    'caudal_sustrato_kg_dia': 10000.0,
+    'st_porcentaje': 20.0,
+    'sv_de_st_porcentaje': 80.0,
+    'bmp_nm3_ch4_kg_sv': 0.35,
+    'eficiencia_digestion_porcentaje': 75.0,
+    'ch4_en_biogas_porcentaje': 60.0,
+    'cp_sustrato_kj_kg_c': 4.186,
+    'temp_op_digestor_c': 38.0,
+    'temp_sustrato_entrada_c': 15.0,
+    'u_digestor_w_m2_k': 0.5,
+    'temp_ambiente_promedio_c': 10.0,
+    'uso_biogas_opcion_idx': 0,
+    'chp_eficiencia_electrica_porcentaje': 35.0,
+    'chp_eficiencia_termica_porcentaje': 45.0,
+    'caldera_eficiencia_porcentaje': 85.0,
+    'upgrading_tecnologia_idx': 0,
+    'presion_inyeccion_bar': 16.0,
+    'consumo_electrico_aux_kwh_ton_sustrato': 30.0,
+    'trh_dias': 30.0,
+}
+
+# Rango físico (mínimo, máximo) de las entradas; Monte Carlo y sensibilidad recortan a él sus muestras
+LIMITES_FISICOS = {
+    "st_porcentaje": (0.0, 100.0),
+    "sv_de_st_porcentaje": (0.0, 100.0),
+    "eficiencia_digestion_porcentaje": (0.0, 100.0),
+    "ch4_en_biogas_porcentaje": (0.0, 100.0),
+    "chp_eficiencia_electrica_porcentaje": (0.0, 100.0),
+    "chp_eficiencia_termica_porcentaje": (0.0, 100.0),
+    "caldera_eficiencia_porcentaje": (0.0, 100.0),
+    "bmp_nm3_ch4_kg_sv": (0.0, None),
+    "u_digestor_w_m2_k": (0.0, None),
+    "caudal_sustrato_kg_dia": (0.0, None),
+    "trh_dias": (0.0, None),
+    "presion_inyeccion_bar": (0.0, None),
+}
+
+
+def calcular_dimensiones_digestor(caudal_sustrato_kg_dia, trh_dias, densidad_sustrato_kg_m3=1000):
+    volumen_sustrato_diario_m3 = caudal_sustrato_kg_dia / densidad_sustrato_kg_m3
+    volumen_digestor_m3 = volumen_sustrato_diario_m3 * trh_dias
+    diametro_digestor_m = altura_digestor_m = area_superficial_digestor_m2 = 0.0
+    if volumen_digestor_m3 > 0:
+        diametro_digestor_m = (4 * volumen_digestor_m3 / math.pi)**(1/3)
+        altura_digestor_m = diametro_digestor_m
+        area_superficial_digestor_m2 = 1.5 * math.pi * (diametro_digestor_m**2)
+    return {
+        "volumen_digestor_m3": volumen_digestor_m3,
+        "diametro_digestor_m": diametro_digestor_m,
+        "altura_digestor_m": altura_digestor_m,
+        "area_superficial_digestor_m2": area_superficial_digestor_m2
+    }
+
+
+def realizar_calculos_balance(inputs_calc):
+    results = {}
+    caudal_sustrato_kg_dia = inputs_calc['caudal_sustrato_kg_dia']
+    st_porcentaje = inputs_calc['st_porcentaje']
+    sv_de_st_porcentaje = inputs_calc['sv_de_st_porcentaje']
+    bmp_nm3_ch4_kg_sv = inputs_calc['bmp_nm3_ch4_kg_sv']
+    eficiencia_digestion_porcentaje = inputs_calc['eficiencia_digestion_porcentaje']
+    ch4_en_biogas_porcentaje = inputs_calc['ch4_en_biogas_porcentaje']
+    cp_sustrato_kj_kg_c = inputs_calc['cp_sustrato_kj_kg_c']
+    temp_op_digestor_c = inputs_calc['temp_op_digestor_c']
+    temp_sustrato_entrada_c = inputs_calc['temp_sustrato_entrada_c']
+    u_digestor_w_m2_k = inputs_calc['u_digestor_w_m2_k']
+    area_superficial_digestor_m2 = inputs_calc['area_superficial_digestor_m2']
+    temp_ambiente_promedio_c = inputs_calc['temp_ambiente_promedio_c']
+    uso_biogas_opcion_idx = inputs_calc['uso_biogas_opcion_idx']
+    chp_eficiencia_electrica_porcentaje = inputs_calc.get('chp_eficiencia_electrica_porcentaje', 0)
+    chp_eficiencia_termica_porcentaje = inputs_calc.get('chp_eficiencia_termica_porcentaje', 0)
+    caldera_eficiencia_porcentaje = inputs_calc.get('caldera_eficiencia_porcentaje', 0)
+    upgrading_tecnologia_idx = inputs_calc.get('upgrading_tecnologia_idx', ENTRADAS_POR_DEFECTO['upgrading_tecnologia_idx'])
+    presion_inyeccion_bar = inputs_calc.get('presion_inyeccion_bar', ENTRADAS_POR_DEFECTO['presion_inyeccion_bar'])
+    consumo_electrico_aux_kwh_ton_sustrato = inputs_calc['consumo_electrico_aux_kwh_ton_sustrato']
+
+    results['sv_alimentado_kg_dia'] = caudal_sustrato_kg_dia * (st_porcentaje / 100) * (sv_de_st_porcentaje / 100)
+    results['ch4_producido_nm3_dia'] = results['sv_alimentado_kg_dia'] * bmp_nm3_ch4_kg_sv * (eficiencia_digestion_porcentaje / 100)
+    results['biogas_producido_nm3_dia'] = 0
+    if ch4_en_biogas_porcentaje > 0:
+        results['biogas_producido_nm3_dia'] = results['ch4_producido_nm3_dia'] / (ch4_en_biogas_porcentaje / 100)
+    results['pci_biogas_mj_nm3'] = PCI_CH4_MJ_NM3 * (ch4_en_biogas_porcentaje / 100)
+    results['energia_bruta_biogas_mj_dia'] = results['biogas_producido_nm3_dia'] * results['pci_biogas_mj_nm3']
+    results['energia_bruta_biogas_kwh_dia'] = results['energia_bruta_biogas_mj_dia'] / 3.6
+    results['calor_calentar_sustrato_mj_dia'] = (caudal_sustrato_kg_dia * cp_sustrato_kj_kg_c * (temp_op_digestor_c - temp_sustrato_entrada_c)) / 1000
+    delta_t_digestor_ambiente = temp_op_digestor_c - temp_ambiente_promedio_c
+    results['perdidas_calor_digestor_mj_dia'] = 0.0
+    if delta_t_digestor_ambiente > 0 and area_superficial_digestor_m2 > 0:
+        results['perdidas_calor_digestor_mj_dia'] = (u_digestor_w_m2_k * area_superficial_digestor_m2 * delta_t_digestor_ambiente * 3600 * 24) / 1000000
+    results['demanda_termica_total_digestor_mj_dia'] = results['calor_calentar_sustrato_mj_dia'] + results['perdidas_calor_digestor_mj_dia']
+    results['demanda_termica_total_digestor_kwh_dia'] = results['demanda_termica_total_digestor_mj_dia'] / 3.6
+    results['electricidad_generada_bruta_kwh_dia'] = 0.0
+    results['calor_util_generado_mj_dia'] = 0.0
+    if uso_biogas_opcion_idx == 0: # CHP
+        results['electricidad_generada_bruta_kwh_dia'] = results['energia_bruta_biogas_kwh_dia'] * (chp_eficiencia_electrica_porcentaje / 100)
+        results['calor_util_generado_mj_dia'] = results['energia_bruta_biogas_mj_dia'] * (chp_eficiencia_termica_porcentaje / 100)
+    elif uso_biogas_opcion_idx == 1: # Caldera
+        results['calor_util_generado_mj_dia'] = results['energia_bruta_biogas_mj_dia'] * (caldera_eficiencia_porcentaje / 100)
+    results.update(dict.fromkeys(CLAVES_UPGRADING, 0.0))
+    results['energia_biometano_kwh_dia'] = 0.0
+    if uso_biogas_opcion_idx == 2: # Upgrading
+        results.update(calcular_upgrading(results['biogas_producido_nm3_dia'], results['ch4_producido_nm3_dia'], upgrading_tecnologia_idx, presion_inyeccion_bar))
+        ch4_inyectado_nm3_dia = results['ch4_producido_nm3_dia'] - results['ch4_perdido_upgrading_nm3_dia']
+        results['energia_biometano_kwh_dia'] = ch4_inyectado_nm3_dia * PCI_CH4_MJ_NM3 / 3.6
+    results['consumo_electrico_aux_total_kwh_dia'] = (caudal_sustrato_kg_dia / 1000) * consumo_electrico_aux_kwh_ton_sustrato
+    results['electricidad_neta_exportable_kwh_dia'] = (results['electricidad_generada_bruta_kwh_dia'] - results['consumo_electrico_aux_total_kwh_dia']
+                                                       - results['consumo_electrico_upgrading_kwh_dia'] - results['consumo_electrico_compresion_kwh_dia'])
+    results['calor_neto_disponible_mj_dia'] = results['calor_util_generado_mj_dia'] - results['demanda_termica_total_digestor_mj_dia'] - results['calor_upgrading_mj_dia']
+    results['calor_neto_disponible_kwh_dia'] = results['calor_neto_disponible_mj_dia'] / 3.6
+    return results
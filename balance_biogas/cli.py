@@ -0,0 +1,520 @@
+# balance_biogas/cli.py
+"""Interfaz de línea de comandos para evaluar carteras de plantas en lote.
+
+Uso:
+    python -m balance_biogas lote plantas.csv -o resultados.csv --procesos 4
+    python -m balance_biogas lote plantas.jsonl -o - --formato-salida jsonl
+    python -m balance_biogas lote plantas.csv -o resultados.xlsx
+    python -m balance_biogas informes cartera.csv -o informes.zip --procesos 4
+    python -m balance_biogas equilibrio cartera.csv -o u_max.csv --variable u_digestor_w_m2_k
+    python -m balance_biogas servir --puerto 8765 --ventana-ms 2
+    python -m balance_biogas almacenar cartera.csv --almacen escenarios/
+    python -m balance_biogas consultar escenarios/ --filtro calor_neto_disponible_mj_dia=:500 --orden electricidad_neta_exportable_kwh_dia
+
+Cada fila de entrada define una planta con las mismas claves que
+``inputs_calc`` (más ``trh_dias``); las entradas ausentes toman los valores
+por defecto de la interfaz. Las columnas de entrada (incluidas ``id``,
+``nombre``...) se copian a la salida. Las filas se leen, evalúan y escriben por bloques con
+un número acotado de bloques en vuelo, de modo que la memoria es constante
+aunque el fichero tenga millones de filas.
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .calculos import CLAVES_DIMENSIONES, CLAVES_RESULTADOS, ENTRADAS_POR_DEFECTO
+from .upgrading import OPCIONES_UPGRADING, tecnologia_valida
+
+TAM_BLOQUE_POR_DEFECTO = 20_000
+ENTRADAS_OPCIONALES = ("area_superficial_digestor_m2", "densidad_sustrato_kg_m3")
+ENTRADAS_NUMERICAS = tuple(ENTRADAS_POR_DEFECTO) + ENTRADAS_OPCIONALES
+CLAVES_EQUILIBRIO = ("valor_equilibrio", "factible_min", "factible_max")
+# Mismo orden que evaluar_columnas: dimensiones y después resultados del balance
+CLAVES_SALIDA = CLAVES_DIMENSIONES + CLAVES_RESULTADOS
+
+
+def _detectar_formato(ruta, formato):
+    if formato:
+        return formato
+    ruta = ruta.lower()
+    if ruta.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "xlsx" if ruta.endswith(".xlsx") else "csv"
+
+
+def _abrir_lectura(ruta):
+    if ruta == "-":
+        return sys.stdin, False
+    return open(ruta, newline="", encoding="utf-8-sig"), True
+
+
+def _abrir_escritura(ruta):
+    if ruta == "-":
+        return sys.stdout, False
+    return open(ruta, "w", newline="", encoding="utf-8"), True
+
+
+def leer_filas(ruta, formato=None):
+    """Genera las filas (diccionarios) de un CSV o JSONL sin cargar el fichero entero."""
+    formato = _detectar_formato(ruta, formato)
+    fichero, cerrar = _abrir_lectura(ruta)
+    try:
+        if formato == "jsonl":
+            for linea in fichero:
+                if linea.strip():
+                    yield json.loads(linea)
+        else:
+            yield from csv.DictReader(fichero)
+    finally:
+        if cerrar:
+            fichero.close()
+
+
+def agrupar(filas, tam_bloque):
+    bloque = []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) >= tam_bloque:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+def _a_numero(valor, clave, n_fila):
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"Fila {n_fila}: valor no numérico para '{clave}': {valor!r}") from None
+    # Se valida por fila antes de agrupar: un índice erróneo no debe hacer fallar el bloque entero
+    if clave == "upgrading_tecnologia_idx" and not tecnologia_valida(numero):
+        raise ValueError(f"Fila {n_fila}: tecnología de upgrading desconocida para '{clave}': {valor!r} "
+                         f"(opciones: 0-{len(OPCIONES_UPGRADING) - 1}: {', '.join(OPCIONES_UPGRADING)})")
+    return numero
+
+
+def filas_a_columnas(filas, primera_fila=1):
+    """Convierte un bloque de filas en columnas numéricas para el motor vectorizado.
+
+    Las entradas vacías o ausentes toman el valor por defecto; el área del
+    digestor ausente se marca con NaN para calcularla a partir de caudal y TRH.
+    """
+    import numpy as np
+
+    columnas = {}
+    for clave in ENTRADAS_NUMERICAS:
+        por_defecto = ENTRADAS_POR_DEFECTO.get(clave, 1000.0 if clave == "densidad_sustrato_kg_m3" else np.nan)
+        columnas[clave] = np.array([
+            _a_numero(fila[clave], clave, primera_fila + i) if fila.get(clave) not in (None, "") else por_defecto
+            for i, fila in enumerate(filas)
+        ], dtype=np.float64)
+    return columnas
+
+
+def evaluar_columnas(columnas):
+    """Dimensiona el digestor (cuando falta el área) y calcula el balance de cada fila."""
+    import numpy as np
+
+    from .vectorizado import calcular_dimensiones_digestor_lote, realizar_calculos_balance_lote
+
+    dimensiones = calcular_dimensiones_digestor_lote(
+        columnas["caudal_sustrato_kg_dia"], columnas["trh_dias"], columnas["densidad_sustrato_kg_m3"])
+    area = columnas["area_superficial_digestor_m2"]
+    entradas = dict(columnas, area_superficial_digestor_m2=np.where(np.isnan(area), dimensiones["area_superficial_digestor_m2"], area))
+    salida = dict(dimensiones)
+    salida["area_superficial_digestor_m2"] = entradas["area_superficial_digestor_m2"]
+    salida.update(realizar_calculos_balance_lote(entradas))
+    return salida
+
+
+def _formatear_bloque(filas, primera_fila, formato, campos):
+    """Evalúa un bloque y lo devuelve ya serializado, para repartir también el formateo entre procesos."""
+    resultados = evaluar_columnas(filas_a_columnas(filas, primera_fila))
+    columnas_salida = [resultados[clave].tolist() for clave in CLAVES_SALIDA]
+    texto = io.StringIO()
+    if formato == "jsonl":
+        for fila, valores in zip(filas, zip(*columnas_salida)):
+            registro = dict(fila)
+            registro.update(zip(CLAVES_SALIDA, valores))
+            texto.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    else:
+        escritor = csv.writer(texto)
+        escritor.writerows(
+            [fila.get(campo, "") for campo in campos] + list(valores)
+            for fila, valores in zip(filas, zip(*columnas_salida))
+        )
+    return len(filas), texto.getvalue()
+
+
+def _formatear_equilibrio_bloque(filas, primera_fila, formato, campos, variable, salida, objetivo, limites):
+    """Resuelve el punto de equilibrio de un bloque de plantas y lo devuelve serializado."""
+    from .solver import resolver_equilibrio_lote
+
+    resultado = resolver_equilibrio_lote(filas_a_columnas(filas, primera_fila), variable, salida, objetivo, limites)
+    columnas_salida = [[None if math.isnan(v) else v for v in resultado[clave].tolist()] for clave in CLAVES_EQUILIBRIO]
+    texto = io.StringIO()
+    if formato == "jsonl":
+        for fila, valores in zip(filas, zip(*columnas_salida)):
+            registro = dict(fila)
+            registro.update(zip(CLAVES_EQUILIBRIO, valores))
+            texto.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    else:
+        csv.writer(texto).writerows(
+            [fila.get(campo, "") for campo in campos] + list(valores)
+            for fila, valores in zip(filas, zip(*columnas_salida))
+        )
+    return len(filas), texto.getvalue()
+
+
+def _columnas_bloque(filas, primera_fila, campos):
+    """Evalúa un bloque y lo devuelve como columnas (entradas numéricas ya convertidas) para Excel."""
+    entradas = filas_a_columnas(filas, primera_fila)
+    bloque = {
+        campo: entradas[campo] if campo in entradas else [fila.get(campo, "") for fila in filas]
+        for campo in campos
+    }
+    bloque.update(evaluar_columnas(entradas))
+    return len(filas), bloque
+
+
+def ejecutar_en_orden(funcion, tareas, procesos, inicializador=None):
+    """Ejecuta ``funcion(*tarea)`` para cada tarea y genera los resultados en el orden de entrada.
+
+    Con varios procesos mantiene como mucho dos tareas en vuelo por proceso,
+    de modo que la memoria queda acotada aunque haya millones de tareas.
+    ``inicializador`` se ejecuta una vez por proceso de trabajo.
+    """
+    if procesos <= 1:
+        if inicializador is not None:
+            inicializador()
+        for tarea in tareas:
+            yield funcion(*tarea)
+        return
+    with ProcessPoolExecutor(max_workers=procesos, initializer=inicializador) as ejecutor:
+        en_vuelo = deque()
+        for tarea in tareas:
+            en_vuelo.append(ejecutor.submit(funcion, *tarea))
+            if len(en_vuelo) >= 2 * procesos:
+                yield en_vuelo.popleft().result()
+        while en_vuelo:
+            yield en_vuelo.popleft().result()
+
+
+def tareas_por_bloque(bloques, *args):
+    primera_fila = 1
+    for bloque in bloques:
+        yield (bloque, primera_fila) + args
+        primera_fila += len(bloque)
+
+
+def evaluar_fichero(entrada, salida, formato_entrada=None, formato_salida=None, procesos=None, tam_bloque=TAM_BLOQUE_POR_DEFECTO):
+    """Evalúa todas las plantas de ``entrada`` y escribe los resultados en ``salida``.
+
+    La salida puede ser CSV, JSONL o Excel (``.xlsx``, escrito en modo
+    write-only con una hoja de resumen). Devuelve el número de filas procesadas.
+    """
+    formato_salida = _detectar_formato(salida if salida != "-" else entrada, formato_salida)
+    if procesos is None:
+        procesos = os.cpu_count() or 1
+    bloques = agrupar(leer_filas(entrada, formato_entrada), tam_bloque)
+    primer_bloque = next(bloques, None)
+    if primer_bloque is None:
+        return 0
+    # Columnas de entrada que se copian a la salida (las de resultados se recalculan)
+    campos = [c for c in primer_bloque[0] if c not in CLAVES_SALIDA]
+    bloques = itertools.chain([primer_bloque], bloques)
+    n_filas = 0
+
+    if formato_salida == "xlsx":
+        from .exportar import OPENPYXL_AVAILABLE, generar_excel_escenarios
+
+        if not OPENPYXL_AVAILABLE:
+            raise ValueError("Exportación a Excel no disponible (falta 'openpyxl').")
+
+        def _bloques_evaluados():
+            nonlocal n_filas
+            for n_bloque, columnas in ejecutar_en_orden(_columnas_bloque, tareas_por_bloque(bloques, campos), procesos):
+                n_filas += n_bloque
+                yield columnas
+
+        generar_excel_escenarios(_bloques_evaluados(), sys.stdout.buffer if salida == "-" else salida, columnas=campos + list(CLAVES_SALIDA))
+        return n_filas
+
+    fichero, cerrar = _abrir_escritura(salida)
+    try:
+        if formato_salida == "csv":
+            csv.writer(fichero).writerow(campos + list(CLAVES_SALIDA))
+        for n_bloque, texto in ejecutar_en_orden(_formatear_bloque, tareas_por_bloque(bloques, formato_salida, campos), procesos):
+            fichero.write(texto)
+            n_filas += n_bloque
+        return n_filas
+    finally:
+        if cerrar:
+            fichero.close()
+        else:
+            fichero.flush()
+
+
+def resolver_fichero(entrada, salida, variable, salida_objetivo="calor_neto_disponible_mj_dia", objetivo=0.0, limites=None,
+                     formato_entrada=None, formato_salida=None, procesos=None, tam_bloque=TAM_BLOQUE_POR_DEFECTO):
+    """Calcula, para cada planta de ``entrada``, el valor de ``variable`` que lleva ``salida_objetivo`` a ``objetivo``.
+
+    Escribe las columnas de entrada más ``valor_equilibrio``, ``factible_min``
+    y ``factible_max`` (vacías cuando no hay solución) en CSV o JSONL.
+    Devuelve el número de plantas procesadas.
+    """
+    formato_salida = _detectar_formato(salida if salida != "-" else entrada, formato_salida)
+    if formato_salida not in ("csv", "jsonl"):
+        raise ValueError("El punto de equilibrio solo se exporta en CSV o JSONL.")
+    if procesos is None:
+        procesos = os.cpu_count() or 1
+    bloques = agrupar(leer_filas(entrada, formato_entrada), tam_bloque)
+    primer_bloque = next(bloques, None)
+    if primer_bloque is None:
+        return 0
+    campos = [c for c in primer_bloque[0] if c not in CLAVES_EQUILIBRIO]
+    bloques = itertools.chain([primer_bloque], bloques)
+    n_filas = 0
+    fichero, cerrar = _abrir_escritura(salida)
+    try:
+        if formato_salida == "csv":
+            csv.writer(fichero).writerow(campos + list(CLAVES_EQUILIBRIO))
+        tareas = tareas_por_bloque(bloques, formato_salida, campos, variable, salida_objetivo, objetivo, limites)
+        for n_bloque, texto in ejecutar_en_orden(_formatear_equilibrio_bloque, tareas, procesos):
+            fichero.write(texto)
+            n_filas += n_bloque
+        return n_filas
+    finally:
+        if cerrar:
+            fichero.close()
+        else:
+            fichero.flush()
+
+
+def almacenar_fichero(entrada, ruta_almacen, etiqueta=None, formato_entrada=None, procesos=None, tam_bloque=TAM_BLOQUE_POR_DEFECTO):
+    """Evalúa las plantas de ``entrada`` y las añade al almacén de escenarios de ``ruta_almacen``.
+
+    La etiqueta de cada escenario es la columna ``nombre`` si existe y, si no,
+    ``etiqueta`` (por defecto, el nombre del fichero). Devuelve el número de filas añadidas.
+    """
+    from .almacen import CAMPOS_ENTRADA, AlmacenEscenarios
+
+    if procesos is None:
+        procesos = os.cpu_count() or 1
+    if etiqueta is None:
+        etiqueta = "" if entrada == "-" else os.path.basename(entrada)
+    almacen = AlmacenEscenarios(ruta_almacen)
+    campos = list(CAMPOS_ENTRADA) + ["nombre"]
+    n_filas = 0
+    bloques = agrupar(leer_filas(entrada, formato_entrada), tam_bloque)
+    for n_bloque, columnas in ejecutar_en_orden(_columnas_bloque, tareas_por_bloque(bloques, campos), procesos):
+        nombres = columnas.pop("nombre")
+        almacen.agregar_lote(columnas, [nombre or etiqueta for nombre in nombres])
+        n_filas += n_bloque
+    return n_filas
+
+
+def _leer_filtro(texto):
+    """``campo=min:max`` (cualquiera de los dos límites puede omitirse) -> ``(campo, (min, max))``."""
+    campo, separador, rango = texto.partition("=")
+    minimo, separador_rango, maximo = rango.partition(":")
+    if not separador or not separador_rango:
+        raise argparse.ArgumentTypeError(f"Filtro no válido: {texto!r} (se espera campo=min:max)")
+    try:
+        return campo.strip(), (float(minimo) if minimo.strip() else None, float(maximo) if maximo.strip() else None)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Límites no numéricos en el filtro {texto!r}") from None
+
+
+def consultar_almacen(ruta_almacen, salida, filtros=None, orden=None, limite=20, ascendente=False, campos=None, formato_salida=None):
+    """Escribe en ``salida`` (CSV o JSONL) los escenarios del almacén que cumplen ``filtros``.
+
+    Con ``orden`` devuelve los ``limite`` mejores según ese campo; sin él, los
+    primeros ``limite`` por id (``None`` = todos). Devuelve el número de filas escritas.
+    """
+    from .almacen import AlmacenEscenarios
+
+    formato_salida = _detectar_formato(salida if salida != "-" else "consulta.csv", formato_salida)
+    if formato_salida not in ("csv", "jsonl"):
+        raise ValueError("Las consultas solo se exportan en CSV o JSONL.")
+    if not os.path.isdir(ruta_almacen):
+        raise ValueError(f"No existe el almacén de escenarios {ruta_almacen!r}")
+    almacen = AlmacenEscenarios(ruta_almacen)
+    if orden is None:
+        ids = almacen.filtrar(filtros, limite)
+    else:
+        ids = almacen.top(orden, len(almacen) if limite is None else limite, filtros, descendente=not ascendente)
+    registros = almacen.registros(ids, campos)
+    fichero, cerrar = _abrir_escritura(salida)
+    try:
+        if formato_salida == "jsonl":
+            fichero.writelines(json.dumps(registro, ensure_ascii=False) + "\n" for registro in registros)
+        else:
+            # Cabecera del esquema, no de la primera fila: se escribe aunque la consulta no devuelva nada
+            escritor = csv.DictWriter(fichero, fieldnames=almacen.claves_registros(campos))
+            escritor.writeheader()
+            escritor.writerows(registros)
+        return len(registros)
+    finally:
+        if cerrar:
+            fichero.close()
+        else:
+            fichero.flush()
+
+
+def _crear_parser():
+    parser = argparse.ArgumentParser(prog="python -m balance_biogas", description="Balance energético de plantas de biogás en lote.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    lote = subparsers.add_parser("lote", help="Evalúa un CSV o JSONL de plantas y escribe los resultados por bloques.")
+    lote.add_argument("entrada", help="Fichero CSV o JSONL de plantas ('-' para la entrada estándar).")
+    lote.add_argument("-o", "--salida", default="-", help="Fichero de resultados ('-' para la salida estándar).")
+    lote.add_argument("--formato-entrada", choices=("csv", "jsonl"), help="Por defecto se deduce de la extensión.")
+    lote.add_argument("--formato-salida", choices=("csv", "jsonl", "xlsx"), help="Por defecto se deduce de la extensión.")
+    lote.add_argument("--procesos", type=int, default=None, help="Procesos de trabajo (por defecto, uno por CPU).")
+    lote.add_argument("--tam-bloque", type=int, default=TAM_BLOQUE_POR_DEFECTO, help="Filas por bloque.")
+
+    informes = subparsers.add_parser("informes", help="Genera un informe PDF por planta y los empaqueta en un ZIP.")
+    informes.add_argument("entrada", help="Fichero CSV o JSONL de plantas ('-' para la entrada estándar).")
+    informes.add_argument("-o", "--salida", required=True, help="Fichero ZIP de destino ('-' para la salida estándar).")
+    informes.add_argument("--formato-entrada", choices=("csv", "jsonl"), help="Por defecto se deduce de la extensión.")
+    informes.add_argument("--analista", default="", help="Analista por defecto si la fila no tiene columna 'analista'.")
+    informes.add_argument("--procesos", type=int, default=None, help="Procesos de trabajo (por defecto, uno por CPU).")
+
+    equilibrio = subparsers.add_parser("equilibrio", help="Calcula por planta el valor de una entrada que lleva una salida a un objetivo.")
+    equilibrio.add_argument("entrada", help="Fichero CSV o JSONL de plantas ('-' para la entrada estándar).")
+    equilibrio.add_argument("-o", "--salida", default="-", help="Fichero de resultados ('-' para la salida estándar).")
+    equilibrio.add_argument("--variable", required=True, choices=(
+        "trh_dias", "u_digestor_w_m2_k", "chp_eficiencia_electrica_porcentaje",
+        "chp_eficiencia_termica_porcentaje", "caldera_eficiencia_porcentaje",
+    ), help="Entrada que se ajusta.")
+    equilibrio.add_argument("--salida-objetivo", default="calor_neto_disponible_mj_dia",
+                            choices=("calor_neto_disponible_mj_dia", "electricidad_neta_exportable_kwh_dia"))
+    equilibrio.add_argument("--objetivo", type=float, default=0.0, help="Valor que debe alcanzar la salida (por defecto 0).")
+    equilibrio.add_argument("--minimo", type=float, default=None, help="Límite inferior de búsqueda.")
+    equilibrio.add_argument("--maximo", type=float, default=None, help="Límite superior de búsqueda.")
+    equilibrio.add_argument("--formato-entrada", choices=("csv", "jsonl"), help="Por defecto se deduce de la extensión.")
+    equilibrio.add_argument("--formato-salida", choices=("csv", "jsonl"), help="Por defecto se deduce de la extensión.")
+    equilibrio.add_argument("--procesos", type=int, default=None, help="Procesos de trabajo (por defecto, uno por CPU).")
+    equilibrio.add_argument("--tam-bloque", type=int, default=TAM_BLOQUE_POR_DEFECTO, help="Filas por bloque.")
+
+    servir = subparsers.add_parser("servir", help="Arranca el servicio HTTP/JSON local (peticiones individuales agrupadas en micro-lotes).")
+    servir.add_argument("--host", default="127.0.0.1", help="Dirección de escucha (por defecto solo local).")
+    servir.add_argument("--puerto", type=int, default=8765, help="Puerto de escucha (0 = uno libre).")
+    servir.add_argument("--ventana-ms", type=float, default=2.0, help="Tiempo máximo que una petición individual espera a otras para evaluarse en lote.")
+    servir.add_argument("--max-lote", type=int, default=1024, help="Filas por micro-lote a partir de las cuales se evalúa sin esperar.")
+
+    almacenar = subparsers.add_parser("almacenar", help="Evalúa un CSV o JSONL de plantas y añade los escenarios al almacén.")
+    almacenar.add_argument("entrada", help="Fichero CSV o JSONL de plantas ('-' para la entrada estándar).")
+    almacenar.add_argument("--almacen", required=True, help="Directorio del almacén de escenarios (se crea si no existe).")
+    almacenar.add_argument("--etiqueta", default=None, help="Etiqueta de las filas sin columna 'nombre' (por defecto, el nombre del fichero).")
+    almacenar.add_argument("--formato-entrada", choices=("csv", "jsonl"), help="Por defecto se deduce de la extensión.")
+    almacenar.add_argument("--procesos", type=int, default=None, help="Procesos de trabajo (por defecto, uno por CPU).")
+    almacenar.add_argument("--tam-bloque", type=int, default=TAM_BLOQUE_POR_DEFECTO, help="Filas por bloque.")
+
+    consultar = subparsers.add_parser("consultar", help="Filtra u ordena los escenarios del almacén y los escribe en CSV o JSONL.")
+    consultar.add_argument("almacen", help="Directorio del almacén de escenarios.")
+    consultar.add_argument("-o", "--salida", default="-", help="Fichero de resultados ('-' para la salida estándar, en CSV).")
+    consultar.add_argument("--filtro", action="append", type=_leer_filtro, default=[],
+                           help="campo=min:max (p. ej. calor_neto_disponible_mj_dia=:500); se puede repetir.")
+    consultar.add_argument("--orden", default=None, help="Campo por el que se devuelven los mejores escenarios.")
+    consultar.add_argument("--ascendente", action="store_true", help="Con --orden, los de menor valor primero.")
+    consultar.add_argument("--limite", type=int, default=20, help="Escenarios como máximo (0 = todos).")
+    consultar.add_argument("--campos", default=None, help="Campos separados por comas (por defecto, todos).")
+    consultar.add_argument("--formato-salida", choices=("csv", "jsonl"), help="Por defecto se deduce de la extensión.")
+    return parser
+
+
+def main(argv=None):
+    args = _crear_parser().parse_args(argv)
+    if args.comando == "lote":
+        inicio = time.perf_counter()
+        try:
+            n_filas = evaluar_fichero(
+                args.entrada, args.salida, args.formato_entrada, args.formato_salida,
+                procesos=args.procesos, tam_bloque=max(1, args.tam_bloque),
+            )
+        except (OSError, ValueError) as e_lote:
+            print(f"Error: {e_lote}", file=sys.stderr)
+            return 1
+        duracion = time.perf_counter() - inicio
+        print(f"{n_filas} filas evaluadas en {duracion:.2f} s ({n_filas / duracion if duracion else 0:.0f} filas/s)", file=sys.stderr)
+    elif args.comando == "informes":
+        from .informes import generar_informes_zip
+
+        try:
+            resumen = generar_informes_zip(
+                args.entrada, sys.stdout.buffer if args.salida == "-" else args.salida,
+                formato_entrada=args.formato_entrada, analista=args.analista, procesos=args.procesos,
+            )
+        except (OSError, ValueError) as e_informes:
+            print(f"Error: {e_informes}", file=sys.stderr)
+            return 1
+        print(
+            f"{resumen['n_informes']} informes generados en {resumen['segundos']:.2f} s "
+            f"({resumen['informes_por_segundo']:.1f} informes/s)",
+            file=sys.stderr,
+        )
+    elif args.comando == "equilibrio":
+        from .solver import LIMITES_VARIABLES
+
+        minimo_defecto, maximo_defecto = LIMITES_VARIABLES[args.variable]
+        limites = (
+            minimo_defecto if args.minimo is None else args.minimo,
+            maximo_defecto if args.maximo is None else args.maximo,
+        )
+        inicio = time.perf_counter()
+        try:
+            n_filas = resolver_fichero(
+                args.entrada, args.salida, args.variable, args.salida_objetivo, args.objetivo, limites,
+                args.formato_entrada, args.formato_salida, procesos=args.procesos, tam_bloque=max(1, args.tam_bloque),
+            )
+        except (OSError, ValueError) as e_equilibrio:
+            print(f"Error: {e_equilibrio}", file=sys.stderr)
+            return 1
+        duracion = time.perf_counter() - inicio
+        print(f"{n_filas} plantas resueltas en {duracion:.2f} s ({n_filas / duracion if duracion else 0:.0f} plantas/s)", file=sys.stderr)
+    elif args.comando == "servir":
+        from .servicio import servir
+
+        def _anunciar(servidor):
+            host, puerto = servidor.sockets[0].getsockname()[:2]
+            print(f"Servicio escuchando en http://{host}:{puerto} (ventana {args.ventana_ms:g} ms, lotes de hasta {args.max_lote} filas)",
+                  file=sys.stderr, flush=True)
+
+        try:
+            servir(args.host, args.puerto, args.ventana_ms / 1000, args.max_lote, al_iniciar=_anunciar)
+        except OSError as e_servir:
+            print(f"Error: {e_servir}", file=sys.stderr)
+            return 1
+    elif args.comando == "almacenar":
+        inicio = time.perf_counter()
+        try:
+            n_filas = almacenar_fichero(
+                args.entrada, args.almacen, args.etiqueta, args.formato_entrada,
+                procesos=args.procesos, tam_bloque=max(1, args.tam_bloque),
+            )
+        except (OSError, ValueError) as e_almacenar:
+            print(f"Error: {e_almacenar}", file=sys.stderr)
+            return 1
+        duracion = time.perf_counter() - inicio
+        print(f"{n_filas} escenarios añadidos a {args.almacen} en {duracion:.2f} s", file=sys.stderr)
+    elif args.comando == "consultar":
+        try:
+            n_filas = consultar_almacen(
+                args.almacen, args.salida, dict(args.filtro), args.orden, args.limite or None, args.ascendente,
+                args.campos.split(",") if args.campos else None, args.formato_salida,
+            )
+        except (OSError, ValueError) as e_consultar:
+            print(f"Error: {e_consultar}", file=sys.stderr)
+            return 1
+        print(f"{n_filas} escenarios", file=sys.stderr)
+    return 0
@@ -0,0 +1,375 @@
+# balance_biogas/exportar.py
+"""Exportación de resultados a Excel y PDF (sin dependencia de Streamlit).
+
+Las funciones devuelven los bytes del fichero, o ``None`` si falta la
+librería de exportación correspondiente. ``openpyxl`` y ``fpdf`` solo se
+importan la primera vez que se genera un fichero; las variantes
+``*_cacheado`` memoizan el resultado por hash del contenido en una caché LRU
+acotada compartida por todas las sesiones.
+"""
+import os
+from importlib.util import find_spec
+from io import BytesIO
+
+from .cache import CacheLRU, hash_contenido
+from .upgrading import nombre_tecnologia_upgrading
+
+# --- LIBRERÍAS DE EXPORTACIÓN (se comprueba su presencia sin importarlas) ---
+OPENPYXL_AVAILABLE = find_spec("openpyxl") is not None
+FPDF_AVAILABLE = find_spec("fpdf") is not None
+
+_CACHE_EXPORTACIONES = CacheLRU(max_entradas=int(os.environ.get("BALANCE_CACHE_EXPORTACIONES", "32")))
+
+
+# FPDF con fuentes estándar (latin-1) no maneja bien todos los caracteres Unicode.
+# Esta es una forma simple de reemplazar algunos comunes. Para soporte completo,
+# se necesitaría usar fuentes TrueType (TTF) que soporten Unicode.
+# La tabla se compila una sola vez y se aplica en una única pasada con str.translate.
+_TABLA_SANITIZADO_FPDF = str.maketrans({
+    '€': 'EUR', 'ñ': 'n', 'Ñ': 'N', 'á': 'a', 'é': 'e', 'í': 'i', 'ó': 'o', 'ú': 'u',
+    'Á': 'A', 'É': 'E', 'Í': 'I', 'Ó': 'O', 'Ú': 'U', 'ü': 'u', 'Ü': 'U', '¿': '?', '¡': '!'
+    # Añade más reemplazos según sea necesario
+})
+
+# Fuente estándar de FPDF (fpdf2 sustituye "Arial" por "Helvetica" con un aviso en cada llamada)
+FUENTE_PDF = "Helvetica"
+
+
+def sanitize_text_for_fpdf(text):
+    """Reemplaza caracteres problemáticos para FPDF con la fuente estándar."""
+    if not isinstance(text, str):
+        text = str(text)
+    # Intenta codificar a latin-1, reemplazando caracteres no mapeables
+    return text.translate(_TABLA_SANITIZADO_FPDF).encode('latin-1', 'replace').decode('latin-1')
+
+
+def generar_excel_bytes(all_inputs, results_dict, dim_digestor_dict, project_info):
+    # ... (código de generar_excel_bytes como antes, usando .get() para seguridad)
+    if not OPENPYXL_AVAILABLE:
+        return None
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment
+    wb = Workbook()
+    ws = wb.active
+    # ... (resto de la función como antes, asegurándose de usar all_inputs.get(...) )
+    # EJEMPLO de cómo usar .get():
+    # add_excel_row(ws, ["Sustrato:", all_inputs.get('sustrato_nombre', 'N/A')])
+    # Rellena el resto de la función de Excel como en la versión anterior,
+    # asegurando que todas las claves de 'all_inputs' y 'results_dict' se accedan con .get()
+    ws.title = "Resumen Balance Energético"
+    header_font = Font(bold=True, size=12, color="00FFFFFF")
+    category_font = Font(bold=True)
+    bold_font = Font(bold=True)
+
+    ws['A1'] = f"Balance Energético Preliminar: {project_info['nombre']}"
+    ws.merge_cells('A1:D1'); ws['A1'].font = Font(bold=True, size=14); ws['A1'].alignment = Alignment(horizontal="center")
+    ws['A2'] = f"Fecha: {project_info['fecha']}"; ws['A3'] = f"Analista: {project_info['analista']}"; ws.append([])
+
+    def add_excel_row(sheet, data, font=None):
+        sheet.append([sanitize_text_for_fpdf(str(d)) for d in data]) # Sanitizar para Excel también puede ser útil
+        if font:
+            for cell in sheet[sheet.max_row]: cell.font = font
+
+    current_row_excel = ws.max_row + 1 
+    add_excel_row(ws, ["PARÁMETROS DE ENTRADA"], font=header_font) 
+    ws.merge_cells(start_row=current_row_excel, start_column=1, end_row=current_row_excel, end_column=3); current_row_excel +=1
+
+    add_excel_row(ws, ["Sustrato:", all_inputs.get('sustrato_nombre', 'N/A')])
+    add_excel_row(ws, ["Caudal Sustrato (kg/día):", all_inputs.get('caudal_sustrato_kg_dia', 0)])
+    add_excel_row(ws, ["ST (%):", all_inputs.get('st_porcentaje',0)])
+    # ... (muchos más add_excel_row)
+
+    if all_inputs.get('uso_biogas_opcion_idx') == 2:
+        add_excel_row(ws, ["UPGRADING A BIOMETANO:"], font=category_font)
+        add_excel_row(ws, ["  Tecnología:", nombre_tecnologia_upgrading(float(all_inputs.get('upgrading_tecnologia_idx', 0)))])
+        add_excel_row(ws, ["  Presión de inyección (bar):", all_inputs.get('presion_inyeccion_bar', 0)])
+        add_excel_row(ws, ["  Biometano neto (Nm³/día):", results_dict.get('biometano_neto_nm3_dia',0)])
+        add_excel_row(ws, ["  Energía del biometano (kWh/día):", results_dict.get('energia_biometano_kwh_dia',0)])
+        add_excel_row(ws, ["  Pérdida de metano (Nm³ CH₄/día):", results_dict.get('ch4_perdido_upgrading_nm3_dia',0)])
+        add_excel_row(ws, ["  Consumo eléctrico upgrading (kWh/día):", results_dict.get('consumo_electrico_upgrading_kwh_dia',0)])
+        add_excel_row(ws, ["  Consumo eléctrico compresión (kWh/día):", results_dict.get('consumo_electrico_compresion_kwh_dia',0)])
+        add_excel_row(ws, ["  Calor de regeneración (MJ/día):", results_dict.get('calor_upgrading_mj_dia',0)])
+
+    add_excel_row(ws, ["BALANCE NETO:"], font=category_font)
+    add_excel_row(ws, ["  Electricidad Neta Exportable (kWh/día):", results_dict.get('electricidad_neta_exportable_kwh_dia',0)], font=bold_font)
+    add_excel_row(ws, ["  Calor Neto Disponible/Déficit (MJ/día):", results_dict.get('calor_neto_disponible_mj_dia',0)], font=bold_font)
+
+    for col_letter in ['A', 'B', 'C']: ws.column_dimensions[col_letter].width = 35 if col_letter == 'A' else 15
+
+    excel_stream = BytesIO()
+    wb.save(excel_stream)
+    excel_stream.seek(0)
+    return excel_stream.getvalue()
+
+
+def _registrar_estilos_escenarios(wb):
+    from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+
+    encabezado = NamedStyle(name="encabezado_escenarios")
+    encabezado.font = Font(bold=True, color="00FFFFFF")
+    encabezado.fill = PatternFill("solid", fgColor="00305496")
+    encabezado.alignment = Alignment(horizontal="center", wrap_text=True)
+    titulo = NamedStyle(name="titulo_escenarios")
+    titulo.font = Font(bold=True, size=14)
+    numero = NamedStyle(name="numero_escenarios", number_format="0.00")
+    for estilo in (encabezado, titulo, numero):
+        wb.add_named_style(estilo)
+
+
+def _celda(ws, valor, estilo):
+    from openpyxl.cell import WriteOnlyCell
+
+    celda = WriteOnlyCell(ws, value=valor)
+    celda.style = estilo
+    return celda
+
+
+def generar_excel_escenarios(bloques, destino, columnas=None, project_info=None):
+    """Escribe un libro con una fila por escenario y una hoja de resumen, en modo write-only.
+
+    ``bloques`` es un iterable de diccionarios columna -> valores (listas o
+    arrays), como los que producen el motor vectorizado, el CLI o el Monte
+    Carlo. ``destino`` es una ruta o un fichero binario abierto. Las filas se
+    vuelcan a disco a medida que llegan, así que la memoria no depende del
+    número de escenarios. Devuelve el número de escenarios escritos, o
+    ``None`` si falta 'openpyxl'.
+    """
+    if not OPENPYXL_AVAILABLE:
+        return None
+    import math
+
+    import numpy as np
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    _registrar_estilos_escenarios(wb)
+    ws = wb.create_sheet("Escenarios")
+    ws.freeze_panes = "A2"
+
+    n_escenarios = 0
+    estadisticas = {}
+    encabezado_escrito = False
+    for bloque in bloques:
+        if columnas is None:
+            columnas = list(bloque)
+        if not encabezado_escrito:
+            encabezado_escrito = True
+            for i in range(len(columnas)):
+                ws.column_dimensions[get_column_letter(i + 1)].width = 18
+            ws.append([_celda(ws, nombre, "encabezado_escenarios") for nombre in columnas])
+        listas = []
+        for nombre in columnas:
+            valores = bloque[nombre]
+            if isinstance(valores, np.ndarray) and valores.dtype.kind in "fiub":
+                valores_num = valores.astype(np.float64, copy=False)
+                finitos = valores_num[np.isfinite(valores_num)]
+                if len(finitos):
+                    e = estadisticas.setdefault(nombre, {"n": 0, "suma": 0.0, "min": math.inf, "max": -math.inf, "negativos": 0})
+                    e["n"] += len(finitos)
+                    e["suma"] += float(finitos.sum())
+                    e["min"] = min(e["min"], float(finitos.min()))
+                    e["max"] = max(e["max"], float(finitos.max()))
+                    e["negativos"] += int(np.count_nonzero(finitos < 0))
+                # Excel no admite NaN ni infinitos: se dejan las celdas vacías
+                lista = valores_num.tolist()
+                if len(finitos) != len(lista):
+                    lista = [v if math.isfinite(v) else None for v in lista]
+                listas.append(lista)
+            else:
+                listas.append(list(valores))
+        for fila in zip(*listas):
+            ws.append(fila)
+            n_escenarios += 1
+
+    resumen = wb.create_sheet("Resumen", 0)
+    resumen.column_dimensions["A"].width = 45
+    for letra in "BCDEF":
+        resumen.column_dimensions[letra].width = 16
+    titulo = "Escenarios del Balance Energético"
+    if project_info:
+        titulo += f": {project_info.get('nombre', '')}"
+    resumen.append([_celda(resumen, titulo, "titulo_escenarios")])
+    if project_info:
+        resumen.append([f"Fecha: {project_info.get('fecha', '')}", f"Analista: {project_info.get('analista', '')}"])
+    resumen.append([f"Número de escenarios: {n_escenarios}"])
+    resumen.append([])
+    resumen.append([_celda(resumen, t, "encabezado_escenarios") for t in ("Columna", "N", "Mínimo", "Media", "Máximo", "Fracción < 0")])
+    for nombre in columnas or []:
+        e = estadisticas.get(nombre)
+        if e is None:
+            continue
+        resumen.append([nombre, e["n"]] + [
+            _celda(resumen, valor, "numero_escenarios")
+            for valor in (e["min"], e["suma"] / e["n"], e["max"], e["negativos"] / e["n"])
+        ])
+
+    wb.save(destino)
+    return n_escenarios
+
+
+# Ancho de página (210mm) - márgenes (15mm*2) = 180mm. Damos un poco menos para seguridad.
+ANCHO_LINEA_PDF = 170
+
+_NOTAS_PDF = sanitize_text_for_fpdf(
+    "- Este es un balance PRELIMINAR basado en estimaciones y supuestos.\n"
+    "- Los valores de BMP, eficiencias y pérdidas pueden variar significativamente.\n"
+    "- Se recomienda un análisis detallado con datos específicos del proyecto y de proveedores."
+)
+
+
+def _escribir_linea_pdf(pdf, linea):
+    """Escribe una línea y vuelve al margen izquierdo.
+
+    Casi todas las líneas caben en el ancho disponible; para ellas ``cell`` evita
+    el algoritmo de partición carácter a carácter de ``multi_cell``, que es la
+    parte más costosa de generar el informe.
+    """
+    if pdf.get_string_width(linea) <= ANCHO_LINEA_PDF - 2 * pdf.c_margin:
+        pdf.cell(ANCHO_LINEA_PDF, 5, linea, 0, align="L", new_x="LMARGIN", new_y="NEXT")
+    else:
+        pdf.multi_cell(ANCHO_LINEA_PDF, 5, linea, 0, "L", new_x="LMARGIN", new_y="NEXT")
+
+
+def generar_pdf_bytes(all_inputs, results_dict, dim_digestor_dict, project_info):
+    if not FPDF_AVAILABLE:
+        return None
+    from fpdf import FPDF
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+
+    # Intentar añadir una fuente Unicode si está disponible (requiere el archivo .ttf)
+    # try:
+    #     pdf.add_font("DejaVu", "", "DejaVuSansCondensed.ttf", uni=True)
+    #     pdf.set_font("DejaVu", "", 10) # Usar la fuente Unicode
+    # except RuntimeError:
+    #     pdf.set_font("Arial", "", 10) # Fallback a Arial
+    #     st.sidebar.caption("Nota PDF: Fuente DejaVu no encontrada, usando Arial (puede limitar caracteres).")
+
+    pdf.set_font(FUENTE_PDF, "", 10) # Mantener la fuente estándar por simplicidad de dependencias
+
+    pdf.set_font(FUENTE_PDF, "B", 16)
+    pdf.cell(0, 10, sanitize_text_for_fpdf(f"Balance Energético Preliminar: {project_info['nombre']}"), 0, 1, "C")
+    pdf.set_font(FUENTE_PDF, "", 10)
+    pdf.cell(0, 6, sanitize_text_for_fpdf(f"Fecha: {project_info['fecha']} | Analista: {project_info['analista']}"), 0, 1, "C")
+    pdf.ln(5)
+
+    def add_pdf_section(title_pdf, data_dict_pdf):
+        pdf.set_font(FUENTE_PDF, "B", 12)
+        pdf.cell(0, 8, sanitize_text_for_fpdf(title_pdf), 0, 1, "L")
+        pdf.set_font(FUENTE_PDF, "", 9) # Tamaño de fuente más pequeño para contenido
+        for key, value in data_dict_pdf.items():
+            s_key = sanitize_text_for_fpdf(str(key))
+            if isinstance(value, tuple):
+                s_val0 = sanitize_text_for_fpdf(str(value[0]))
+                s_val1 = sanitize_text_for_fpdf(str(value[1])) if len(value) > 1 else ''
+                line = f"  {s_key.ljust(45)}: {s_val0.ljust(15)} {s_val1}"
+            else:
+                s_val = sanitize_text_for_fpdf(str(value))
+                line = f"  {s_key.ljust(45)}: {s_val}"
+
+            try:
+                _escribir_linea_pdf(pdf, line)
+            except Exception as e_multicell:
+                print(f"Error en multi_cell con línea: '{line}'. Error: {e_multicell}")
+                _escribir_linea_pdf(pdf, f"Error al renderizar: {s_key}") # Mostrar al menos la clave
+        pdf.ln(3)
+
+    input_data_pdf_content = {
+        "Sustrato": all_inputs.get('sustrato_nombre', 'N/A'),
+        "Caudal Sustrato (kg/día)": all_inputs.get('caudal_sustrato_kg_dia',0),
+        "ST (%)": all_inputs.get('st_porcentaje',0),
+        "SV (% de ST)": all_inputs.get('sv_de_st_porcentaje',0),
+        "Fuente BMP": all_inputs.get('bmp_fuente_texto', 'N/A'),
+        "BMP (Nm³ CH₄/kg SV)": all_inputs.get('bmp_nm3_ch4_kg_sv',0),
+        "Temp. Op. Digestor (°C)": (all_inputs.get('temp_op_digestor_c',0), f"({all_inputs.get('temp_op_digestor_texto','N/A')})"),
+        "Eficiencia Digestión (%)": all_inputs.get('eficiencia_digestion_porcentaje',0),
+        "%CH₄ en biogás": all_inputs.get('ch4_en_biogas_porcentaje',0),
+        "Uso Principal Biogás": all_inputs.get('uso_biogas_texto','N/A'),
+    }
+    if all_inputs.get('uso_biogas_opcion_idx') == 0:
+        input_data_pdf_content["Eficiencia Eléctrica CHP (%)"] = all_inputs.get('chp_eficiencia_electrica_porcentaje',0)
+        input_data_pdf_content["Eficiencia Térmica CHP (%)"] = all_inputs.get('chp_eficiencia_termica_porcentaje',0)
+    elif all_inputs.get('uso_biogas_opcion_idx') == 1:
+        input_data_pdf_content["Eficiencia Caldera (%)"] = all_inputs.get('caldera_eficiencia_porcentaje',0)
+    elif all_inputs.get('uso_biogas_opcion_idx') == 2:
+        input_data_pdf_content["Tecnología de Upgrading"] = nombre_tecnologia_upgrading(float(all_inputs.get('upgrading_tecnologia_idx', 0)))
+        input_data_pdf_content["Presión de Inyección (bar)"] = all_inputs.get('presion_inyeccion_bar',0)
+    add_pdf_section("PARÁMETROS DE ENTRADA", input_data_pdf_content)
+
+    results_data_pdf_content = {
+        "Dimensiones Digestor:": {
+            "Volumen Estimado (m³)": f"{dim_digestor_dict.get('volumen_digestor_m3',0):.2f}",
+            "Diámetro Estimado (m)": f"{dim_digestor_dict.get('diametro_digestor_m',0):.2f}",
+            "Área Superficial (m²)": f"{dim_digestor_dict.get('area_superficial_digestor_m2',0):.2f}",
+        },
+        "Producción de Biogás:": {
+            "Metano (CH₄) producido (Nm³/día)": f"{results_dict.get('ch4_producido_nm3_dia',0):.2f}",
+            "Biogás total producido (Nm³/día)": f"{results_dict.get('biogas_producido_nm3_dia',0):.2f}",
+            "Energía bruta en biogás (MJ/día)": f"{results_dict.get('energia_bruta_biogas_mj_dia',0):.2f}",
+        },
+        "Demanda Térmica Digestor:": {
+            "Calor para calentar sustrato (MJ/día)": f"{results_dict.get('calor_calentar_sustrato_mj_dia',0):.2f}",
+            "Pérdidas de calor del digestor (MJ/día)": f"{results_dict.get('perdidas_calor_digestor_mj_dia',0):.2f}",
+            "Demanda térmica TOTAL (MJ/día)": f"{results_dict.get('demanda_termica_total_digestor_mj_dia',0):.2f}",
+        },
+        "Producción Energética (" + all_inputs.get('uso_biogas_texto','N/A') + "):": {
+            "Electricidad bruta generada (kWh/día)": f"{results_dict.get('electricidad_generada_bruta_kwh_dia',0):.2f}" if all_inputs.get('uso_biogas_opcion_idx') == 0 else "N/A",
+            "Calor útil generado (MJ/día)": f"{results_dict.get('calor_util_generado_mj_dia',0):.2f}",
+        } if all_inputs.get('uso_biogas_opcion_idx') != 2 else {
+            "Biometano neto (Nm³/día)": f"{results_dict.get('biometano_neto_nm3_dia',0):.2f}",
+            "Energía del biometano (kWh/día)": f"{results_dict.get('energia_biometano_kwh_dia',0):.2f}",
+            "Pérdida de metano (Nm³ CH₄/día)": f"{results_dict.get('ch4_perdido_upgrading_nm3_dia',0):.2f}",
+            "Calor de regeneración (MJ/día)": f"{results_dict.get('calor_upgrading_mj_dia',0):.2f}",
+        },
+         "Consumos Auxiliares:":{
+            "Consumo eléctrico auxiliar (kWh/día)": f"{results_dict.get('consumo_electrico_aux_total_kwh_dia',0):.2f}",
+            **({
+                "Consumo eléctrico upgrading (kWh/día)": f"{results_dict.get('consumo_electrico_upgrading_kwh_dia',0):.2f}",
+                "Consumo eléctrico compresión (kWh/día)": f"{results_dict.get('consumo_electrico_compresion_kwh_dia',0):.2f}",
+            } if all_inputs.get('uso_biogas_opcion_idx') == 2 else {}),
+        },
+        "BALANCE NETO:": {
+            "ELECTRICIDAD NETA EXPORTABLE (kWh/día)": f"{results_dict.get('electricidad_neta_exportable_kwh_dia',0):.2f}" if all_inputs.get('uso_biogas_opcion_idx') == 0 else f"{results_dict.get('electricidad_neta_exportable_kwh_dia',0):.2f} (Consumo)",
+            "CALOR NETO DISPONIBLE/DÉFICIT (MJ/día)": f"{results_dict.get('calor_neto_disponible_mj_dia',0):.2f}",
+        }
+    }
+    pdf.set_font(FUENTE_PDF, "B", 12)
+    pdf.cell(0, 10, sanitize_text_for_fpdf("RESULTADOS DEL BALANCE (por día)"), 0, 1, "L")
+    for section_title, data_items in results_data_pdf_content.items():
+        pdf.set_font(FUENTE_PDF, "BU", 10)
+        pdf.cell(0, 6, sanitize_text_for_fpdf(section_title), 0, 1, "L")
+        pdf.set_font(FUENTE_PDF, "", 9)
+        for key, value in data_items.items():
+            s_key = sanitize_text_for_fpdf(str(key))
+            s_val = sanitize_text_for_fpdf(str(value))
+            line = f"  {s_key.ljust(50)}: {s_val}"
+            try:
+                _escribir_linea_pdf(pdf, line)
+            except Exception as e_multicell_res:
+                print(f"Error en multi_cell resultados: '{line}'. Error: {e_multicell_res}")
+                _escribir_linea_pdf(pdf, f"Error al renderizar: {s_key}")
+        pdf.ln(2)
+
+    pdf.ln(5); pdf.set_font(FUENTE_PDF, "B", 10); pdf.cell(0, 6, sanitize_text_for_fpdf("Notas Importantes:"), 0, 1, "L")
+    pdf.set_font(FUENTE_PDF, "I", 9)
+    pdf.multi_cell(ANCHO_LINEA_PDF, 5, _NOTAS_PDF, 0, "L", new_x="LMARGIN", new_y="NEXT")
+
+    try:
+        pdf_salida = pdf.output()
+        # fpdf2 devuelve un bytearray; PyFPDF 1.x devolvía una cadena latin-1
+        return bytes(pdf_salida) if isinstance(pdf_salida, (bytes, bytearray)) else pdf_salida.encode('latin-1')
+    except Exception as e_pdf_output:
+        print(f"Error final al generar bytes del PDF: {e_pdf_output}")
+        return None
+
+
+def generar_excel_bytes_cacheado(all_inputs, results_dict, dim_digestor_dict, project_info):
+    clave = hash_contenido("xlsx", all_inputs, results_dict, dim_digestor_dict, project_info)
+    return _CACHE_EXPORTACIONES.obtener_o_calcular(clave, generar_excel_bytes, all_inputs, results_dict, dim_digestor_dict, project_info)
+
+
+def generar_pdf_bytes_cacheado(all_inputs, results_dict, dim_digestor_dict, project_info):
+    clave = hash_contenido("pdf", all_inputs, results_dict, dim_digestor_dict, project_info)
+    return _CACHE_EXPORTACIONES.obtener_o_calcular(clave, generar_pdf_bytes, all_inputs, results_dict, dim_digestor_dict, project_info)
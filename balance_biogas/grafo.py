@@ -0,0 +1,303 @@
+# balance_biogas/grafo.py
+"""Balance como grafo de dependencias con recálculo incremental.
+
+Cada magnitud derivada (SV alimentado, CH₄, biogás, PCI, pérdidas de calor,
+balances netos...) es un nodo con sus dependencias explícitas. Al cambiar una
+entrada solo se marcan como pendientes sus descendientes, y al pedir un valor
+solo se recalculan los nodos pendientes que hacen falta:
+
+    grafo = GrafoBalance()
+    grafo.actualizar(inputs_calc)                 # todo pendiente
+    grafo.resultados()                            # calcula todos los nodos
+    grafo.actualizar({"chp_eficiencia_electrica_porcentaje": 38.0})
+    grafo.resultados()                            # recalcula 2 nodos
+    grafo.ultimos_recalculados                    # ('electricidad_generada_bruta_kwh_dia', ...)
+
+El grafo del balance reproduce exactamente ``calcular_dimensiones_digestor`` y
+``realizar_calculos_balance``; el área del digestor es un nodo derivado de
+caudal y TRH. Solo usa la biblioteca estándar.
+"""
+import math
+import threading
+
+from . import upgrading
+from .calculos import CLAVES_DIMENSIONES, CLAVES_RESULTADOS, ENTRADAS_POR_DEFECTO, PCI_CH4_MJ_NM3
+
+
+class Nodo:
+    __slots__ = ("nombre", "dependencias", "funcion", "descripcion")
+
+    def __init__(self, nombre, dependencias, funcion, descripcion=""):
+        self.nombre = nombre
+        self.dependencias = tuple(dependencias)
+        self.funcion = funcion
+        self.descripcion = descripcion
+
+
+class GrafoCalculo:
+    """Grafo acíclico de nodos calculados a partir de entradas con nombre.
+
+    ``valores_por_defecto`` da valor a entradas opcionales que no se hayan
+    indicado. Cada operación se serializa con un cerrojo interno.
+    """
+
+    def __init__(self, nodos, valores_por_defecto=None):
+        self._nodos = {}
+        for nodo in nodos:
+            if nodo.nombre in self._nodos:
+                raise ValueError(f"Nodo duplicado: {nodo.nombre!r}")
+            self._nodos[nodo.nombre] = nodo
+        self.entradas_grafo = tuple(sorted({
+            dependencia for nodo in self._nodos.values() for dependencia in nodo.dependencias if dependencia not in self._nodos
+        }))
+        self._orden = self._ordenar_topologicamente()
+        posicion = {nombre: i for i, nombre in enumerate(self._orden)}
+        directos = {nombre: [] for nombre in (*self.entradas_grafo, *self._orden)}
+        for nodo in self._nodos.values():
+            for dependencia in nodo.dependencias:
+                directos[dependencia].append(nodo.nombre)
+        self._dependientes = {nombre: tuple(sorted(hijos, key=posicion.get)) for nombre, hijos in directos.items()}
+        # Cierres transitivos precalculados: marcar pendientes y elegir qué recalcular no recorre el grafo
+        self._descendientes = {nombre: self._cerrar(nombre, self._dependientes) for nombre in directos}
+        dependencias = {nombre: nodo.dependencias for nombre, nodo in self._nodos.items()}
+        self._ascendientes = {nombre: self._cerrar(nombre, dependencias) for nombre in self._orden}
+
+        self._valores = dict(valores_por_defecto or {})
+        self._pendientes = set(self._orden)
+        self._cerrojo = threading.RLock()
+        self.recalculos = dict.fromkeys(self._orden, 0)
+        self.ultimos_recalculados = ()
+
+    def _ordenar_topologicamente(self):
+        orden, estado = [], {}
+
+        def visitar(nombre, camino):
+            if estado.get(nombre) == "hecho" or nombre not in self._nodos:
+                return
+            if estado.get(nombre) == "visitando":
+                raise ValueError(f"Dependencia circular: {' -> '.join((*camino, nombre))}")
+            estado[nombre] = "visitando"
+            for dependencia in self._nodos[nombre].dependencias:
+                visitar(dependencia, (*camino, nombre))
+            estado[nombre] = "hecho"
+            orden.append(nombre)
+
+        for nombre in self._nodos:
+            visitar(nombre, ())
+        return tuple(orden)
+
+    @staticmethod
+    def _cerrar(nombre, relacion):
+        vistos, pila = set(), list(relacion.get(nombre, ()))
+        while pila:
+            actual = pila.pop()
+            if actual not in vistos:
+                vistos.add(actual)
+                pila.extend(relacion.get(actual, ()))
+        return frozenset(vistos)
+
+    # --- Estructura (para explicar las dependencias en la interfaz) ---
+
+    @property
+    def nodos(self):
+        return self._orden
+
+    def nodo(self, nombre):
+        return self._nodos[nombre]
+
+    def dependencias(self, nombre):
+        """Dependencias directas de un nodo (vacío para una entrada)."""
+        nodo = self._nodos.get(nombre)
+        return nodo.dependencias if nodo is not None else ()
+
+    def dependientes(self, nombre):
+        """Nodos que usan directamente ``nombre``."""
+        return self._dependientes.get(nombre, ())
+
+    def entradas_de(self, nombre):
+        """Entradas de las que depende ``nombre``, directa o indirectamente."""
+        return tuple(sorted(a for a in self._ascendientes.get(nombre, ()) if a not in self._nodos))
+
+    def afectados_por(self, nombre):
+        """Nodos que cambian si cambia ``nombre``, en orden de cálculo."""
+        descendientes = self._descendientes.get(nombre, frozenset())
+        return tuple(n for n in self._orden if n in descendientes)
+
+    # --- Valores ---
+
+    def actualizar(self, entradas):
+        """Fija valores de entrada y marca como pendientes los nodos afectados.
+
+        Se ignoran las claves que no son entradas del grafo (textos de la
+        interfaz, nodos calculados como el área...). Devuelve el conjunto de
+        entradas que han cambiado.
+        """
+        cambiadas = set()
+        with self._cerrojo:
+            for nombre in self.entradas_grafo:
+                if nombre not in entradas:
+                    continue
+                valor = entradas[nombre]
+                if nombre not in self._valores or self._valores[nombre] != valor:
+                    self._valores[nombre] = valor
+                    cambiadas.add(nombre)
+                    self._pendientes |= self._descendientes[nombre]
+        return cambiadas
+
+    def _calcular(self, objetivos):
+        """Calcula, en orden topológico, los nodos pendientes necesarios para ``objetivos``."""
+        necesarios = set()
+        for nombre in objetivos:
+            if nombre in self._nodos:
+                necesarios.add(nombre)
+                necesarios |= self._ascendientes[nombre] & self._pendientes
+        recalculados = []
+        for nombre in self._orden:
+            if nombre not in necesarios or nombre not in self._pendientes:
+                continue
+            nodo = self._nodos[nombre]
+            try:
+                argumentos = [self._valores[dependencia] for dependencia in nodo.dependencias]
+            except KeyError as e_falta:
+                raise KeyError(f"Falta la entrada {e_falta.args[0]!r} para calcular '{nombre}'") from None
+            self._valores[nombre] = nodo.funcion(*argumentos)
+            self._pendientes.discard(nombre)
+            self.recalculos[nombre] += 1
+            recalculados.append(nombre)
+        self.ultimos_recalculados = tuple(recalculados)
+
+    def valor(self, nombre):
+        with self._cerrojo:
+            if nombre in self._pendientes:
+                self._calcular((nombre,))
+            return self._valores[nombre]
+
+    def valores(self, nombres):
+        with self._cerrojo:
+            self._calcular(nombres)
+            return {nombre: self._valores[nombre] for nombre in nombres}
+
+    @property
+    def pendientes(self):
+        return tuple(n for n in self._orden if n in self._pendientes)
+
+
+# --- Nodos del balance (mismas fórmulas y ramas que calculos.py) ---
+
+def _diametro(volumen_digestor_m3):
+    return (4 * volumen_digestor_m3 / math.pi)**(1/3) if volumen_digestor_m3 > 0 else 0.0
+
+
+def _area(volumen_digestor_m3, diametro_digestor_m):
+    return 1.5 * math.pi * (diametro_digestor_m**2) if volumen_digestor_m3 > 0 else 0.0
+
+
+def _biogas(ch4_producido_nm3_dia, ch4_en_biogas_porcentaje):
+    return ch4_producido_nm3_dia / (ch4_en_biogas_porcentaje / 100) if ch4_en_biogas_porcentaje > 0 else 0
+
+
+def _perdidas(u_digestor_w_m2_k, area_superficial_digestor_m2, temp_op_digestor_c, temp_ambiente_promedio_c):
+    delta_t_digestor_ambiente = temp_op_digestor_c - temp_ambiente_promedio_c
+    if delta_t_digestor_ambiente > 0 and area_superficial_digestor_m2 > 0:
+        return (u_digestor_w_m2_k * area_superficial_digestor_m2 * delta_t_digestor_ambiente * 3600 * 24) / 1000000
+    return 0.0
+
+
+def _electricidad_bruta(uso_biogas_opcion_idx, energia_bruta_biogas_kwh_dia, chp_eficiencia_electrica_porcentaje):
+    if uso_biogas_opcion_idx == 0:  # CHP
+        return energia_bruta_biogas_kwh_dia * (chp_eficiencia_electrica_porcentaje / 100)
+    return 0.0
+
+
+def _calor_util(uso_biogas_opcion_idx, energia_bruta_biogas_mj_dia, chp_eficiencia_termica_porcentaje, caldera_eficiencia_porcentaje):
+    if uso_biogas_opcion_idx == 0:  # CHP
+        return energia_bruta_biogas_mj_dia * (chp_eficiencia_termica_porcentaje / 100)
+    if uso_biogas_opcion_idx == 1:  # Caldera
+        return energia_bruta_biogas_mj_dia * (caldera_eficiencia_porcentaje / 100)
+    return 0.0
+
+
+def _solo_upgrading(etapa):
+    """Nodo que aplica ``etapa`` de upgrading.py solo si el biogás va a upgrading (0 en otro caso)."""
+    def calcular(uso_biogas_opcion_idx, *argumentos):
+        return etapa(*argumentos) if uso_biogas_opcion_idx == 2 else 0.0
+    return calcular
+
+
+def _energia_biometano(uso_biogas_opcion_idx, ch4_producido_nm3_dia, ch4_perdido_upgrading_nm3_dia):
+    if uso_biogas_opcion_idx == 2:
+        return (ch4_producido_nm3_dia - ch4_perdido_upgrading_nm3_dia) * PCI_CH4_MJ_NM3 / 3.6
+    return 0.0
+
+
+NODOS_BALANCE = (
+    Nodo("volumen_digestor_m3", ("caudal_sustrato_kg_dia", "densidad_sustrato_kg_m3", "trh_dias"),
+         lambda caudal, densidad, trh: (caudal / densidad) * trh, "Volumen útil = caudal / densidad × TRH"),
+    Nodo("diametro_digestor_m", ("volumen_digestor_m3",), _diametro, "Cilindro con H = D"),
+    Nodo("altura_digestor_m", ("diametro_digestor_m",), lambda diametro: diametro, "H = D"),
+    Nodo("area_superficial_digestor_m2", ("volumen_digestor_m3", "diametro_digestor_m"), _area, "Paredes, techo y fondo: 1,5·π·D²"),
+    Nodo("sv_alimentado_kg_dia", ("caudal_sustrato_kg_dia", "st_porcentaje", "sv_de_st_porcentaje"),
+         lambda caudal, st, sv: caudal * (st / 100) * (sv / 100), "Caudal × ST × SV/ST"),
+    Nodo("ch4_producido_nm3_dia", ("sv_alimentado_kg_dia", "bmp_nm3_ch4_kg_sv", "eficiencia_digestion_porcentaje"),
+         lambda sv, bmp, eficiencia: sv * bmp * (eficiencia / 100), "SV × BMP × eficiencia de digestión"),
+    Nodo("biogas_producido_nm3_dia", ("ch4_producido_nm3_dia", "ch4_en_biogas_porcentaje"), _biogas, "CH₄ / fracción de CH₄"),
+    Nodo("pci_biogas_mj_nm3", ("ch4_en_biogas_porcentaje",), lambda ch4: PCI_CH4_MJ_NM3 * (ch4 / 100), "PCI del CH₄ × fracción de CH₄"),
+    Nodo("energia_bruta_biogas_mj_dia", ("biogas_producido_nm3_dia", "pci_biogas_mj_nm3"), lambda biogas, pci: biogas * pci, "Biogás × PCI"),
+    Nodo("energia_bruta_biogas_kwh_dia", ("energia_bruta_biogas_mj_dia",), lambda mj: mj / 3.6, "MJ / 3,6"),
+    Nodo("calor_calentar_sustrato_mj_dia", ("caudal_sustrato_kg_dia", "cp_sustrato_kj_kg_c", "temp_op_digestor_c", "temp_sustrato_entrada_c"),
+         lambda caudal, cp, t_op, t_entrada: (caudal * cp * (t_op - t_entrada)) / 1000, "Caudal × Cp × (T digestor − T entrada)"),
+    Nodo("perdidas_calor_digestor_mj_dia", ("u_digestor_w_m2_k", "area_superficial_digestor_m2", "temp_op_digestor_c", "temp_ambiente_promedio_c"),
+         _perdidas, "U × área × (T digestor − T ambiente)"),
+    Nodo("demanda_termica_total_digestor_mj_dia", ("calor_calentar_sustrato_mj_dia", "perdidas_calor_digestor_mj_dia"),
+         lambda calentar, perdidas: calentar + perdidas, "Calentamiento del sustrato + pérdidas"),
+    Nodo("demanda_termica_total_digestor_kwh_dia", ("demanda_termica_total_digestor_mj_dia",), lambda mj: mj / 3.6, "MJ / 3,6"),
+    Nodo("electricidad_generada_bruta_kwh_dia", ("uso_biogas_opcion_idx", "energia_bruta_biogas_kwh_dia", "chp_eficiencia_electrica_porcentaje"),
+         _electricidad_bruta, "Energía del biogás × eficiencia eléctrica (solo CHP)"),
+    Nodo("calor_util_generado_mj_dia", ("uso_biogas_opcion_idx", "energia_bruta_biogas_mj_dia", "chp_eficiencia_termica_porcentaje", "caldera_eficiencia_porcentaje"),
+         _calor_util, "Energía del biogás × eficiencia térmica (CHP o caldera)"),
+    Nodo("consumo_electrico_aux_total_kwh_dia", ("caudal_sustrato_kg_dia", "consumo_electrico_aux_kwh_ton_sustrato"),
+         lambda caudal, consumo: (caudal / 1000) * consumo, "Caudal (t) × consumo específico"),
+    Nodo("consumo_electrico_upgrading_kwh_dia", ("uso_biogas_opcion_idx", "biogas_producido_nm3_dia", "upgrading_tecnologia_idx"),
+         _solo_upgrading(upgrading.consumo_electrico_upgrading), "Biogás × consumo específico de la tecnología (solo upgrading)"),
+    Nodo("calor_upgrading_mj_dia", ("uso_biogas_opcion_idx", "biogas_producido_nm3_dia", "upgrading_tecnologia_idx"),
+         _solo_upgrading(upgrading.calor_upgrading), "Biogás × calor de regeneración (solo aminas)"),
+    Nodo("ch4_perdido_upgrading_nm3_dia", ("uso_biogas_opcion_idx", "ch4_producido_nm3_dia", "upgrading_tecnologia_idx"),
+         _solo_upgrading(upgrading.ch4_perdido_upgrading), "CH₄ × pérdida de metano de la tecnología"),
+    Nodo("biometano_neto_nm3_dia", ("uso_biogas_opcion_idx", "ch4_producido_nm3_dia", "ch4_perdido_upgrading_nm3_dia", "upgrading_tecnologia_idx"),
+         _solo_upgrading(upgrading.biometano_neto), "(CH₄ − pérdida) / pureza del biometano"),
+    Nodo("consumo_electrico_compresion_kwh_dia", ("uso_biogas_opcion_idx", "biometano_neto_nm3_dia", "upgrading_tecnologia_idx", "presion_inyeccion_bar"),
+         _solo_upgrading(upgrading.consumo_electrico_compresion), "Biometano × trabajo de compresión hasta la presión de inyección"),
+    Nodo("energia_biometano_kwh_dia", ("uso_biogas_opcion_idx", "ch4_producido_nm3_dia", "ch4_perdido_upgrading_nm3_dia"),
+         _energia_biometano, "CH₄ inyectado × PCI del CH₄"),
+    Nodo("electricidad_neta_exportable_kwh_dia",
+         ("electricidad_generada_bruta_kwh_dia", "consumo_electrico_aux_total_kwh_dia", "consumo_electrico_upgrading_kwh_dia", "consumo_electrico_compresion_kwh_dia"),
+         lambda bruta, aux, consumo_upgrading, compresion: bruta - aux - consumo_upgrading - compresion,
+         "Generación bruta − consumo auxiliar − upgrading − compresión"),
+    Nodo("calor_neto_disponible_mj_dia", ("calor_util_generado_mj_dia", "demanda_termica_total_digestor_mj_dia", "calor_upgrading_mj_dia"),
+         lambda util, demanda, calor_upgrading: util - demanda - calor_upgrading, "Calor útil − demanda térmica del digestor − calor del upgrading"),
+    Nodo("calor_neto_disponible_kwh_dia", ("calor_neto_disponible_mj_dia",), lambda mj: mj / 3.6, "MJ / 3,6"),
+)
+
+# Entradas opcionales (mismos valores que usan las funciones escalares si faltan)
+VALORES_POR_DEFECTO_BALANCE = {
+    "densidad_sustrato_kg_m3": 1000,
+    "chp_eficiencia_electrica_porcentaje": 0,
+    "chp_eficiencia_termica_porcentaje": 0,
+    "caldera_eficiencia_porcentaje": 0,
+    "upgrading_tecnologia_idx": ENTRADAS_POR_DEFECTO["upgrading_tecnologia_idx"],
+    "presion_inyeccion_bar": ENTRADAS_POR_DEFECTO["presion_inyeccion_bar"],
+}
+
+
+class GrafoBalance(GrafoCalculo):
+    """Grafo del balance energético con accesos a dimensiones y resultados."""
+
+    def __init__(self, nodos_adicionales=()):
+        super().__init__((*NODOS_BALANCE, *nodos_adicionales), VALORES_POR_DEFECTO_BALANCE)
+
+    def dimensiones(self):
+        return self.valores(CLAVES_DIMENSIONES)
+
+    def resultados(self):
+        return self.valores(CLAVES_RESULTADOS)
+
@@ -0,0 +1,178 @@
+# balance_biogas/horario.py
+"""Simulación térmica por pasos de tiempo (horaria o inferior) a partir de series climáticas.
+
+Las series se leen de CSV en bloques, por lo que la memoria no depende de la
+longitud del registro (varios años a 10 minutos se procesan igual que un año
+horario). Formato esperado: una fila de cabecera, una columna de fecha/hora en
+formato ISO (``2023-01-01 00:00``) y una columna de temperatura en °C. Se
+admiten separadores ``,``, ``;`` y tabulador; con ``;`` se acepta coma decimal.
+"""
+import csv
+from itertools import zip_longest
+
+import numpy as np
+
+from .vectorizado import evaluar_escenarios_lote
+
+TAM_BLOQUE_POR_DEFECTO = 100_000
+
+
+def _abrir(origen):
+    if hasattr(origen, "read"):
+        return origen, False
+    return open(origen, newline="", encoding="utf-8-sig"), True
+
+
+def leer_serie_csv(origen, columna_valor=None, columna_fecha=None, tam_bloque=TAM_BLOQUE_POR_DEFECTO):
+    """Genera bloques ``(fechas, valores)`` de una serie temporal en CSV.
+
+    ``origen`` puede ser una ruta o un fichero de texto abierto. Si no se
+    indican columnas se usan la primera (fecha) y la segunda (valor).
+    """
+    fichero, cerrar = _abrir(origen)
+    try:
+        cabecera_linea = fichero.readline()
+        separador = max(",;\t", key=cabecera_linea.count)
+        cabecera = next(csv.reader([cabecera_linea], delimiter=separador))
+        cabecera = [c.strip() for c in cabecera]
+        idx_fecha = cabecera.index(columna_fecha) if columna_fecha else 0
+        idx_valor = cabecera.index(columna_valor) if columna_valor else 1
+        coma_decimal = separador == ";"
+
+        fechas, valores = [], []
+        for fila in csv.reader(fichero, delimiter=separador):
+            if not fila:
+                continue
+            fechas.append(fila[idx_fecha].strip())
+            valor = fila[idx_valor].strip()
+            valores.append(valor.replace(",", ".") if coma_decimal else valor)
+            if len(fechas) >= tam_bloque:
+                yield np.array(fechas, dtype="datetime64[s]"), np.array(valores, dtype=np.float64)
+                fechas, valores = [], []
+        if fechas:
+            yield np.array(fechas, dtype="datetime64[s]"), np.array(valores, dtype=np.float64)
+    finally:
+        if cerrar:
+            fichero.close()
+
+
+def simular_balance_horario(entradas, serie_ambiente, serie_sustrato=None, paso_horas=None):
+    """Recorre la serie de temperatura ambiente y acumula el balance térmico paso a paso.
+
+    ``entradas`` son las entradas del balance (``area_superficial_digestor_m2``
+    o ``trh_dias`` para dimensionar). ``serie_ambiente`` y ``serie_sustrato``
+    son iterables de bloques ``(fechas, valores)`` como los de
+    ``leer_serie_csv``, con las mismas fechas; sin serie de sustrato se usa
+    ``temp_sustrato_entrada_c``.
+    Sin ``paso_horas`` cada registro representa el tiempo desde el anterior,
+    así que los huecos y los cambios de resolución se ponderan correctamente.
+    El suministro de calor (CHP o caldera) es constante; la demanda varía con
+    la temperatura ambiente y la de entrada del sustrato, más el calor de
+    regeneración del upgrading con aminas, constante como en el balance.
+    """
+    base = evaluar_escenarios_lote({k: v for k, v in entradas.items() if not isinstance(v, str)})
+    area = float(base["area_superficial_digestor_m2"][0])
+    calor_util_mj_dia = float(base["calor_util_generado_mj_dia"][0])
+    calor_upgrading_mj_dia = float(base["calor_upgrading_mj_dia"][0])
+    caudal = float(entradas["caudal_sustrato_kg_dia"])
+    cp = float(entradas["cp_sustrato_kj_kg_c"])
+    temp_op = float(entradas["temp_op_digestor_c"])
+    u = float(entradas["u_digestor_w_m2_k"])
+
+    n_pasos = 0
+    horas_deficit = 0.0
+    deficit_total_mj = demanda_total_mj = suministro_total_mj = 0.0
+    pico_deficit_kw = 0.0
+    fecha_pico = None
+    mensual = {}
+    fecha_anterior = paso_nominal = None
+
+    bloques_sustrato = serie_sustrato if serie_sustrato is not None else ()
+    for bloque_amb, bloque_sus in zip_longest(serie_ambiente, bloques_sustrato):
+        if bloque_amb is None:
+            raise ValueError("La serie de temperatura del sustrato es más larga que la de temperatura ambiente")
+        fechas, temp_amb = bloque_amb
+        if not len(fechas):
+            continue
+        if serie_sustrato is not None:
+            if bloque_sus is None or len(bloque_sus[1]) != len(temp_amb):
+                raise ValueError("Las series de temperatura ambiente y del sustrato no tienen la misma longitud")
+            distintas = np.asarray(bloque_sus[0]) != fechas
+            if np.any(distintas):
+                i_mal = int(np.argmax(distintas))
+                raise ValueError(
+                    f"Las series de temperatura ambiente y del sustrato no tienen las mismas fechas "
+                    f"(registro {fechas[i_mal]} frente a {bloque_sus[0][i_mal]})"
+                )
+            temp_entrada = bloque_sus[1]
+        else:
+            temp_entrada = float(entradas["temp_sustrato_entrada_c"])
+        if paso_horas is not None:
+            pasos = np.full(len(fechas), float(paso_horas))
+        else:
+            # Cada registro pesa el tiempo transcurrido desde el anterior (huecos y series irregulares incluidos);
+            # el primero de la serie, el mismo que el segundo
+            if fecha_anterior is None:
+                if len(fechas) < 2:
+                    raise ValueError("No se puede inferir el paso de tiempo con menos de dos registros; indique paso_horas")
+                fecha_anterior = fechas[0] - (fechas[1] - fechas[0])
+            pasos = np.diff(fechas, prepend=fecha_anterior) / np.timedelta64(1, "h")
+            if np.any(pasos <= 0):
+                i_mal = int(np.argmax(pasos <= 0))
+                raise ValueError(f"Las fechas de la serie deben estar en orden cronológico y sin duplicados (registro {fechas[i_mal]})")
+            fecha_anterior = fechas[-1]
+            if paso_nominal is None:
+                paso_nominal = float(pasos[0])
+        fraccion_dia = pasos / 24
+
+        # Mismas expresiones que realizar_calculos_balance, evaluadas por paso
+        calor_sustrato = (caudal * cp * (temp_op - temp_entrada)) / 1000
+        delta_t = temp_op - temp_amb
+        perdidas = np.where((delta_t > 0) & (area > 0), (u * area * delta_t * 3600 * 24) / 1000000, 0.0)
+        demanda = (calor_sustrato + perdidas + calor_upgrading_mj_dia) * fraccion_dia
+        suministro = calor_util_mj_dia * fraccion_dia
+        neto = suministro - demanda
+        en_deficit = neto < 0
+
+        n_pasos += len(fechas)
+        horas_deficit += float(pasos[en_deficit].sum())
+        deficit_total_mj -= float(neto[en_deficit].sum())
+        demanda_total_mj += float(demanda.sum())
+        suministro_total_mj += float(suministro.sum())
+        deficit_kw = -neto / (pasos * 3.6)
+        i_max = int(np.argmax(deficit_kw))
+        if deficit_kw[i_max] > pico_deficit_kw:
+            pico_deficit_kw = float(deficit_kw[i_max])
+            fecha_pico = str(fechas[i_max])
+
+        meses = fechas.astype("datetime64[M]")
+        cortes = np.flatnonzero(np.r_[True, meses[1:] != meses[:-1]])
+        demanda_mes = np.add.reduceat(demanda, cortes)
+        deficit_mes = np.add.reduceat(np.where(en_deficit, -neto, 0.0), cortes)
+        suministro_mes = np.add.reduceat(suministro, cortes)
+        horas_deficit_mes = np.add.reduceat(np.where(en_deficit, pasos, 0.0), cortes)
+        for j, inicio in enumerate(cortes):
+            acumulado = mensual.setdefault(str(meses[inicio]), {
+                "demanda_mj": 0.0, "suministro_mj": 0.0, "deficit_mj": 0.0, "horas_deficit": 0.0,
+            })
+            acumulado["demanda_mj"] += float(demanda_mes[j])
+            acumulado["suministro_mj"] += float(suministro_mes[j])
+            acumulado["deficit_mj"] += float(deficit_mes[j])
+            acumulado["horas_deficit"] += float(horas_deficit_mes[j])
+
+    if not n_pasos:
+        raise ValueError("La serie de temperatura ambiente está vacía")
+    return {
+        "n_pasos": n_pasos,
+        "paso_horas": paso_horas if paso_horas is not None else paso_nominal,
+        "area_superficial_digestor_m2": area,
+        "pico_deficit_kw": pico_deficit_kw,
+        "fecha_pico_deficit": fecha_pico,
+        "horas_deficit": horas_deficit,
+        "deficit_total_mj": deficit_total_mj,
+        "demanda_total_mj": demanda_total_mj,
+        "suministro_total_mj": suministro_total_mj,
+        "mensual": [
+            dict(mes=mes, neto_mj=v["suministro_mj"] - v["demanda_mj"], **v) for mes, v in mensual.items()
+        ],
+    }
@@ -0,0 +1,93 @@
+# balance_biogas/informes.py
+"""Generación de informes PDF por lotes: uno por planta, empaquetados en un ZIP.
+
+Las plantas se leen del mismo CSV/JSONL que usa ``python -m balance_biogas lote``.
+El balance de cada bloque se calcula con el motor vectorizado y los PDF se
+generan en un grupo de procesos; cada proceso importa FPDF y carga las
+métricas de la fuente una sola vez. Los informes se escriben en el ZIP a medida
+que llegan, en el orden de entrada.
+"""
+import datetime
+import os
+import re
+import time
+import zipfile
+
+from .calculos import CLAVES_DIMENSIONES, OPCIONES_USO_BIOGAS
+from .cli import agrupar, ejecutar_en_orden, evaluar_columnas, filas_a_columnas, leer_filas, tareas_por_bloque
+from .exportar import FPDF_AVAILABLE, FUENTE_PDF, generar_pdf_bytes, sanitize_text_for_fpdf
+
+TAM_BLOQUE_INFORMES = 16
+
+
+def _inicializar_trabajador():
+    """Importa FPDF y carga las métricas de la fuente estándar antes del primer informe."""
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    for estilo in ("", "B", "BU", "I"):
+        pdf.set_font(FUENTE_PDF, estilo, 10)
+        pdf.get_string_width("Balance")
+    pdf.output()
+
+
+def _nombre_fichero(n_fila, nombre):
+    base = re.sub(r"[^A-Za-z0-9_-]+", "_", sanitize_text_for_fpdf(nombre)).strip("_")[:60]
+    return f"{n_fila:05d}_{base or 'planta'}.pdf"
+
+
+def _informes_bloque(filas, primera_fila, analista, fecha):
+    columnas = filas_a_columnas(filas, primera_fila)
+    salida = evaluar_columnas(columnas)
+    entradas_listas = {clave: valores.tolist() for clave, valores in columnas.items()}
+    salida_listas = {clave: valores.tolist() for clave, valores in salida.items()}
+
+    informes = []
+    for i, fila in enumerate(filas):
+        n_fila = primera_fila + i
+        all_inputs = {clave: valores[i] for clave, valores in entradas_listas.items()}
+        uso_idx = int(all_inputs["uso_biogas_opcion_idx"])
+        all_inputs["uso_biogas_opcion_idx"] = uso_idx
+        all_inputs["uso_biogas_texto"] = OPCIONES_USO_BIOGAS[uso_idx] if 0 <= uso_idx < len(OPCIONES_USO_BIOGAS) else "N/A"
+        all_inputs["sustrato_nombre"] = fila.get("sustrato_nombre") or "N/A"
+        all_inputs["bmp_fuente_texto"] = fila.get("bmp_fuente_texto") or "N/A"
+        all_inputs["temp_op_digestor_texto"] = fila.get("temp_op_digestor_texto") or "N/A"
+        dimensiones = {clave: salida_listas[clave][i] for clave in CLAVES_DIMENSIONES}
+        resultados = {clave: valores[i] for clave, valores in salida_listas.items() if clave not in CLAVES_DIMENSIONES}
+        nombre = str(fila.get("nombre") or fila.get("id") or f"Planta {n_fila}")
+        project_info = {"nombre": nombre, "analista": fila.get("analista") or analista, "fecha": fecha}
+        pdf_bytes = generar_pdf_bytes(all_inputs, resultados, dimensiones, project_info)
+        if pdf_bytes is not None:
+            informes.append((_nombre_fichero(n_fila, nombre), pdf_bytes))
+    return informes
+
+
+def generar_informes_zip(entrada, destino, formato_entrada=None, analista="", procesos=None, tam_bloque=TAM_BLOQUE_INFORMES):
+    """Genera un PDF por planta de ``entrada`` y los escribe en el ZIP ``destino`` (ruta o fichero binario).
+
+    Devuelve un resumen con el número de informes, la duración y el
+    rendimiento en informes por segundo.
+    """
+    if not FPDF_AVAILABLE:
+        raise ValueError("Exportación a PDF no disponible (falta 'fpdf2').")
+    if procesos is None:
+        procesos = os.cpu_count() or 1
+    fecha = datetime.date.today().strftime("%Y-%m-%d")
+    inicio = time.perf_counter()
+    n_informes = 0
+    bloques = agrupar(leer_filas(entrada, formato_entrada), max(1, tam_bloque))
+    # Los PDF ya van comprimidos internamente: deflate apenas reduce su tamaño
+    with zipfile.ZipFile(destino, "w", compression=zipfile.ZIP_STORED) as archivo_zip:
+        for informes in ejecutar_en_orden(
+            _informes_bloque, tareas_por_bloque(bloques, analista, fecha), procesos, inicializador=_inicializar_trabajador,
+        ):
+            for nombre_fichero, pdf_bytes in informes:
+                archivo_zip.writestr(nombre_fichero, pdf_bytes)
+            n_informes += len(informes)
+    segundos = time.perf_counter() - inicio
+    return {
+        "n_informes": n_informes,
+        "segundos": segundos,
+        "informes_por_segundo": n_informes / segundos if segundos else 0.0,
+    }
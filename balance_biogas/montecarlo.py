@@ -0,0 +1,127 @@
+# balance_biogas/montecarlo.py
+"""Análisis de incertidumbre por Monte Carlo sobre el motor vectorizado.
+
+Las distribuciones se describen con diccionarios:
+    {"tipo": "triangular", "min": 0.25, "moda": 0.35, "max": 0.42}
+    {"tipo": "normal", "media": 0.5, "desviacion": 0.1}
+    {"tipo": "uniforme", "min": 5.0, "max": 15.0}
+
+El muestreo se reparte en bloques con semillas hijas de ``numpy.random.SeedSequence``,
+de modo que el resultado depende solo de la semilla y del tamaño de bloque,
+no del número de procesos.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .calculos import LIMITES_FISICOS
+from .vectorizado import evaluar_escenarios_lote
+
+TIPOS_DISTRIBUCION = ("triangular", "normal", "uniforme")
+PERCENTILES = (10, 50, 90)
+
+
+def muestrear_distribucion(rng, distribucion, n):
+    tipo = distribucion["tipo"]
+    if tipo == "triangular":
+        if distribucion["min"] == distribucion["max"]:
+            return np.full(n, float(distribucion["min"]))
+        return rng.triangular(distribucion["min"], distribucion["moda"], distribucion["max"], n)
+    if tipo == "normal":
+        return rng.normal(distribucion["media"], distribucion["desviacion"], n)
+    if tipo == "uniforme":
+        return rng.uniform(distribucion["min"], distribucion["max"], n)
+    raise ValueError(f"Distribución desconocida: {tipo!r}. Opciones: {', '.join(TIPOS_DISTRIBUCION)}")
+
+
+def _muestrear_columnas(entradas_base, distribuciones, semilla, n):
+    rng = np.random.default_rng(semilla)
+    columnas = dict(entradas_base)
+    # Orden de muestreo fijo para que la semilla sea reproducible
+    for clave in sorted(distribuciones):
+        muestras = muestrear_distribucion(rng, distribuciones[clave], n)
+        minimo, maximo = LIMITES_FISICOS.get(clave, (None, None))
+        if minimo is not None or maximo is not None:
+            np.clip(muestras, minimo, maximo, out=muestras)
+        columnas[clave] = muestras
+    return columnas
+
+
+def _evaluar_bloque(entradas_base, distribuciones, semilla, n):
+    resultados = evaluar_escenarios_lote(_muestrear_columnas(entradas_base, distribuciones, semilla, n))
+    electricidad = np.broadcast_to(resultados["electricidad_neta_exportable_kwh_dia"], (n,))
+    calor = np.broadcast_to(resultados["calor_neto_disponible_mj_dia"], (n,))
+    return np.array(electricidad), np.array(calor)
+
+
+def _planificar_bloques(distribuciones, n_muestras, semilla, tam_bloque):
+    for clave, distribucion in distribuciones.items():
+        if distribucion.get("tipo") not in TIPOS_DISTRIBUCION:
+            raise ValueError(f"Distribución desconocida para '{clave}': {distribucion.get('tipo')!r}")
+    n_muestras = int(n_muestras)
+    if n_muestras <= 0:
+        raise ValueError("n_muestras debe ser mayor que 0")
+    tam_bloque = max(1, int(tam_bloque))
+    tamanos = [tam_bloque] * (n_muestras // tam_bloque)
+    if n_muestras % tam_bloque:
+        tamanos.append(n_muestras % tam_bloque)
+    return np.random.SeedSequence(semilla).spawn(len(tamanos)), tamanos
+
+
+def _solo_numericas(entradas_base):
+    return {clave: valor for clave, valor in entradas_base.items() if not isinstance(valor, str)}
+
+
+def iterar_escenarios_montecarlo(entradas_base, distribuciones, n_muestras=100_000, semilla=0, tam_bloque=50_000):
+    """Genera, bloque a bloque, las entradas muestreadas y todas las salidas de cada escenario.
+
+    Usa las mismas semillas por bloque que ``simular_montecarlo``, de modo que
+    los escenarios exportados son exactamente los que resumen sus percentiles.
+    """
+    semillas, tamanos = _planificar_bloques(distribuciones, n_muestras, semilla, tam_bloque)
+    entradas_base = _solo_numericas(entradas_base)
+    for semilla_bloque, n in zip(semillas, tamanos):
+        columnas = _muestrear_columnas(entradas_base, distribuciones, semilla_bloque, n)
+        bloque = {clave: columnas[clave] for clave in sorted(distribuciones)}
+        bloque.update(evaluar_escenarios_lote(columnas))
+        yield bloque
+
+
+def _resumen(valores):
+    p10, p50, p90 = np.percentile(valores, PERCENTILES)
+    return {"P10": float(p10), "P50": float(p50), "P90": float(p90), "media": float(valores.mean())}
+
+
+def simular_montecarlo(entradas_base, distribuciones, n_muestras=100_000, semilla=0, tam_bloque=50_000, procesos=None):
+    """Muestrea las entradas inciertas y resume la electricidad y el calor netos.
+
+    ``entradas_base`` son las entradas escalares del balance (incluido ``trh_dias``);
+    ``distribuciones`` sustituye algunas de ellas por una distribución. Con
+    ``procesos=1`` todo se evalúa en el proceso actual.
+    """
+    semillas, tamanos = _planificar_bloques(distribuciones, n_muestras, semilla, tam_bloque)
+    n_muestras = sum(tamanos)
+    entradas_base = _solo_numericas(entradas_base)
+
+    if procesos is None:
+        procesos = min(len(tamanos), os.cpu_count() or 1)
+    if procesos <= 1 or len(tamanos) <= 1:
+        bloques = [_evaluar_bloque(entradas_base, distribuciones, s, n) for s, n in zip(semillas, tamanos)]
+    else:
+        with ProcessPoolExecutor(max_workers=procesos) as ejecutor:
+            bloques = list(ejecutor.map(
+                _evaluar_bloque,
+                [entradas_base] * len(tamanos), [distribuciones] * len(tamanos), semillas, tamanos,
+            ))
+
+    electricidad = np.concatenate([b[0] for b in bloques])
+    calor = np.concatenate([b[1] for b in bloques])
+    return {
+        "n_muestras": n_muestras,
+        "semilla": semilla,
+        "electricidad_neta_exportable_kwh_dia": _resumen(electricidad),
+        "calor_neto_disponible_mj_dia": _resumen(calor),
+        "prob_deficit_electrico": float(np.count_nonzero(electricidad < 0) / n_muestras),
+        "prob_deficit_termico": float(np.count_nonzero(calor < 0) / n_muestras),
+    }
@@ -0,0 +1,190 @@
+# balance_biogas/perfilado.py
+"""Medición por etapas: tiempo de pared, número de llamadas y pico de memoria del proceso.
+
+    perfilador = Perfilador(activo=True, acumulado=PERFILADOR_GLOBAL)
+    with perfilador.etapa("realizar_calculos_balance"):
+        ...
+    perfilador.vuelta("barra_lateral")   # tiempo desde la marca anterior (scripts lineales)
+
+Las vueltas reparten la ejecución sin huecos ni solapes, así que su suma es el
+total. Una ``etapa`` no mueve la marca: es un subtiempo de la vuelta que la
+contiene y se registra con ``subetapa=True`` para no contarla dos veces. La
+memoria es el pico de memoria residente del *proceso* (``ru_maxrss``) al
+terminar cada medida, no lo que asigna la etapa.
+
+Con ``activo=False`` ``etapa`` devuelve un contexto nulo compartido y
+``vuelta``/``envolver`` no hacen nada, así que la instrumentación puede quedarse
+en el código sin coste apreciable. Las medidas se suman también al perfilador
+``acumulado`` (normalmente ``PERFILADOR_GLOBAL``, compartido por todas las
+sesiones del proceso), que se puede volcar como líneas JSON o como fichero de
+texto de Prometheus.
+
+Variables de entorno:
+    BALANCE_PERFILADO=1                    activa el perfilado por defecto
+    BALANCE_PERFILADO_JSONL=ruta           añade una línea JSON por ejecución
+    BALANCE_PERFILADO_PROMETHEUS=ruta      reescribe los acumulados en formato Prometheus
+"""
+import contextlib
+import datetime
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PERFILADO_POR_DEFECTO = os.environ.get("BALANCE_PERFILADO", "").lower() in ("1", "true", "si", "sí", "yes")
+_CONTEXTO_NULO = contextlib.nullcontext()
+
+
+def memoria_pico_bytes():
+    """Pico de memoria residente del proceso (ru_maxrss) en bytes, o ``None`` si no está disponible."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa en KiB y macOS en bytes
+    return pico if sys.platform == "darwin" else pico * 1024
+
+
+class _Etapa:
+    __slots__ = ("_perfilador", "_nombre", "_inicio")
+
+    def __init__(self, perfilador, nombre):
+        self._perfilador = perfilador
+        self._nombre = nombre
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        fin = time.perf_counter()
+        self._perfilador.registrar(self._nombre, fin - self._inicio, subetapa=True)
+        return False
+
+
+class Perfilador:
+    """Acumula, por nombre de etapa, llamadas, tiempo total y máximo, y el pico de memoria del proceso observado."""
+
+    def __init__(self, activo=True, acumulado=None):
+        self.activo = activo
+        self.etapas = {}
+        self._acumulado = acumulado
+        self._cerrojo = threading.Lock()
+        self._ultima_marca = time.perf_counter()
+
+    def etapa(self, nombre):
+        if not self.activo:
+            return _CONTEXTO_NULO
+        return _Etapa(self, nombre)
+
+    def vuelta(self, nombre):
+        """Registra como ``nombre`` el tiempo transcurrido desde la marca anterior.
+
+        La marca es la vuelta anterior o la creación del perfilador; las
+        etapas intermedias quedan incluidas en este tiempo.
+        """
+        if not self.activo:
+            return
+        ahora = time.perf_counter()
+        self.registrar(nombre, ahora - self._ultima_marca)
+        self._ultima_marca = ahora
+
+    def envolver(self, nombre, funcion):
+        """Devuelve ``funcion`` instrumentada como etapa ``nombre`` (o la misma función si está inactivo)."""
+        if not self.activo:
+            return funcion
+
+        @functools.wraps(funcion)
+        def _medida(*args, **kwargs):
+            with _Etapa(self, nombre):
+                return funcion(*args, **kwargs)
+        return _medida
+
+    def registrar(self, nombre, segundos, memoria_bytes=None, subetapa=False):
+        if memoria_bytes is None:
+            memoria_bytes = memoria_pico_bytes()
+        with self._cerrojo:
+            datos = self.etapas.get(nombre)
+            if datos is None:
+                datos = self.etapas[nombre] = {"llamadas": 0, "segundos": 0.0, "segundos_max": 0.0, "memoria_pico_bytes": None, "subetapa": subetapa}
+            datos["llamadas"] += 1
+            datos["segundos"] += segundos
+            datos["segundos_max"] = max(datos["segundos_max"], segundos)
+            if memoria_bytes is not None:
+                datos["memoria_pico_bytes"] = max(datos["memoria_pico_bytes"] or 0, memoria_bytes)
+        if self._acumulado is not None:
+            self._acumulado.registrar(nombre, segundos, memoria_bytes, subetapa)
+
+    def resumen(self):
+        """Lista de etapas (diccionarios) ordenada por tiempo total descendente.
+
+        El tiempo total de la ejecución es la suma de las filas sin ``subetapa``.
+        """
+        with self._cerrojo:
+            filas = [dict(datos, etapa=nombre) for nombre, datos in self.etapas.items()]
+        filas.sort(key=lambda fila: fila["segundos"], reverse=True)
+        return filas
+
+    def reiniciar(self):
+        with self._cerrojo:
+            self.etapas.clear()
+        self._ultima_marca = time.perf_counter()
+
+    def escribir_jsonl(self, destino, **extra):
+        """Añade una línea JSON con las etapas medidas (``extra`` se incluye en la línea, p. ej. la sesión)."""
+        with self._cerrojo:
+            etapas = {nombre: dict(datos) for nombre, datos in self.etapas.items()}
+        linea = dict(extra, fecha=datetime.datetime.now().isoformat(timespec="milliseconds"), etapas=etapas)
+        with open(destino, "a", encoding="utf-8") as fichero:
+            fichero.write(json.dumps(linea, ensure_ascii=False) + "\n")
+
+    def texto_prometheus(self, prefijo="balance_biogas"):
+        """Exposición en formato de texto de Prometheus (contadores por etapa y pico de memoria)."""
+        filas = self.resumen()
+        lineas = [
+            f"# HELP {prefijo}_etapa_segundos_total Tiempo de pared acumulado por etapa.",
+            f"# TYPE {prefijo}_etapa_segundos_total counter",
+        ]
+        lineas += [f'{prefijo}_etapa_segundos_total{{etapa="{fila["etapa"]}"}} {fila["segundos"]:.6f}' for fila in filas]
+        lineas += [
+            f"# HELP {prefijo}_etapa_llamadas_total Número de ejecuciones por etapa.",
+            f"# TYPE {prefijo}_etapa_llamadas_total counter",
+        ]
+        lineas += [f'{prefijo}_etapa_llamadas_total{{etapa="{fila["etapa"]}"}} {fila["llamadas"]}' for fila in filas]
+        memoria = memoria_pico_bytes()
+        if memoria is not None:
+            lineas += [
+                f"# HELP {prefijo}_memoria_pico_bytes Pico de memoria residente del proceso.",
+                f"# TYPE {prefijo}_memoria_pico_bytes gauge",
+                f"{prefijo}_memoria_pico_bytes {memoria}",
+            ]
+        return "\n".join(lineas) + "\n"
+
+    def escribir_prometheus(self, ruta, prefijo="balance_biogas"):
+        """Escribe el fichero de forma atómica (para el textfile collector de node_exporter)."""
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as fichero:
+            fichero.write(self.texto_prometheus(prefijo))
+        os.replace(temporal, ruta)
+
+
+# Acumulado de todas las sesiones del proceso
+PERFILADOR_GLOBAL = Perfilador(activo=True)
+
+
+def volcar_desde_entorno(perfilador, **extra):
+    """Vuelca ``perfilador`` (JSONL) y el acumulado global (Prometheus) a las rutas de las variables de entorno."""
+    if not perfilador.activo:
+        return
+    ruta_jsonl = os.environ.get("BALANCE_PERFILADO_JSONL")
+    if ruta_jsonl:
+        perfilador.escribir_jsonl(ruta_jsonl, **extra)
+    ruta_prometheus = os.environ.get("BALANCE_PERFILADO_PROMETHEUS")
+    if ruta_prometheus:
+        PERFILADOR_GLOBAL.escribir_prometheus(ruta_prometheus)
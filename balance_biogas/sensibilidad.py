@@ -0,0 +1,145 @@
+# balance_biogas/sensibilidad.py
+"""Análisis de sensibilidad: tornado (un parámetro cada vez), barridos 1-D y rejillas 2-D.
+
+Todas las funciones evalúan sus puntos con el motor vectorizado en una sola
+llamada y aceptan una ``memoria`` opcional (``CacheLRU``) en la que cada barrido
+completo se guarda con la huella de la base y de sus columnas, de modo que
+volver a mostrar la misma vista no lo recalcula. No se guardan puntos sueltos:
+evaluar una rejilla de 200x200 de golpe cuesta unos milisegundos, menos que
+buscar sus 40 000 puntos uno a uno en una caché.
+
+El área del digestor se recalcula siempre a partir del caudal y el TRH, como en
+la aplicación, para que variar cualquiera de los dos tenga efecto.
+"""
+import hashlib
+
+import numpy as np
+
+from .cache import hash_contenido
+from .calculos import LIMITES_FISICOS
+from .vectorizado import evaluar_escenarios_lote
+
+PARAMETROS_TORNADO = (
+    "bmp_nm3_ch4_kg_sv",
+    "st_porcentaje",
+    "trh_dias",
+    "u_digestor_w_m2_k",
+    "chp_eficiencia_electrica_porcentaje",
+    "chp_eficiencia_termica_porcentaje",
+)
+SALIDAS_SENSIBILIDAD = ("calor_neto_disponible_mj_dia", "electricidad_neta_exportable_kwh_dia")
+VARIACION_POR_DEFECTO = 0.2
+# Barridos completos por sesión (una rejilla de 200x200 ocupa ~0,6 MB)
+MAX_BARRIDOS_MEMORIA = 4
+
+
+def _base_numerica(entradas_base):
+    base = {clave: float(valor) for clave, valor in entradas_base.items() if not isinstance(valor, str)}
+    base.pop("area_superficial_digestor_m2", None)
+    return base
+
+
+def _acotar(parametro, valores):
+    minimo, maximo = LIMITES_FISICOS.get(parametro, (None, None))
+    if minimo is None and maximo is None:
+        return valores
+    return np.clip(valores, minimo, maximo)
+
+
+def valores_alrededor(entradas_base, parametro, variacion=VARIACION_POR_DEFECTO, n=2):
+    """``n`` valores equiespaciados entre ``base * (1 - variacion)`` y ``base * (1 + variacion)``, dentro de los límites físicos."""
+    valor = float(entradas_base[parametro])
+    return _acotar(parametro, np.linspace(valor * (1 - variacion), valor * (1 + variacion), n))
+
+
+def evaluar_puntos(entradas_base, columnas, memoria=None, salidas=SALIDAS_SENSIBILIDAD):
+    """Evalúa las ``salidas`` en cada punto de ``columnas`` (parámetro -> array) con el resto de entradas de la base.
+
+    Devuelve un diccionario salida -> array con la forma común de las columnas.
+    Con ``memoria`` un barrido ya guardado se devuelve sin recalcular.
+    """
+    base = _base_numerica(entradas_base)
+    faltantes = [clave for clave in columnas if clave not in base]
+    if faltantes:
+        raise ValueError(f"Parámetros sin valor en las entradas base: {', '.join(faltantes)}")
+    claves = sorted(columnas)
+    arrays = np.broadcast_arrays(*(np.asarray(columnas[clave], dtype=np.float64) for clave in claves))
+    forma = arrays[0].shape
+    planos = [np.ravel(a) for a in arrays]
+
+    def _calcular():
+        entradas = dict(base)
+        entradas.update(zip(claves, planos))
+        resultados = evaluar_escenarios_lote(entradas)
+        return [resultados[salida] for salida in salidas]
+
+    if memoria is None:
+        return {salida: valores.reshape(forma) for salida, valores in zip(salidas, _calcular())}
+
+    huella = hashlib.sha256(repr(claves).encode())
+    for plano in planos:
+        huella.update(plano.tobytes())
+    clave_barrido = (hash_contenido(base, salidas), huella.hexdigest())
+    matriz = memoria.get(clave_barrido)
+    if matriz is None:
+        matriz = np.column_stack(_calcular())
+        matriz.flags.writeable = False  # se comparte con quien repita el barrido
+        memoria.put(clave_barrido, matriz)
+    return {salida: matriz[:, j].reshape(forma) for j, salida in enumerate(salidas)}
+
+
+def barrido_parametro(entradas_base, parametro, valores, memoria=None, salidas=SALIDAS_SENSIBILIDAD):
+    """Salidas para cada valor de ``parametro`` con el resto de entradas fijas."""
+    valores = np.asarray(valores, dtype=np.float64)
+    resultado = {parametro: valores}
+    resultado.update(evaluar_puntos(entradas_base, {parametro: valores}, memoria, salidas))
+    return resultado
+
+
+def analisis_tornado(entradas_base, parametros=PARAMETROS_TORNADO, variacion=VARIACION_POR_DEFECTO,
+                     salida="calor_neto_disponible_mj_dia", memoria=None):
+    """Efecto sobre ``salida`` de variar cada parámetro ±``variacion`` (fracción) dejando el resto en la base.
+
+    Devuelve ``{"salida_base": float, "filas": [...]}`` con una fila por
+    parámetro (valores bajo/alto, salida en cada extremo y amplitud), ordenadas
+    de mayor a menor amplitud.
+    """
+    if salida not in SALIDAS_SENSIBILIDAD:
+        raise ValueError(f"Salida desconocida: {salida!r}. Opciones: {', '.join(SALIDAS_SENSIBILIDAD)}")
+    base = _base_numerica(entradas_base)
+    parametros = list(parametros)
+    faltantes = [parametro for parametro in parametros if parametro not in base]
+    if faltantes:
+        raise ValueError(f"Parámetros sin valor en las entradas base: {', '.join(faltantes)}")
+    # Fila 0: la base; filas 2i+1 y 2i+2: extremos bajo y alto del parámetro i (todo en una evaluación)
+    columnas = {parametro: np.full(2 * len(parametros) + 1, base[parametro]) for parametro in parametros}
+    for i, parametro in enumerate(parametros):
+        columnas[parametro][2 * i + 1:2 * i + 3] = valores_alrededor(base, parametro, variacion)
+    resultados = evaluar_puntos(base, columnas, memoria)[salida]
+
+    filas = []
+    for i, parametro in enumerate(parametros):
+        salida_bajo, salida_alto = float(resultados[2 * i + 1]), float(resultados[2 * i + 2])
+        filas.append({
+            "parametro": parametro,
+            "valor_base": base[parametro],
+            "valor_bajo": float(columnas[parametro][2 * i + 1]),
+            "valor_alto": float(columnas[parametro][2 * i + 2]),
+            "salida_bajo": salida_bajo,
+            "salida_alto": salida_alto,
+            "amplitud": abs(salida_alto - salida_bajo),
+        })
+    filas.sort(key=lambda fila: fila["amplitud"], reverse=True)
+    return {"salida": salida, "salida_base": float(resultados[0]), "variacion": variacion, "filas": filas}
+
+
+def rejilla_sensibilidad(entradas_base, parametro_x, valores_x, parametro_y, valores_y, memoria=None, salidas=SALIDAS_SENSIBILIDAD):
+    """Salidas en la rejilla ``valores_x`` × ``valores_y``; cada salida es un array de forma ``(len(valores_y), len(valores_x))``."""
+    if parametro_x == parametro_y:
+        raise ValueError("Los dos parámetros de la rejilla deben ser distintos")
+    valores_x = np.asarray(valores_x, dtype=np.float64)
+    valores_y = np.asarray(valores_y, dtype=np.float64)
+    malla_x, malla_y = np.meshgrid(valores_x, valores_y)
+    resultado = {parametro_x: valores_x, parametro_y: valores_y}
+    resultado.update(evaluar_puntos(entradas_base, {parametro_x: malla_x, parametro_y: malla_y}, memoria, salidas))
+    return resultado
@@ -0,0 +1,337 @@
+# balance_biogas/servicio.py
+"""Servicio HTTP/JSON local para el dimensionamiento y el balance (asyncio, sin dependencias web).
+
+Rutas:
+    POST /dimensiones   {"caudal_sustrato_kg_dia": 10000, "trh_dias": 30}
+    POST /balance       entradas de ``inputs_calc`` más ``trh_dias`` (las ausentes toman el valor por defecto)
+    GET  /metricas      histogramas de latencia por ruta y tamaño medio de los lotes (JSON;
+                        ``/metricas?formato=prometheus`` en formato de texto de Prometheus)
+    GET  /salud
+
+Un objeto JSON es una petición individual y una lista de objetos, un lote (la
+respuesta es una lista en el mismo orden). Las peticiones individuales que
+llegan a la vez se acumulan durante ``ventana_s`` segundos (o hasta
+``max_lote`` filas) y se evalúan juntas con el motor vectorizado, con una
+sola llamada por lote; los lotes explícitos se evalúan directamente. Si el
+micro-lote falla, sus filas se evalúan una a una para que el error solo llegue
+a la petición que lo causa. Los lotes grandes (explícitos o agrupados) se
+evalúan en un hilo para no bloquear el bucle de eventos.
+
+    python -m balance_biogas servir --puerto 8765 --ventana-ms 2
+
+Las conexiones son HTTP/1.1 persistentes; cada conexión atiende sus
+peticiones en orden.
+"""
+import asyncio
+import bisect
+import json
+import time
+from urllib.parse import parse_qs
+
+from .calculos import CLAVES_DIMENSIONES
+from .cli import CLAVES_SALIDA, ENTRADAS_NUMERICAS, _a_numero, evaluar_columnas, filas_a_columnas
+
+VENTANA_POR_DEFECTO_S = 0.002
+MAX_LOTE_POR_DEFECTO = 1024
+MAX_CUERPO_BYTES = 64 * 1024 * 1024
+# Lotes explícitos a partir de este tamaño se evalúan en un hilo para no bloquear el bucle de eventos
+FILAS_EN_HILO = 5_000
+# Ídem para los micro-lotes (~3 ms de cálculo con 256 filas)
+FILAS_LOTE_EN_HILO = 256
+LIMITES_HISTOGRAMA_S = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+_RAZONES = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def validar_planta(fila, n_fila=1):
+    """Comprueba que ``fila`` es un objeto con valores numéricos (y una tecnología de upgrading existente) en las entradas del balance (lanza ``ValueError``)."""
+    if not isinstance(fila, dict):
+        raise ValueError(f"Fila {n_fila}: cada planta debe ser un objeto JSON")
+    for clave in ENTRADAS_NUMERICAS:
+        valor = fila.get(clave)
+        if valor not in (None, ""):
+            _a_numero(valor, clave, n_fila)
+    return fila
+
+
+def evaluar_balance_filas(filas):
+    """Dimensiones y balance de cada fila (lista de diccionarios con ``CLAVES_SALIDA``)."""
+    resultados = evaluar_columnas(filas_a_columnas(filas))
+    columnas = [resultados[clave].tolist() for clave in CLAVES_SALIDA]
+    return [dict(zip(CLAVES_SALIDA, valores)) for valores in zip(*columnas)]
+
+
+def evaluar_dimensiones_filas(filas):
+    """Dimensiones del digestor de cada fila (lista de diccionarios con ``CLAVES_DIMENSIONES``)."""
+    from .vectorizado import calcular_dimensiones_digestor_lote
+
+    columnas = filas_a_columnas(filas)
+    dimensiones = calcular_dimensiones_digestor_lote(
+        columnas["caudal_sustrato_kg_dia"], columnas["trh_dias"], columnas["densidad_sustrato_kg_m3"])
+    valores = [dimensiones[clave].tolist() for clave in CLAVES_DIMENSIONES]
+    return [dict(zip(CLAVES_DIMENSIONES, fila)) for fila in zip(*valores)]
+
+
+class HistogramaLatencias:
+    """Histograma de cubetas fijas (segundos) con recuento, suma y máximo."""
+
+    def __init__(self, limites=LIMITES_HISTOGRAMA_S):
+        self.limites = tuple(limites)
+        self.cuentas = [0] * (len(self.limites) + 1)
+        self.n = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, segundos):
+        self.cuentas[bisect.bisect_left(self.limites, segundos)] += 1
+        self.n += 1
+        self.suma += segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+
+    def percentil(self, p):
+        """Límite superior de la cubeta que contiene el percentil ``p`` (el máximo observado en la última)."""
+        if not self.n:
+            return None
+        objetivo = p / 100 * self.n
+        acumulado = 0
+        for limite, cuenta in zip(self.limites, self.cuentas):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+    def resumen(self):
+        return {
+            "n": self.n,
+            "media_s": self.suma / self.n if self.n else None,
+            "max_s": self.maximo,
+            "p50_s": self.percentil(50),
+            "p90_s": self.percentil(90),
+            "p99_s": self.percentil(99),
+            "cubetas": dict(zip([str(limite) for limite in self.limites] + ["+Inf"], self.cuentas)),
+        }
+
+
+class AgrupadorLotes:
+    """Acumula peticiones individuales y las evalúa juntas al cerrar la ventana o llenar el lote.
+
+    ``evaluar`` recibe la lista de filas y devuelve un resultado por fila. Si
+    falla con el lote completo, se repite fila a fila y cada petición recibe su
+    resultado o su propio error. Los lotes de ``filas_en_hilo`` filas o más se
+    evalúan en un hilo. Debe usarse desde el bucle de eventos (no es seguro
+    entre hilos).
+    """
+
+    def __init__(self, evaluar, ventana_s=VENTANA_POR_DEFECTO_S, max_lote=MAX_LOTE_POR_DEFECTO, filas_en_hilo=FILAS_LOTE_EN_HILO):
+        self._evaluar = evaluar
+        self.ventana_s = ventana_s
+        self.max_lote = max(1, int(max_lote))
+        self.filas_en_hilo = filas_en_hilo
+        self._pendientes = []
+        self._temporizador = None
+        self._tareas = set()
+        self.lotes = 0
+        self.filas = 0
+
+    def enviar(self, fila):
+        """Encola ``fila`` y devuelve un futuro con su resultado."""
+        bucle = asyncio.get_running_loop()
+        futuro = bucle.create_future()
+        self._pendientes.append((fila, futuro))
+        if len(self._pendientes) >= self.max_lote:
+            self.vaciar()
+        elif self._temporizador is None:
+            self._temporizador = bucle.call_later(self.ventana_s, self.vaciar)
+        return futuro
+
+    def vaciar(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        pendientes, self._pendientes = self._pendientes, []
+        if not pendientes:
+            return
+        self.lotes += 1
+        self.filas += len(pendientes)
+        filas = [fila for fila, _ in pendientes]
+        if len(filas) < self.filas_en_hilo:
+            self._entregar(pendientes, self._evaluar_con_respaldo(filas))
+        else:
+            tarea = asyncio.get_running_loop().create_task(self._evaluar_en_hilo(pendientes, filas))
+            self._tareas.add(tarea)  # referencia hasta que termine
+            tarea.add_done_callback(self._tareas.discard)
+
+    async def _evaluar_en_hilo(self, pendientes, filas):
+        self._entregar(pendientes, await asyncio.to_thread(self._evaluar_con_respaldo, filas))
+
+    def _evaluar_con_respaldo(self, filas):
+        """Pares ``(error, resultado)`` por fila: el lote completo y, si falla, fila a fila."""
+        try:
+            return [(None, resultado) for resultado in self._evaluar(filas)]
+        except Exception as e_lote:
+            if len(filas) == 1:
+                return [(e_lote, None)]
+        salida = []
+        for fila in filas:
+            try:
+                salida.append((None, self._evaluar([fila])[0]))
+            except Exception as e_fila:
+                salida.append((e_fila, None))
+        return salida
+
+    @staticmethod
+    def _entregar(pendientes, salida):
+        for (_, futuro), (error, resultado) in zip(pendientes, salida):
+            if futuro.done():  # la conexión pudo cerrarse mientras tanto
+                continue
+            if error is not None:
+                futuro.set_exception(error)
+            else:
+                futuro.set_result(resultado)
+
+
+class ServicioBalance:
+    """Servidor HTTP/1.1 mínimo con las rutas del módulo y métricas de latencia por ruta."""
+
+    def __init__(self, ventana_s=VENTANA_POR_DEFECTO_S, max_lote=MAX_LOTE_POR_DEFECTO):
+        self.evaluadores = {"/dimensiones": evaluar_dimensiones_filas, "/balance": evaluar_balance_filas}
+        self.agrupadores = {ruta: AgrupadorLotes(evaluar, ventana_s, max_lote) for ruta, evaluar in self.evaluadores.items()}
+        self.histogramas = {ruta: HistogramaLatencias() for ruta in (*self.evaluadores, "/metricas", "/salud", "otras")}
+        self.inicio = time.time()
+
+    async def iniciar(self, host="127.0.0.1", puerto=8765):
+        return await asyncio.start_server(self.atender_conexion, host, puerto, limit=64 * 1024)
+
+    async def atender_conexion(self, lector, escritor):
+        try:
+            while True:
+                try:
+                    cabecera = await lector.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                inicio = time.perf_counter()
+                lineas = cabecera.decode("latin-1").split("\r\n")
+                partes = lineas[0].split(" ")
+                if len(partes) != 3:
+                    escritor.write(self._respuesta(400, {"error": "Línea de petición no válida"}, mantener=False))
+                    break
+                metodo, destino, version = partes
+                cabeceras = {}
+                for linea in lineas[1:]:
+                    if not linea:
+                        continue
+                    nombre, _, valor = linea.partition(":")
+                    cabeceras[nombre.strip().lower()] = valor.strip()
+                try:
+                    longitud = int(cabeceras.get("content-length") or 0)
+                except ValueError:
+                    longitud = -1
+                if not 0 <= longitud <= MAX_CUERPO_BYTES:
+                    codigo = 400 if longitud < 0 else 413
+                    escritor.write(self._respuesta(codigo, {"error": "Content-Length no válido o excesivo"}, mantener=False))
+                    break
+                cuerpo = await lector.readexactly(longitud) if longitud else b""
+                conexion = cabeceras.get("connection", "").lower()
+                mantener = conexion == "keep-alive" if version == "HTTP/1.0" else conexion != "close"
+
+                ruta, _, consulta = destino.partition("?")
+                codigo, contenido, tipo = await self.despachar(metodo, ruta, consulta, cuerpo)
+                escritor.write(self._respuesta(codigo, contenido, tipo, mantener))
+                self.histogramas.get(ruta, self.histogramas["otras"]).registrar(time.perf_counter() - inicio)
+                if not mantener:
+                    break
+                await escritor.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            escritor.close()
+
+    async def despachar(self, metodo, ruta, consulta, cuerpo):
+        """Devuelve ``(código, contenido, tipo)``; el contenido es un objeto JSON o texto."""
+        if ruta in self.evaluadores:
+            if metodo != "POST":
+                return 405, {"error": f"Use POST en {ruta}"}, None
+            try:
+                datos = json.loads(cuerpo)
+                if isinstance(datos, list):
+                    filas = [validar_planta(fila, n_fila) for n_fila, fila in enumerate(datos, start=1)]
+                    if len(filas) >= FILAS_EN_HILO:
+                        return 200, await asyncio.to_thread(self.evaluadores[ruta], filas), None
+                    return 200, self.evaluadores[ruta](filas) if filas else [], None
+                return 200, await self.agrupadores[ruta].enviar(validar_planta(datos)), None
+            except ValueError as e_peticion:  # incluye JSON mal formado
+                return 400, {"error": str(e_peticion)}, None
+            except Exception as e_calculo:
+                return 500, {"error": f"Error en el cálculo: {e_calculo}"}, None
+        if ruta == "/metricas" and metodo == "GET":
+            if parse_qs(consulta).get("formato") == ["prometheus"]:
+                return 200, self.texto_prometheus(), "text/plain; version=0.0.4"
+            return 200, self.metricas(), None
+        if ruta == "/salud" and metodo == "GET":
+            return 200, {"estado": "ok"}, None
+        if ruta in ("/metricas", "/salud"):
+            return 405, {"error": f"Use GET en {ruta}"}, None
+        return 404, {"error": f"Ruta desconocida: {ruta}"}, None
+
+    @staticmethod
+    def _respuesta(codigo, contenido, tipo=None, mantener=True):
+        if tipo is None:
+            cuerpo = json.dumps(contenido, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            tipo = "application/json"
+        else:
+            cuerpo = contenido.encode("utf-8")
+        cabecera = (
+            f"HTTP/1.1 {codigo} {_RAZONES[codigo]}\r\nContent-Type: {tipo}\r\nContent-Length: {len(cuerpo)}\r\n"
+            f"Connection: {'keep-alive' if mantener else 'close'}\r\n\r\n"
+        )
+        return cabecera.encode("latin-1") + cuerpo
+
+    def metricas(self):
+        return {
+            "segundos_activo": time.time() - self.inicio,
+            "latencia": {ruta: histograma.resumen() for ruta, histograma in self.histogramas.items() if histograma.n},
+            "lotes": {
+                ruta: {"lotes": agrupador.lotes, "filas": agrupador.filas, "filas_por_lote": agrupador.filas / agrupador.lotes if agrupador.lotes else None}
+                for ruta, agrupador in self.agrupadores.items()
+            },
+        }
+
+    def texto_prometheus(self, prefijo="balance_servicio"):
+        lineas = [
+            f"# HELP {prefijo}_latencia_segundos Latencia de las peticiones por ruta.",
+            f"# TYPE {prefijo}_latencia_segundos histogram",
+        ]
+        for ruta, histograma in self.histogramas.items():
+            acumulado = 0
+            for limite, cuenta in zip([str(limite) for limite in histograma.limites] + ["+Inf"], histograma.cuentas):
+                acumulado += cuenta
+                lineas.append(f'{prefijo}_latencia_segundos_bucket{{ruta="{ruta}",le="{limite}"}} {acumulado}')
+            lineas.append(f'{prefijo}_latencia_segundos_sum{{ruta="{ruta}"}} {histograma.suma:.6f}')
+            lineas.append(f'{prefijo}_latencia_segundos_count{{ruta="{ruta}"}} {histograma.n}')
+        lineas += [
+            f"# HELP {prefijo}_lotes_total Micro-lotes evaluados por ruta.",
+            f"# TYPE {prefijo}_lotes_total counter",
+        ]
+        lineas += [f'{prefijo}_lotes_total{{ruta="{ruta}"}} {agrupador.lotes}' for ruta, agrupador in self.agrupadores.items()]
+        lineas += [
+            f"# HELP {prefijo}_filas_agrupadas_total Peticiones individuales evaluadas en micro-lotes.",
+            f"# TYPE {prefijo}_filas_agrupadas_total counter",
+        ]
+        lineas += [f'{prefijo}_filas_agrupadas_total{{ruta="{ruta}"}} {agrupador.filas}' for ruta, agrupador in self.agrupadores.items()]
+        return "\n".join(lineas) + "\n"
+
+
+async def _servir(host, puerto, ventana_s, max_lote, al_iniciar=None):
+    servidor = await ServicioBalance(ventana_s, max_lote).iniciar(host, puerto)
+    if al_iniciar is not None:
+        al_iniciar(servidor)
+    async with servidor:
+        await servidor.serve_forever()
+
+
+def servir(host="127.0.0.1", puerto=8765, ventana_s=VENTANA_POR_DEFECTO_S, max_lote=MAX_LOTE_POR_DEFECTO, al_iniciar=None):
+    """Arranca el servicio y lo mantiene hasta que se interrumpe (Ctrl+C)."""
+    try:
+        asyncio.run(_servir(host, puerto, ventana_s, max_lote, al_iniciar))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,101 @@
+# balance_biogas/solver.py
+"""Diseño inverso: valor de una entrada que lleva una salida del balance a un objetivo.
+
+Por ejemplo, el TRH máximo o la U máxima con los que el calor neto sigue
+siendo >= 0, o la eficiencia eléctrica del CHP necesaria para exportar una
+cantidad dada de kWh/día. La búsqueda es una bisección vectorizada sobre el
+motor por lotes: todas las plantas de una cartera avanzan a la vez, con una
+llamada al motor por iteración.
+
+En este modelo cada salida es monótona respecto a cada variable libre, así que
+el rango factible (salida >= objetivo) dentro de los límites es un intervalo
+que empieza o termina en el punto de equilibrio.
+"""
+import math
+
+import numpy as np
+
+from .vectorizado import calcular_dimensiones_digestor_lote, evaluar_escenarios_lote, realizar_calculos_balance_lote
+
+# Variable libre -> límites de búsqueda por defecto
+LIMITES_VARIABLES = {
+    "trh_dias": (1.0, 200.0),
+    "u_digestor_w_m2_k": (0.0, 10.0),
+    "chp_eficiencia_electrica_porcentaje": (0.0, 100.0),
+    "chp_eficiencia_termica_porcentaje": (0.0, 100.0),
+    "caldera_eficiencia_porcentaje": (0.0, 100.0),
+}
+SALIDAS_OBJETIVO = ("calor_neto_disponible_mj_dia", "electricidad_neta_exportable_kwh_dia")
+
+
+def _preparar_columnas(columnas, variable):
+    columnas = {clave: valor for clave, valor in columnas.items() if not isinstance(valor, str)}
+    if variable == "trh_dias":
+        # El área depende del TRH: se recalcula en cada iteración
+        columnas.pop("area_superficial_digestor_m2", None)
+        return columnas
+    # Con el TRH fijo el área no cambia: se completa una sola vez (NaN o ausente = dimensionar)
+    area = columnas.get("area_superficial_digestor_m2")
+    if area is None or np.isnan(area).any():
+        dimensiones = calcular_dimensiones_digestor_lote(
+            columnas["caudal_sustrato_kg_dia"], columnas["trh_dias"], columnas.get("densidad_sustrato_kg_m3", 1000))
+        area_dimensionada = dimensiones["area_superficial_digestor_m2"]
+        columnas["area_superficial_digestor_m2"] = area_dimensionada if area is None else np.where(np.isnan(area), area_dimensionada, area)
+    return columnas
+
+
+def resolver_equilibrio_lote(columnas, variable, salida="calor_neto_disponible_mj_dia", objetivo=0.0, limites=None, tolerancia=1e-9, max_iter=200):
+    """Punto de equilibrio y rango factible de ``variable`` para cada fila de ``columnas``.
+
+    ``columnas`` sigue el formato del motor vectorizado (columnas o escalares
+    que se difunden); ``objetivo`` y ``limites`` también pueden ser arrays por
+    fila. Devuelve arrays ``valor_equilibrio`` (NaN si la salida no cruza el
+    objetivo dentro de los límites), ``factible_min`` y ``factible_max``
+    (NaN si ningún valor alcanza el objetivo).
+    """
+    if variable not in LIMITES_VARIABLES:
+        raise ValueError(f"Variable libre desconocida: {variable!r}. Opciones: {', '.join(LIMITES_VARIABLES)}")
+    if salida not in SALIDAS_OBJETIVO:
+        raise ValueError(f"Salida objetivo desconocida: {salida!r}. Opciones: {', '.join(SALIDAS_OBJETIVO)}")
+    minimo, maximo = LIMITES_VARIABLES[variable] if limites is None else limites
+    columnas = _preparar_columnas(columnas, variable)
+    evaluar = evaluar_escenarios_lote if variable == "trh_dias" else realizar_calculos_balance_lote
+
+    forma = np.broadcast_shapes(*(np.shape(v) for v in columnas.values()), np.shape(objetivo), np.shape(minimo), np.shape(maximo), (1,))
+    bajo = np.array(np.broadcast_to(np.asarray(minimo, dtype=np.float64), forma))
+    alto = np.array(np.broadcast_to(np.asarray(maximo, dtype=np.float64), forma))
+    objetivo = np.broadcast_to(np.asarray(objetivo, dtype=np.float64), forma)
+    if (bajo > alto).any():
+        raise ValueError("El límite inferior de búsqueda no puede superar al superior")
+
+    def _cumple(valores):
+        columnas[variable] = valores
+        return np.broadcast_to(evaluar(columnas)[salida], forma) >= objetivo
+
+    cumple_bajo = _cumple(bajo)
+    cumple_alto = _cumple(alto)
+    cruza = cumple_bajo != cumple_alto
+    factible_min = np.where(cumple_bajo, bajo, np.nan)
+    factible_max = np.where(cumple_alto, alto, np.nan)
+
+    # Bisección manteniendo en ``bajo`` el mismo estado que en el límite inferior
+    for _ in range(max_iter):
+        if not cruza.any() or np.max(np.where(cruza, alto - bajo, 0.0)) <= tolerancia:
+            break
+        medio = 0.5 * (bajo + alto)
+        igual_que_bajo = _cumple(medio) == cumple_bajo
+        bajo = np.where(cruza & igual_que_bajo, medio, bajo)
+        alto = np.where(cruza & ~igual_que_bajo, medio, alto)
+
+    # Se devuelve el extremo del intervalo final que cumple el objetivo
+    valor_equilibrio = np.where(cruza, np.where(cumple_bajo, bajo, alto), np.nan)
+    # Donde hay cruce el rango factible se corta en el punto de equilibrio
+    factible_max = np.where(cruza & cumple_bajo, valor_equilibrio, factible_max)
+    factible_min = np.where(cruza & cumple_alto, valor_equilibrio, factible_min)
+    return {"valor_equilibrio": valor_equilibrio, "factible_min": factible_min, "factible_max": factible_max}
+
+
+def resolver_equilibrio(entradas, variable, salida="calor_neto_disponible_mj_dia", objetivo=0.0, limites=None, tolerancia=1e-9):
+    """Versión para una sola planta: devuelve floats (``None`` en lugar de NaN)."""
+    resultado = resolver_equilibrio_lote(entradas, variable, salida, objetivo, limites, tolerancia)
+    return {clave: None if math.isnan(valores[0]) else float(valores[0]) for clave, valores in resultado.items()}
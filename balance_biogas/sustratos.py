@@ -0,0 +1,254 @@
+# balance_biogas/sustratos.py
+"""Catálogo de sustratos y evaluación de mezclas de co-digestión.
+
+Las propiedades de cada sustrato se guardan en arrays de NumPy (una fila por
+sustrato), de modo que una mezcla es un vector de fracciones másicas y evaluar
+muchas mezclas es un producto de matrices, sin diccionarios por mezcla:
+
+    catalogo = CatalogoSustratos.referencia()
+    idx = catalogo.indices(["Purín de cerdo", "Ensilado de maíz"])
+    propiedades = evaluar_mezclas(catalogo, [[0.8, 0.2], [0.6, 0.4]], idx)
+
+Las propiedades de la mezcla se expresan con las mismas claves que
+``inputs_calc`` (ST, SV/ST, BMP y Cp equivalentes), así que cualquier mezcla
+se puede pasar directamente al motor de balance.
+"""
+import csv
+
+import numpy as np
+
+from .vectorizado import evaluar_escenarios_lote
+
+# (nombre, categoría, ST %, SV % de ST, BMP Nm³ CH₄/kg SV, Cp kJ/kg°C)
+# Valores orientativos de literatura; sustituir por analíticas propias cuando existan.
+SUSTRATOS_REFERENCIA = (
+    ("Purín de cerdo", "Estiércoles", 5.0, 75.0, 0.30, 4.10),
+    ("Purín de vacuno", "Estiércoles", 9.0, 80.0, 0.21, 4.00),
+    ("Estiércol sólido de vacuno", "Estiércoles", 22.0, 80.0, 0.20, 3.40),
+    ("Gallinaza", "Estiércoles", 30.0, 70.0, 0.30, 3.00),
+    ("Estiércol de ovino", "Estiércoles", 30.0, 75.0, 0.25, 3.00),
+    ("Ensilado de maíz", "Cultivos energéticos", 33.0, 95.0, 0.34, 2.90),
+    ("Ensilado de hierba", "Cultivos energéticos", 30.0, 90.0, 0.31, 3.00),
+    ("Ensilado de sorgo", "Cultivos energéticos", 28.0, 92.0, 0.30, 3.00),
+    ("Paja de cereal", "Residuos agrícolas", 88.0, 90.0, 0.23, 1.80),
+    ("Restos de frutas y hortalizas", "Residuos agroindustriales", 12.0, 90.0, 0.38, 3.90),
+    ("Pulpa de remolacha", "Residuos agroindustriales", 22.0, 92.0, 0.34, 3.50),
+    ("Orujo de uva", "Residuos agroindustriales", 45.0, 90.0, 0.25, 2.50),
+    ("Alperujo", "Residuos agroindustriales", 35.0, 90.0, 0.35, 2.80),
+    ("Suero lácteo", "Residuos agroindustriales", 6.0, 85.0, 0.45, 4.00),
+    ("Glicerina bruta", "Residuos agroindustriales", 85.0, 95.0, 0.45, 2.40),
+    ("Residuos de matadero", "Residuos agroindustriales", 20.0, 85.0, 0.50, 3.50),
+    ("Grasas de separador", "Residuos agroindustriales", 25.0, 95.0, 0.60, 3.20),
+    ("FORSU", "Residuos urbanos", 25.0, 88.0, 0.42, 3.60),
+    ("Lodos de EDAR", "Residuos urbanos", 4.0, 70.0, 0.30, 4.10),
+)
+
+COLUMNAS_CATALOGO = ("nombre", "categoria", "st_porcentaje", "sv_de_st_porcentaje", "bmp_nm3_ch4_kg_sv", "cp_sustrato_kj_kg_c")
+
+
+class CatalogoSustratos:
+    """Propiedades de sustratos en arrays, con índices por nombre y por categoría."""
+
+    def __init__(self, nombres, categorias, st_porcentaje, sv_de_st_porcentaje, bmp_nm3_ch4_kg_sv, cp_sustrato_kj_kg_c):
+        self.nombres = tuple(nombres)
+        self.categorias = tuple(categorias)
+        self.st_porcentaje = np.asarray(st_porcentaje, dtype=np.float64)
+        self.sv_de_st_porcentaje = np.asarray(sv_de_st_porcentaje, dtype=np.float64)
+        self.bmp_nm3_ch4_kg_sv = np.asarray(bmp_nm3_ch4_kg_sv, dtype=np.float64)
+        self.cp_sustrato_kj_kg_c = np.asarray(cp_sustrato_kj_kg_c, dtype=np.float64)
+        n = len(self.nombres)
+        if len(self.categorias) != n or any(len(a) != n for a in (
+                self.st_porcentaje, self.sv_de_st_porcentaje, self.bmp_nm3_ch4_kg_sv, self.cp_sustrato_kj_kg_c)):
+            raise ValueError("Todas las propiedades del catálogo deben tener un valor por sustrato")
+        self._indice = {nombre: i for i, nombre in enumerate(self.nombres)}
+        if len(self._indice) != n:
+            raise ValueError("El catálogo contiene nombres de sustrato repetidos")
+        por_categoria = {}
+        for i, categoria in enumerate(self.categorias):
+            por_categoria.setdefault(categoria, []).append(i)
+        self._por_categoria = {categoria: np.array(idx, dtype=np.intp) for categoria, idx in por_categoria.items()}
+
+        # Contribuciones por kg de sustrato fresco; una mezcla es una combinación lineal de estas filas
+        st = self.st_porcentaje / 100
+        sv = st * self.sv_de_st_porcentaje / 100
+        self._por_kg = np.column_stack((st, sv, sv * self.bmp_nm3_ch4_kg_sv, self.cp_sustrato_kj_kg_c))
+
+    @classmethod
+    def desde_filas(cls, filas):
+        """Crea el catálogo a partir de diccionarios o tuplas con las columnas de ``COLUMNAS_CATALOGO``."""
+        filas = [tuple(fila[c] for c in COLUMNAS_CATALOGO) if isinstance(fila, dict) else tuple(fila) for fila in filas]
+        if not filas:
+            raise ValueError("El catálogo de sustratos está vacío")
+        nombres, categorias, st, sv, bmp, cp = zip(*filas)
+        return cls(
+            [str(n).strip() for n in nombres], [str(c).strip() for c in categorias],
+            [float(v) for v in st], [float(v) for v in sv], [float(v) for v in bmp], [float(v) for v in cp],
+        )
+
+    @classmethod
+    def desde_csv(cls, origen):
+        """Lee un CSV con cabecera ``nombre,categoria,st_porcentaje,...`` (ruta o fichero de texto)."""
+        if isinstance(origen, str):
+            with open(origen, newline="", encoding="utf-8-sig") as fichero:
+                return cls.desde_filas(list(csv.DictReader(fichero)))
+        return cls.desde_filas(list(csv.DictReader(origen)))
+
+    @classmethod
+    def referencia(cls):
+        return cls.desde_filas(SUSTRATOS_REFERENCIA)
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def __contains__(self, nombre):
+        return nombre in self._indice
+
+    @property
+    def lista_categorias(self):
+        return tuple(self._por_categoria)
+
+    def indice(self, nombre):
+        try:
+            return self._indice[nombre]
+        except KeyError:
+            raise KeyError(f"Sustrato no encontrado en el catálogo: {nombre!r}") from None
+
+    def indices(self, nombres):
+        return np.array([self.indice(nombre) for nombre in nombres], dtype=np.intp)
+
+    def de_categoria(self, categoria):
+        """Índices de los sustratos de una categoría (array vacío si no existe)."""
+        return self._por_categoria.get(categoria, np.empty(0, dtype=np.intp))
+
+    def propiedades(self, nombre):
+        i = self.indice(nombre)
+        return {
+            "nombre": self.nombres[i],
+            "categoria": self.categorias[i],
+            "st_porcentaje": float(self.st_porcentaje[i]),
+            "sv_de_st_porcentaje": float(self.sv_de_st_porcentaje[i]),
+            "bmp_nm3_ch4_kg_sv": float(self.bmp_nm3_ch4_kg_sv[i]),
+            "cp_sustrato_kj_kg_c": float(self.cp_sustrato_kj_kg_c[i]),
+        }
+
+
+def evaluar_mezclas(catalogo, fracciones, indices=None):
+    """Propiedades equivalentes de una o muchas mezclas.
+
+    ``fracciones`` es un array (n_mezclas, k) de fracciones másicas (cada fila
+    se normaliza a 1). ``indices`` indica qué sustratos del catálogo son las k
+    columnas: un array 1-D común a todas las mezclas, uno 2-D (n_mezclas, k)
+    con los sustratos de cada mezcla, o ``None`` para usar el catálogo entero.
+
+    Devuelve arrays con ``st_porcentaje``, ``sv_de_st_porcentaje``,
+    ``bmp_nm3_ch4_kg_sv`` y ``cp_sustrato_kj_kg_c`` equivalentes (ponderados por
+    masa, SV y ST según corresponda), más ``sv_kg_kg`` y ``ch4_potencial_nm3_kg``
+    por kg de mezcla fresca.
+    """
+    fracciones = np.atleast_2d(np.asarray(fracciones, dtype=np.float64))
+    suma = fracciones.sum(axis=1, keepdims=True)
+    if (suma <= 0).any() or (fracciones < 0).any():
+        raise ValueError("Las fracciones de cada mezcla deben ser no negativas y no sumar 0")
+    fracciones = fracciones / suma
+
+    if indices is None:
+        por_kg = catalogo._por_kg
+    else:
+        por_kg = catalogo._por_kg[np.asarray(indices, dtype=np.intp)]
+    if por_kg.ndim == 2:
+        mezcla = fracciones @ por_kg
+    else:
+        mezcla = np.einsum("ij,ijk->ik", fracciones, por_kg)
+    st, sv, ch4, cp = mezcla.T
+
+    return {
+        "st_porcentaje": st * 100,
+        "sv_de_st_porcentaje": np.divide(sv, st, out=np.zeros_like(sv), where=st > 0) * 100,
+        "bmp_nm3_ch4_kg_sv": np.divide(ch4, sv, out=np.zeros_like(ch4), where=sv > 0),
+        "cp_sustrato_kj_kg_c": cp,
+        "sv_kg_kg": sv,
+        "ch4_potencial_nm3_kg": ch4,
+    }
+
+
+def balance_mezclas(catalogo, fracciones, entradas_base, indices=None):
+    """Balance completo (producción de metano, demanda térmica...) de cada mezcla con el motor vectorizado.
+
+    ``entradas_base`` aporta el resto de entradas (caudal total, temperaturas,
+    uso del biogás...); las propiedades del sustrato se sustituyen por las de
+    cada mezcla.
+    """
+    columnas = {clave: valor for clave, valor in entradas_base.items() if not isinstance(valor, str)}
+    # El área depende solo de caudal y TRH, comunes a todas las mezclas: se respeta si viene dada
+    propiedades = evaluar_mezclas(catalogo, fracciones, indices)
+    for clave in ("st_porcentaje", "sv_de_st_porcentaje", "bmp_nm3_ch4_kg_sv", "cp_sustrato_kj_kg_c"):
+        columnas[clave] = propiedades[clave]
+    return evaluar_escenarios_lote(columnas)
+
+
+def _muestrear_fracciones(rng, n, minimos, libre, concentracion=None, centro=None):
+    k = len(minimos)
+    alfa = np.ones(k) if centro is None else centro * concentracion + 0.05
+    return minimos + libre * rng.dirichlet(alfa, n)
+
+
+def buscar_mezcla_optima(catalogo, nombres, caudal_total_kg_dia, masa_min_kg_dia=None, masa_max_kg_dia=None,
+                         st_min_porcentaje=None, st_max_porcentaje=None, n_candidatos=100_000, n_refinamientos=3, semilla=0):
+    """Busca las fracciones de ``nombres`` con mayor producción de metano para un caudal total dado.
+
+    Las restricciones son la masa disponible de cada sustrato (kg/día, mínima
+    y máxima) y el rango de ST de la mezcla (p. ej. ST <= 15 % en vía húmeda).
+    Se evalúan ``n_candidatos`` mezclas aleatorias (Dirichlet sobre la masa
+    libre tras los mínimos) y se refina alrededor de la mejor en
+    ``n_refinamientos`` rondas más. Devuelve ``None`` si ninguna mezcla cumple
+    las restricciones.
+    """
+    indices = catalogo.indices(nombres)
+    k = len(indices)
+    if k == 0 or caudal_total_kg_dia <= 0:
+        raise ValueError("Se necesita al menos un sustrato y un caudal total mayor que 0")
+    minimos = np.zeros(k) if masa_min_kg_dia is None else np.asarray(masa_min_kg_dia, dtype=np.float64) / caudal_total_kg_dia
+    maximos = np.full(k, np.inf) if masa_max_kg_dia is None else np.asarray(masa_max_kg_dia, dtype=np.float64) / caudal_total_kg_dia
+    libre = 1.0 - minimos.sum()
+    if libre < 0 or maximos.sum() < 1.0 or (minimos > maximos).any():
+        raise ValueError("Las masas mínimas y máximas no permiten alcanzar el caudal total")
+
+    rng = np.random.default_rng(semilla)
+    st_min = -np.inf if st_min_porcentaje is None else st_min_porcentaje
+    st_max = np.inf if st_max_porcentaje is None else st_max_porcentaje
+    mejor = None
+    n_evaluadas = n_factibles = 0
+    for ronda in range(1 + max(0, n_refinamientos)):
+        if mejor is None:
+            fracciones = _muestrear_fracciones(rng, n_candidatos, minimos, libre)
+        else:
+            centro = (mejor - minimos) / libre if libre > 0 else None
+            fracciones = _muestrear_fracciones(rng, n_candidatos, minimos, libre, 50.0 * 4 ** ronda, centro)
+        propiedades = evaluar_mezclas(catalogo, fracciones, indices)
+        n_evaluadas += n_candidatos
+        factible = (
+            (fracciones <= maximos).all(axis=1)
+            & (propiedades["st_porcentaje"] >= st_min)
+            & (propiedades["st_porcentaje"] <= st_max)
+        )
+        n_factibles += int(factible.sum())
+        if not factible.any():
+            if mejor is None:
+                continue
+            break
+        ch4 = np.where(factible, propiedades["ch4_potencial_nm3_kg"], -np.inf)
+        i = int(np.argmax(ch4))
+        if mejor is None or ch4[i] > mejor_ch4:
+            mejor, mejor_ch4 = fracciones[i], ch4[i]
+
+    if mejor is None:
+        return None
+    propiedades = {clave: float(valor[0]) for clave, valor in evaluar_mezclas(catalogo, mejor, indices).items()}
+    return {
+        "fracciones": dict(zip(nombres, mejor.tolist())),
+        "masas_kg_dia": dict(zip(nombres, (mejor * caudal_total_kg_dia).tolist())),
+        "ch4_potencial_nm3_dia": propiedades["ch4_potencial_nm3_kg"] * caudal_total_kg_dia,
+        "propiedades": propiedades,
+        "n_evaluadas": n_evaluadas,
+        "n_factibles": n_factibles,
+    }
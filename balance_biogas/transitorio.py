@@ -0,0 +1,312 @@
+# balance_biogas/transitorio.py
+"""Simulación transitoria de la temperatura del digestor: arranque, cortes de alimentación y olas de frío.
+
+El digestor es una única masa térmica (volumen de ``calcular_dimensiones_digestor``
+× densidad × cp del sustrato) con pérdidas U·A hacia el ambiente, el calor que
+absorbe la alimentación al entrar fría y una calefacción de potencia fija
+gobernada por un termostato con histéresis: se enciende si al empezar un paso
+la temperatura está en ``consigna - histeresis/2`` o por debajo y se apaga al
+llegar a ``consigna + histeresis/2``.
+
+Dentro de cada paso las entradas y el estado de la calefacción son constantes,
+así que la ecuación es lineal y se integra de forma exacta:
+
+    T(t + dt) = a·T(t) + g_apagada + g_encendida·[calefacción encendida]
+    a = exp(-dt·(UA + ṁ·cp) / C)
+
+El esquema es estable con cualquier paso y no acumula error de
+discretización. ``simular_transitorio`` avanza un digestor con aritmética de
+floats de Python; ``simular_transitorio_lote`` avanza muchos a la vez con
+NumPy, con un coste por paso casi independiente del número de digestores.
+
+Las series (temperatura ambiente, temperatura del sustrato y fracción de la
+alimentación nominal, 0 = corte) pueden ser escalares o arrays con un valor
+por paso; en el modo por lotes también ``(n_pasos, n_digestores)``.
+"""
+import numpy as np
+
+from .calculos import ENTRADAS_POR_DEFECTO
+from .vectorizado import calcular_dimensiones_digestor_lote, evaluar_escenarios_lote
+
+HISTERESIS_POR_DEFECTO_C = 1.0
+PASO_POR_DEFECTO_MIN = 1.0
+TAM_BLOQUE_PASOS = 2048
+CLAVES_TRANSITORIO = (
+    "energia_calefaccion_mj",
+    "perdidas_calor_mj",
+    "calor_calentar_sustrato_mj",
+    "horas_calefaccion",
+    "arranques_calefaccion",
+    "temp_min_c",
+    "temp_max_c",
+    "temp_final_c",
+    "horas_bajo_consigna",
+    "horas_hasta_consigna",
+)
+
+
+def _parametros(columnas, potencia_calefaccion_kw):
+    """Capacidad térmica (kJ/K), UA y ṁ·cp nominal (kW/K) y potencia de calefacción (kW) de cada digestor."""
+    entradas = dict(ENTRADAS_POR_DEFECTO)
+    entradas.update({clave: valor for clave, valor in columnas.items() if not isinstance(valor, str)})
+    densidad = entradas.get("densidad_sustrato_kg_m3", 1000.0)
+    dimensiones = calcular_dimensiones_digestor_lote(entradas["caudal_sustrato_kg_dia"], entradas["trh_dias"], densidad)
+    area = np.asarray(entradas.get("area_superficial_digestor_m2", np.nan), dtype=np.float64)
+    area = np.where(np.isnan(area), dimensiones["area_superficial_digestor_m2"], area)
+    cp = np.asarray(entradas["cp_sustrato_kj_kg_c"], dtype=np.float64)
+    if potencia_calefaccion_kw is None:
+        # Por defecto, el calor útil del CHP o la caldera del balance estacionario
+        entradas["area_superficial_digestor_m2"] = area
+        potencia_calefaccion_kw = evaluar_escenarios_lote(entradas)["calor_util_generado_mj_dia"] / 86.4
+    parametros = np.broadcast_arrays(
+        dimensiones["volumen_digestor_m3"] * np.asarray(densidad, dtype=np.float64) * cp,
+        np.asarray(entradas["u_digestor_w_m2_k"], dtype=np.float64) * area / 1000,
+        np.asarray(entradas["caudal_sustrato_kg_dia"], dtype=np.float64) / 86400 * cp,
+        np.asarray(potencia_calefaccion_kw, dtype=np.float64),
+    )
+    capacidad = parametros[0]
+    if np.any(capacidad <= 0):
+        raise ValueError("El digestor necesita volumen y capacidad térmica positivos (caudal, TRH, densidad y cp > 0)")
+    return [np.atleast_1d(p).astype(np.float64) for p in parametros], entradas
+
+
+def _serie(valor, n_pasos, nombre):
+    valor = np.asarray(valor, dtype=np.float64)
+    if valor.ndim and valor.shape[0] != n_pasos:
+        raise ValueError(f"La serie '{nombre}' tiene {valor.shape[0]} pasos y se esperaban {n_pasos}")
+    return valor
+
+
+def _preparar(columnas, temp_ambiente, temp_sustrato, alimentacion, duracion_dias, paso_minutos,
+              potencia_calefaccion_kw, consigna_c, histeresis_c, temp_inicial_c):
+    if paso_minutos <= 0:
+        raise ValueError("El paso de tiempo debe ser positivo")
+    (capacidad, ua, mcp, potencia), entradas = _parametros(columnas, potencia_calefaccion_kw)
+    series = {"temp_ambiente": temp_ambiente, "temp_sustrato": temp_sustrato, "alimentacion": alimentacion}
+    longitudes = {np.shape(valor)[0] for valor in series.values() if np.ndim(valor)}
+    # Sin serie se usa la columna de entrada: un valor constante por digestor (se difunde sobre los pasos)
+    por_digestor = {
+        "temp_ambiente": entradas["temp_ambiente_promedio_c"],
+        "temp_sustrato": entradas["temp_sustrato_entrada_c"],
+    }
+    por_digestor = {
+        nombre: np.asarray(valor, dtype=np.float64).reshape(-1) if np.ndim(valor) else np.asarray(valor, dtype=np.float64)
+        for nombre, valor in por_digestor.items() if series[nombre] is None
+    }
+    if duracion_dias is not None:
+        longitudes.add(int(round(duracion_dias * 1440 / paso_minutos)))
+    if len(longitudes) != 1:
+        raise ValueError("Indique la duración o series con un valor por paso (todas de la misma longitud)")
+    n_pasos = longitudes.pop()
+    if n_pasos < 1:
+        raise ValueError("La simulación necesita al menos un paso")
+    series = {nombre: por_digestor[nombre] if nombre in por_digestor else _serie(valor, n_pasos, nombre) for nombre, valor in series.items()}
+    if np.any(series["alimentacion"] < 0):
+        raise ValueError("La fracción de alimentación no puede ser negativa")
+
+    consigna = np.asarray(entradas["temp_op_digestor_c"] if consigna_c is None else consigna_c, dtype=np.float64)
+    histeresis = np.asarray(histeresis_c, dtype=np.float64)
+    if np.any(histeresis < 0):
+        raise ValueError("La histéresis no puede ser negativa")
+    temp_inicial = consigna if temp_inicial_c is None else np.asarray(temp_inicial_c, dtype=np.float64)
+    capacidad, ua, mcp, potencia, consigna, histeresis, temp_inicial = (
+        np.atleast_1d(a).astype(np.float64) for a in np.broadcast_arrays(capacidad, ua, mcp, potencia, consigna, histeresis, temp_inicial)
+    )
+    return {
+        "n_pasos": n_pasos, "dt": paso_minutos * 60.0, "series": series, "por_digestor": frozenset(por_digestor),
+        "capacidad": capacidad, "ua": ua, "mcp": mcp, "potencia": potencia,
+        "temp_encender": consigna - histeresis / 2, "temp_apagar": consigna + histeresis / 2, "temp_inicial": temp_inicial,
+    }
+
+
+def _coeficientes(modelo, inicio, fin):
+    """Coeficientes del paso exacto para los pasos ``inicio:fin`` (difundibles a ``(pasos, digestores)``)."""
+    def _tramo(nombre):
+        serie = modelo["series"][nombre]
+        if not serie.ndim or nombre in modelo["por_digestor"]:
+            return serie
+        return serie[inicio:fin].reshape(fin - inicio, -1)
+
+    temp_ambiente, temp_sustrato = _tramo("temp_ambiente"), _tramo("temp_sustrato")
+    mcp = modelo["mcp"] * _tramo("alimentacion")
+    conductancia = modelo["ua"] + mcp
+    dt = modelo["dt"]
+    exponente = -dt * conductancia / modelo["capacidad"]
+    flujo_ambiente = modelo["ua"] * temp_ambiente
+    flujo = flujo_ambiente + mcp * temp_sustrato
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # (1 - a) / conductancia, con su límite dt / C cuando no hay pérdidas ni alimentación
+        factor = np.where(conductancia > 0, -np.expm1(exponente) / conductancia, dt / modelo["capacidad"])
+        fraccion_perdidas = np.where(conductancia > 0, modelo["ua"] / conductancia, 0.0)
+    return {
+        "a": np.exp(exponente),
+        "g_apagada": factor * flujo,
+        "g_encendida": factor * modelo["potencia"],
+        "flujo_kw": flujo,
+        "flujo_ambiente_kw": flujo_ambiente,
+        "fraccion_perdidas": fraccion_perdidas,
+    }
+
+
+def _suma_pasos(valores, n_pasos):
+    """Suma por digestor de un coeficiente de ``n_pasos`` pasos (constante en el tiempo si tiene menos de 2 dimensiones)."""
+    return valores * n_pasos if np.ndim(valores) < 2 else valores.sum(axis=0)
+
+
+def _nuevo_resumen(modelo):
+    n = len(modelo["capacidad"])
+    temp_inicial = modelo["temp_inicial"]
+    return {
+        "energia_calefaccion_mj": np.zeros(n), "perdidas_calor_mj": np.zeros(n), "calor_calentar_sustrato_mj": np.zeros(n),
+        "horas_calefaccion": np.zeros(n), "arranques_calefaccion": np.zeros(n, dtype=np.int64),
+        "temp_min_c": temp_inicial.copy(), "temp_max_c": temp_inicial.copy(), "temp_final_c": temp_inicial.copy(),
+        "horas_bajo_consigna": np.zeros(n),
+        "horas_hasta_consigna": np.where(temp_inicial > modelo["temp_encender"], 0.0, np.nan),
+        "_encendida": np.zeros(n, dtype=bool),
+    }
+
+
+def _acumular(resumen, modelo, coeficientes, inicio, temperaturas, encendida):
+    """Añade al resumen los pasos ``inicio:inicio + len(temperaturas)`` (temperaturas al final de cada paso)."""
+    n_pasos, dt, horas_paso = len(temperaturas), modelo["dt"], modelo["dt"] / 3600
+    capacidad, potencia = modelo["capacidad"], modelo["potencia"]
+    temp_anterior = resumen["temp_final_c"]
+    pasos_encendida = np.count_nonzero(encendida, axis=0)
+    energia_kj = pasos_encendida * potencia * dt
+    variacion_kj = capacidad * (temperaturas[-1] - temp_anterior)
+
+    # Balance exacto de cada paso: C·ΔT = Q·dt - conductancia·∫T dt, de donde las pérdidas
+    # UA·∫(T - T_amb) dt = UA/conductancia·(Q·dt - C·ΔT) - UA·T_amb·dt (Q = flujos de ambiente y sustrato + calefacción)
+    fraccion = coeficientes["fraccion_perdidas"]
+    if np.ndim(fraccion) < 2:
+        entrada_kj = _suma_pasos(coeficientes["flujo_kw"], n_pasos) * dt + energia_kj
+        perdidas_kj = fraccion * (entrada_kj - variacion_kj)
+    else:
+        variaciones = np.diff(temperaturas, axis=0, prepend=temp_anterior[None, :])
+        variaciones *= -capacidad
+        variaciones += (coeficientes["flujo_kw"] + encendida * potencia) * dt
+        variaciones *= fraccion
+        perdidas_kj = variaciones.sum(axis=0)
+    perdidas_kj = perdidas_kj - _suma_pasos(coeficientes["flujo_ambiente_kw"], n_pasos) * dt
+    resumen["energia_calefaccion_mj"] += energia_kj / 1000
+    resumen["perdidas_calor_mj"] += perdidas_kj / 1000
+    resumen["calor_calentar_sustrato_mj"] += (energia_kj - perdidas_kj - variacion_kj) / 1000
+    resumen["horas_calefaccion"] += pasos_encendida * horas_paso
+    resumen["arranques_calefaccion"] += (
+        np.count_nonzero(encendida[1:] & ~encendida[:-1], axis=0) + (encendida[0] & ~resumen["_encendida"])
+    )
+    np.minimum(resumen["temp_min_c"], temperaturas.min(axis=0), out=resumen["temp_min_c"])
+    np.maximum(resumen["temp_max_c"], temperaturas.max(axis=0), out=resumen["temp_max_c"])
+    resumen["horas_bajo_consigna"] += np.count_nonzero(temperaturas <= modelo["temp_encender"], axis=0) * horas_paso
+
+    pendientes = np.isnan(resumen["horas_hasta_consigna"])
+    if pendientes.any():
+        alcanzada = temperaturas > modelo["temp_encender"]
+        primera = np.argmax(alcanzada, axis=0)
+        nuevas = pendientes & alcanzada.any(axis=0)
+        resumen["horas_hasta_consigna"][nuevas] = (inicio + primera[nuevas] + 1) * horas_paso
+    resumen["temp_final_c"] = temperaturas[-1].copy()
+    resumen["_encendida"] = encendida[-1].copy()
+
+
+def simular_transitorio(entradas, temp_ambiente=None, temp_sustrato=None, alimentacion=1.0, duracion_dias=None,
+                        paso_minutos=PASO_POR_DEFECTO_MIN, potencia_calefaccion_kw=None, consigna_c=None,
+                        histeresis_c=HISTERESIS_POR_DEFECTO_C, temp_inicial_c=None):
+    """Evolución de la temperatura de un digestor con calefacción termostática.
+
+    ``entradas`` son las del balance (caudal, TRH o área, U, cp, temperaturas).
+    Sin ``potencia_calefaccion_kw`` se usa el calor útil del balance
+    estacionario; sin ``consigna_c``, la temperatura de operación; sin
+    ``temp_inicial_c``, la consigna (régimen). Para un arranque, indique la
+    temperatura inicial y la potencia de la caldera de arranque.
+
+    Devuelve los totales de ``CLAVES_TRANSITORIO`` como floats (energías en MJ,
+    ``horas_hasta_consigna`` = NaN si no se alcanza la banda del termostato)
+    más las series ``temperatura_c`` y ``calefaccion_encendida`` (un valor por
+    paso, al final del paso).
+    """
+    modelo = _preparar(entradas, temp_ambiente, temp_sustrato, alimentacion, duracion_dias, paso_minutos,
+                       potencia_calefaccion_kw, consigna_c, histeresis_c, temp_inicial_c)
+    if len(modelo["capacidad"]) != 1:
+        raise ValueError("simular_transitorio evalúa un solo digestor; use simular_transitorio_lote")
+    n_pasos = modelo["n_pasos"]
+    coeficientes = _coeficientes(modelo, 0, n_pasos)
+    forma = (n_pasos, 1)
+    temp_encender, temp_apagar = float(modelo["temp_encender"][0]), float(modelo["temp_apagar"][0])
+
+    # Bucle secuencial (el termostato depende del paso anterior) con floats de Python: más rápido que NumPy elemento a elemento
+    temperaturas = []
+    estados = []
+    guardar_temperatura, guardar_estado = temperaturas.append, estados.append
+    temperatura, encendida = float(modelo["temp_inicial"][0]), False
+    for a, g_apagada, g_encendida in zip(*(np.broadcast_to(coeficientes[clave], forma)[:, 0].tolist()
+                                           for clave in ("a", "g_apagada", "g_encendida"))):
+        encendida = temperatura <= temp_encender or (encendida and temperatura < temp_apagar)
+        temperatura = a * temperatura + g_apagada + g_encendida if encendida else a * temperatura + g_apagada
+        guardar_temperatura(temperatura)
+        guardar_estado(encendida)
+
+    temperaturas = np.array(temperaturas)
+    estados = np.array(estados, dtype=bool)
+    resumen = _nuevo_resumen(modelo)
+    _acumular(resumen, modelo, coeficientes, 0, temperaturas[:, None], estados[:, None])
+    resultado = {clave: resumen[clave][0].item() for clave in CLAVES_TRANSITORIO}
+    resultado.update(
+        n_pasos=n_pasos, paso_minutos=paso_minutos, potencia_calefaccion_kw=float(modelo["potencia"][0]),
+        capacidad_termica_mj_c=float(modelo["capacidad"][0]) / 1000, temperatura_c=temperaturas, calefaccion_encendida=estados,
+    )
+    return resultado
+
+
+def simular_transitorio_lote(columnas, temp_ambiente=None, temp_sustrato=None, alimentacion=1.0, duracion_dias=None,
+                             paso_minutos=PASO_POR_DEFECTO_MIN, potencia_calefaccion_kw=None, consigna_c=None,
+                             histeresis_c=HISTERESIS_POR_DEFECTO_C, temp_inicial_c=None, registro_cada=None):
+    """Como ``simular_transitorio`` para muchos digestores a la vez (columnas del motor vectorizado).
+
+    Los parámetros de control pueden ser arrays con un valor por digestor y las
+    series, ``(n_pasos,)`` comunes o ``(n_pasos, n_digestores)``. Devuelve
+    arrays por digestor con las claves de ``CLAVES_TRANSITORIO``; con
+    ``registro_cada`` añade ``temperatura_c`` con la temperatura cada ese
+    número de pasos (forma ``(n_pasos // registro_cada, n_digestores)``).
+    """
+    modelo = _preparar(columnas, temp_ambiente, temp_sustrato, alimentacion, duracion_dias, paso_minutos,
+                       potencia_calefaccion_kw, consigna_c, histeresis_c, temp_inicial_c)
+    n_pasos, n_digestores = modelo["n_pasos"], len(modelo["capacidad"])
+    for nombre, serie in modelo["series"].items():
+        if serie.ndim == 2 and serie.shape[1] not in (1, n_digestores):
+            raise ValueError(f"La serie '{nombre}' tiene {serie.shape[1]} columnas y hay {n_digestores} digestores")
+    resumen = _nuevo_resumen(modelo)
+    registro = [] if registro_cada else None
+    temp_encender, temp_apagar = modelo["temp_encender"], modelo["temp_apagar"]
+    temperatura = modelo["temp_inicial"].copy()
+    encendida_anterior = np.zeros(n_digestores, dtype=bool)
+    continua = np.empty(n_digestores, dtype=bool)
+
+    for inicio in range(0, n_pasos, TAM_BLOQUE_PASOS):
+        fin = min(inicio + TAM_BLOQUE_PASOS, n_pasos)
+        coeficientes = _coeficientes(modelo, inicio, fin)
+        forma = (fin - inicio, n_digestores)
+        a, g_apagada, g_encendida = (np.broadcast_to(coeficientes[clave], forma) for clave in ("a", "g_apagada", "g_encendida"))
+        temperaturas = np.empty(forma)
+        estados = np.empty(forma, dtype=bool)
+        for j in range(fin - inicio):
+            # Termostato con la temperatura al inicio del paso y después el paso exacto, escritos en la fila del bloque
+            fila, encendida = temperaturas[j], estados[j]
+            np.less(temperatura, temp_apagar, out=continua)
+            continua &= encendida_anterior
+            np.less_equal(temperatura, temp_encender, out=encendida)
+            encendida |= continua
+            np.multiply(temperatura, a[j], out=fila)
+            fila += g_apagada[j]
+            np.add(fila, g_encendida[j], out=fila, where=encendida)
+            temperatura, encendida_anterior = fila, encendida
+        _acumular(resumen, modelo, coeficientes, inicio, temperaturas, estados)
+        if registro is not None:
+            registro.append(temperaturas[(registro_cada - 1 - inicio) % registro_cada::registro_cada])
+
+    resultado = {clave: resumen[clave] for clave in CLAVES_TRANSITORIO}
+    resultado.update(n_pasos=n_pasos, paso_minutos=paso_minutos, potencia_calefaccion_kw=modelo["potencia"],
+                     capacidad_termica_mj_c=modelo["capacidad"] / 1000)
+    if registro is not None:
+        resultado["temperatura_c"] = np.concatenate(registro)
+    return resultado
@@ -0,0 +1,149 @@
+# balance_biogas/upgrading.py
+"""Rama de upgrading a biometano como cadena de etapas (uso_biogas_opcion_idx == 2).
+
+Por cada Nm³ de biogás bruto tratado:
+
+1. Separación del CO₂ con la tecnología elegida (membranas, lavado con agua,
+   PSA o aminas): consumo eléctrico específico, que incluye la compresión
+   propia del proceso.
+2. Regeneración de la amina: demanda de calor (solo aminas).
+3. Pérdida de metano en el gas de cola (*methane slip*), en % del CH₄ de entrada.
+4. Compresión del biometano desde la presión de salida de la tecnología hasta
+   la de inyección en red: compresión adiabática en etapas con refrigeración
+   intermedia (relación máxima por etapa ``RELACION_MAX_ETAPA``).
+
+Los valores de ``TECNOLOGIAS_UPGRADING`` son típicos de plantas comerciales;
+el índice coincide con ``upgrading_tecnologia_idx``. Las funciones escalares
+solo usan la biblioteca estándar (como ``calculos``); ``calcular_upgrading_lote``
+es la versión por filas con NumPy que usa el motor vectorizado.
+"""
+import math
+
+# Índice = upgrading_tecnologia_idx
+OPCIONES_UPGRADING = ("Membranas", "Lavado con agua", "PSA", "Aminas")
+TECNOLOGIAS_UPGRADING = (
+    {"consumo_electrico_kwh_nm3": 0.25, "calor_mj_nm3": 0.0, "perdida_ch4_porcentaje": 0.5, "pureza_ch4_porcentaje": 97.0, "presion_salida_bar": 12.0},
+    {"consumo_electrico_kwh_nm3": 0.25, "calor_mj_nm3": 0.0, "perdida_ch4_porcentaje": 1.0, "pureza_ch4_porcentaje": 97.0, "presion_salida_bar": 7.0},
+    {"consumo_electrico_kwh_nm3": 0.25, "calor_mj_nm3": 0.0, "perdida_ch4_porcentaje": 2.0, "pureza_ch4_porcentaje": 97.0, "presion_salida_bar": 5.0},
+    # Aminas: ~0,55 kWh de calor (120-160 °C) por Nm³ de biogás para regenerar el disolvente
+    {"consumo_electrico_kwh_nm3": 0.12, "calor_mj_nm3": 1.98, "perdida_ch4_porcentaje": 0.1, "pureza_ch4_porcentaje": 99.0, "presion_salida_bar": 1.1},
+)
+# Claves de calcular_upgrading, en orden
+CLAVES_UPGRADING = (
+    "consumo_electrico_upgrading_kwh_dia",
+    "calor_upgrading_mj_dia",
+    "ch4_perdido_upgrading_nm3_dia",
+    "biometano_neto_nm3_dia",
+    "consumo_electrico_compresion_kwh_dia",
+)
+
+# Compresión: biometano como gas ideal (κ del metano) aspirado a 20 °C
+KAPPA_BIOMETANO = 1.31
+EFICIENCIA_COMPRESOR = 0.70
+RELACION_MAX_ETAPA = 4.0
+# p·V de 1 Nm³ a la temperatura de aspiración (kJ): 101,325 kPa × 1 m³ × T_asp / 273,15 K
+TRABAJO_REFERENCIA_KJ_NM3 = 101.325 * 293.15 / 273.15
+
+
+def tecnologia_valida(tecnologia_idx):
+    """``True`` si ``tecnologia_idx`` es un índice entero de ``TECNOLOGIAS_UPGRADING``."""
+    return math.isfinite(tecnologia_idx) and tecnologia_idx == int(tecnologia_idx) and 0 <= tecnologia_idx < len(TECNOLOGIAS_UPGRADING)
+
+
+def _error_tecnologia(tecnologia_idx):
+    return ValueError(f"Tecnología de upgrading desconocida: {tecnologia_idx:g}. "
+                      f"Opciones: 0-{len(TECNOLOGIAS_UPGRADING) - 1} ({', '.join(OPCIONES_UPGRADING)})")
+
+
+def tecnologia_upgrading(tecnologia_idx):
+    """Parámetros de la tecnología ``tecnologia_idx`` (ValueError si no existe)."""
+    if not tecnologia_valida(tecnologia_idx):
+        raise _error_tecnologia(tecnologia_idx)
+    return TECNOLOGIAS_UPGRADING[int(tecnologia_idx)]
+
+
+def nombre_tecnologia_upgrading(tecnologia_idx):
+    """Nombre de la tecnología ``tecnologia_idx`` (ValueError si no existe)."""
+    tecnologia_upgrading(tecnologia_idx)
+    return OPCIONES_UPGRADING[int(tecnologia_idx)]
+
+
+def energia_compresion_kwh_nm3(presion_entrada_bar, presion_salida_bar):
+    """Electricidad por Nm³ para comprimir de ``presion_entrada_bar`` a ``presion_salida_bar`` (0 si no hay que comprimir)."""
+    if presion_entrada_bar <= 0 or presion_salida_bar <= presion_entrada_bar:
+        return 0.0
+    relacion = presion_salida_bar / presion_entrada_bar
+    etapas = max(1, math.ceil(math.log(relacion) / math.log(RELACION_MAX_ETAPA)))
+    exponente = (KAPPA_BIOMETANO - 1) / KAPPA_BIOMETANO
+    trabajo_kj = etapas * TRABAJO_REFERENCIA_KJ_NM3 / exponente * (relacion**(exponente / etapas) - 1) / EFICIENCIA_COMPRESOR
+    return trabajo_kj / 3600
+
+
+# --- Etapas (una función por magnitud, las usan también los nodos del grafo) ---
+
+def consumo_electrico_upgrading(biogas_producido_nm3_dia, tecnologia_idx):
+    return biogas_producido_nm3_dia * tecnologia_upgrading(tecnologia_idx)["consumo_electrico_kwh_nm3"]
+
+
+def calor_upgrading(biogas_producido_nm3_dia, tecnologia_idx):
+    return biogas_producido_nm3_dia * tecnologia_upgrading(tecnologia_idx)["calor_mj_nm3"]
+
+
+def ch4_perdido_upgrading(ch4_producido_nm3_dia, tecnologia_idx):
+    return ch4_producido_nm3_dia * (tecnologia_upgrading(tecnologia_idx)["perdida_ch4_porcentaje"] / 100)
+
+
+def biometano_neto(ch4_producido_nm3_dia, ch4_perdido_upgrading_nm3_dia, tecnologia_idx):
+    return (ch4_producido_nm3_dia - ch4_perdido_upgrading_nm3_dia) / (tecnologia_upgrading(tecnologia_idx)["pureza_ch4_porcentaje"] / 100)
+
+
+def consumo_electrico_compresion(biometano_neto_nm3_dia, tecnologia_idx, presion_inyeccion_bar):
+    presion_salida = tecnologia_upgrading(tecnologia_idx)["presion_salida_bar"]
+    return biometano_neto_nm3_dia * energia_compresion_kwh_nm3(presion_salida, presion_inyeccion_bar)
+
+
+def calcular_upgrading(biogas_producido_nm3_dia, ch4_producido_nm3_dia, tecnologia_idx, presion_inyeccion_bar):
+    """Recorre las etapas para un caudal de biogás y devuelve un diccionario con ``CLAVES_UPGRADING``."""
+    perdido = ch4_perdido_upgrading(ch4_producido_nm3_dia, tecnologia_idx)
+    biometano = biometano_neto(ch4_producido_nm3_dia, perdido, tecnologia_idx)
+    return {
+        "consumo_electrico_upgrading_kwh_dia": consumo_electrico_upgrading(biogas_producido_nm3_dia, tecnologia_idx),
+        "calor_upgrading_mj_dia": calor_upgrading(biogas_producido_nm3_dia, tecnologia_idx),
+        "ch4_perdido_upgrading_nm3_dia": perdido,
+        "biometano_neto_nm3_dia": biometano,
+        "consumo_electrico_compresion_kwh_dia": consumo_electrico_compresion(biometano, tecnologia_idx, presion_inyeccion_bar),
+    }
+
+
+def calcular_upgrading_lote(biogas_producido_nm3_dia, ch4_producido_nm3_dia, tecnologia_idx, presion_inyeccion_bar):
+    """Versión por filas de ``calcular_upgrading`` (arrays o escalares que se difunden)."""
+    import numpy as np
+
+    biogas, ch4, indices, presion = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(valor, dtype=np.float64)) for valor in (
+            biogas_producido_nm3_dia, ch4_producido_nm3_dia, tecnologia_idx, presion_inyeccion_bar))
+    )
+    validos = (indices == np.floor(indices)) & (indices >= 0) & (indices < len(TECNOLOGIAS_UPGRADING))
+    if not validos.all():
+        raise _error_tecnologia(indices[~validos][0])
+    indices = indices.astype(np.intp)
+
+    def _tabla(campo):
+        return np.array([tecnologia[campo] for tecnologia in TECNOLOGIAS_UPGRADING])[indices]
+
+    perdido = ch4 * (_tabla("perdida_ch4_porcentaje") / 100)
+    biometano = (ch4 - perdido) / (_tabla("pureza_ch4_porcentaje") / 100)
+
+    presion_salida = _tabla("presion_salida_bar")
+    comprime = (presion_salida > 0) & (presion > presion_salida)
+    relacion = np.where(comprime, presion / np.where(comprime, presion_salida, 1.0), 1.0)
+    etapas = np.maximum(1.0, np.ceil(np.log(relacion) / math.log(RELACION_MAX_ETAPA)))
+    exponente = (KAPPA_BIOMETANO - 1) / KAPPA_BIOMETANO
+    energia_kwh_nm3 = etapas * TRABAJO_REFERENCIA_KJ_NM3 / exponente * (relacion**(exponente / etapas) - 1) / EFICIENCIA_COMPRESOR / 3600
+    return {
+        "consumo_electrico_upgrading_kwh_dia": biogas * _tabla("consumo_electrico_kwh_nm3"),
+        "calor_upgrading_mj_dia": biogas * _tabla("calor_mj_nm3"),
+        "ch4_perdido_upgrading_nm3_dia": perdido,
+        "biometano_neto_nm3_dia": biometano,
+        "consumo_electrico_compresion_kwh_dia": biometano * np.where(comprime, energia_kwh_nm3, 0.0),
+    }
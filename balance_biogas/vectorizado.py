@@ -0,0 +1,139 @@
+# balance_biogas/vectorizado.py
+"""Motor de cálculo por lotes (columnar) para el balance energético.
+
+Las funciones aceptan un diccionario de columnas (listas, arrays de NumPy o
+escalares, que se difunden) con las mismas claves que ``inputs_calc`` y
+devuelven un diccionario de arrays con las mismas claves que
+``realizar_calculos_balance``. Cada fila reproduce el resultado de las
+funciones escalares, incluidas las ramas de protección frente a cero (la raíz
+cúbica del diámetro puede diferir en el último bit respecto a ``math``).
+"""
+import numpy as np
+
+from .calculos import CLAVES_DIMENSIONES, CLAVES_RESULTADOS, ENTRADAS_POR_DEFECTO, PCI_CH4_MJ_NM3  # noqa: F401 (reexportadas)
+from .upgrading import CLAVES_UPGRADING, calcular_upgrading_lote
+
+# Entradas que pueden faltar (se tratan como 0, igual que inputs_calc.get(..., 0))
+_ENTRADAS_OPCIONALES = (
+    "chp_eficiencia_electrica_porcentaje",
+    "chp_eficiencia_termica_porcentaje",
+    "caldera_eficiencia_porcentaje",
+)
+# Entradas que pueden faltar y toman el valor de ENTRADAS_POR_DEFECTO (como en realizar_calculos_balance)
+_ENTRADAS_CON_DEFECTO = ("upgrading_tecnologia_idx", "presion_inyeccion_bar")
+
+
+def _columna(columnas, clave, opcional=False, defecto=0.0):
+    if opcional and clave not in columnas:
+        return np.float64(defecto)
+    return np.asarray(columnas[clave], dtype=np.float64)
+
+
+def _difundir(valores):
+    """Difunde todas las columnas a una longitud común (1-D)."""
+    arrays = np.broadcast_arrays(*[np.atleast_1d(v) for v in valores.values()])
+    return {clave: np.ascontiguousarray(a) for clave, a in zip(valores, arrays)}
+
+
+def calcular_dimensiones_digestor_lote(caudal_sustrato_kg_dia, trh_dias, densidad_sustrato_kg_m3=1000):
+    caudal, trh, densidad = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(caudal_sustrato_kg_dia, dtype=np.float64)),
+        np.atleast_1d(np.asarray(trh_dias, dtype=np.float64)),
+        np.atleast_1d(np.asarray(densidad_sustrato_kg_m3, dtype=np.float64)),
+    )
+    volumen_digestor_m3 = (caudal / densidad) * trh
+    con_volumen = volumen_digestor_m3 > 0
+    diametro_digestor_m = np.power(4 * volumen_digestor_m3 / np.pi, 1 / 3, out=np.zeros_like(volumen_digestor_m3), where=con_volumen)
+    area_superficial_digestor_m2 = np.where(con_volumen, 1.5 * np.pi * (diametro_digestor_m ** 2), 0.0)
+    return {
+        "volumen_digestor_m3": volumen_digestor_m3,
+        "diametro_digestor_m": diametro_digestor_m,
+        "altura_digestor_m": diametro_digestor_m.copy(),
+        "area_superficial_digestor_m2": area_superficial_digestor_m2,
+    }
+
+
+def realizar_calculos_balance_lote(columnas):
+    entradas = {
+        clave: _columna(columnas, clave)
+        for clave in (
+            "caudal_sustrato_kg_dia", "st_porcentaje", "sv_de_st_porcentaje", "bmp_nm3_ch4_kg_sv",
+            "eficiencia_digestion_porcentaje", "ch4_en_biogas_porcentaje", "cp_sustrato_kj_kg_c",
+            "temp_op_digestor_c", "temp_sustrato_entrada_c", "u_digestor_w_m2_k",
+            "area_superficial_digestor_m2", "temp_ambiente_promedio_c", "uso_biogas_opcion_idx",
+            "consumo_electrico_aux_kwh_ton_sustrato",
+        )
+    }
+    for clave in _ENTRADAS_OPCIONALES:
+        entradas[clave] = _columna(columnas, clave, opcional=True)
+    for clave in _ENTRADAS_CON_DEFECTO:
+        entradas[clave] = _columna(columnas, clave, opcional=True, defecto=ENTRADAS_POR_DEFECTO[clave])
+    e = _difundir(entradas)
+    caudal = e["caudal_sustrato_kg_dia"]
+    ch4_pct = e["ch4_en_biogas_porcentaje"]
+    uso = e["uso_biogas_opcion_idx"]
+
+    r = {}
+    r["sv_alimentado_kg_dia"] = caudal * (e["st_porcentaje"] / 100) * (e["sv_de_st_porcentaje"] / 100)
+    r["ch4_producido_nm3_dia"] = r["sv_alimentado_kg_dia"] * e["bmp_nm3_ch4_kg_sv"] * (e["eficiencia_digestion_porcentaje"] / 100)
+    r["biogas_producido_nm3_dia"] = np.divide(r["ch4_producido_nm3_dia"], ch4_pct / 100, out=np.zeros_like(caudal), where=ch4_pct > 0)
+    r["pci_biogas_mj_nm3"] = PCI_CH4_MJ_NM3 * (ch4_pct / 100)
+    r["energia_bruta_biogas_mj_dia"] = r["biogas_producido_nm3_dia"] * r["pci_biogas_mj_nm3"]
+    r["energia_bruta_biogas_kwh_dia"] = r["energia_bruta_biogas_mj_dia"] / 3.6
+    r["calor_calentar_sustrato_mj_dia"] = (caudal * e["cp_sustrato_kj_kg_c"] * (e["temp_op_digestor_c"] - e["temp_sustrato_entrada_c"])) / 1000
+    delta_t = e["temp_op_digestor_c"] - e["temp_ambiente_promedio_c"]
+    area = e["area_superficial_digestor_m2"]
+    perdidas = (e["u_digestor_w_m2_k"] * area * delta_t * 3600 * 24) / 1000000
+    r["perdidas_calor_digestor_mj_dia"] = np.where((delta_t > 0) & (area > 0), perdidas, 0.0)
+    r["demanda_termica_total_digestor_mj_dia"] = r["calor_calentar_sustrato_mj_dia"] + r["perdidas_calor_digestor_mj_dia"]
+    r["demanda_termica_total_digestor_kwh_dia"] = r["demanda_termica_total_digestor_mj_dia"] / 3.6
+
+    # Rama por fila según el uso del biogás: 0 = CHP, 1 = Caldera, 2 = Upgrading, resto = sin conversión
+    es_chp = uso == 0
+    es_caldera = uso == 1
+    es_upgrading = uso == 2
+    r["electricidad_generada_bruta_kwh_dia"] = np.where(
+        es_chp, r["energia_bruta_biogas_kwh_dia"] * (e["chp_eficiencia_electrica_porcentaje"] / 100), 0.0)
+    r["calor_util_generado_mj_dia"] = np.where(
+        es_chp, r["energia_bruta_biogas_mj_dia"] * (e["chp_eficiencia_termica_porcentaje"] / 100),
+        np.where(es_caldera, r["energia_bruta_biogas_mj_dia"] * (e["caldera_eficiencia_porcentaje"] / 100), 0.0))
+
+    # La cadena de upgrading solo se evalúa (y la tecnología solo se valida) en las filas que la usan
+    for clave in (*CLAVES_UPGRADING, "energia_biometano_kwh_dia"):
+        r[clave] = np.zeros_like(caudal)
+    filas = np.flatnonzero(es_upgrading)
+    if len(filas):
+        ch4_filas = r["ch4_producido_nm3_dia"][filas]
+        upgrading = calcular_upgrading_lote(
+            r["biogas_producido_nm3_dia"][filas], ch4_filas, e["upgrading_tecnologia_idx"][filas], e["presion_inyeccion_bar"][filas])
+        for clave in CLAVES_UPGRADING:
+            r[clave][filas] = upgrading[clave]
+        r["energia_biometano_kwh_dia"][filas] = (ch4_filas - upgrading["ch4_perdido_upgrading_nm3_dia"]) * PCI_CH4_MJ_NM3 / 3.6
+
+    r["consumo_electrico_aux_total_kwh_dia"] = (caudal / 1000) * e["consumo_electrico_aux_kwh_ton_sustrato"]
+    r["electricidad_neta_exportable_kwh_dia"] = (r["electricidad_generada_bruta_kwh_dia"] - r["consumo_electrico_aux_total_kwh_dia"]
+                                                 - r["consumo_electrico_upgrading_kwh_dia"] - r["consumo_electrico_compresion_kwh_dia"])
+    r["calor_neto_disponible_mj_dia"] = r["calor_util_generado_mj_dia"] - r["demanda_termica_total_digestor_mj_dia"] - r["calor_upgrading_mj_dia"]
+    r["calor_neto_disponible_kwh_dia"] = r["calor_neto_disponible_mj_dia"] / 3.6
+    return r
+
+
+def evaluar_escenarios_lote(columnas):
+    """Dimensiona el digestor a partir de caudal y TRH y calcula el balance de cada fila.
+
+    Si ``area_superficial_digestor_m2`` viene en las columnas se respeta; si no,
+    se toma del dimensionamiento. Devuelve dimensiones y resultados en un único
+    diccionario de arrays.
+    """
+    dimensiones = calcular_dimensiones_digestor_lote(
+        columnas["caudal_sustrato_kg_dia"],
+        columnas["trh_dias"],
+        columnas.get("densidad_sustrato_kg_m3", 1000),
+    )
+    entradas = dict(columnas)
+    entradas.setdefault("area_superficial_digestor_m2", dimensiones["area_superficial_digestor_m2"])
+    resultados = realizar_calculos_balance_lote(entradas)
+    n = len(resultados["sv_alimentado_kg_dia"])
+    salida = {clave: np.array(np.broadcast_to(valor, (n,))) for clave, valor in dimensiones.items()}
+    salida.update(resultados)
+    return salida
@@ -0,0 +1,274 @@
+# benchmarks/bench_balance.py
+"""Benchmarks del motor de cálculo, las exportaciones y el ciclo de ejecución de Streamlit.
+
+Uso:
+    python benchmarks/bench_balance.py ejecutar -o benchmarks/baseline.json
+    python benchmarks/bench_balance.py ejecutar -o nuevo.json --rapido
+    python benchmarks/bench_balance.py comparar benchmarks/baseline.json nuevo.json --umbral 0.25
+
+``ejecutar`` mide cada caso con ``timeit`` (se ajusta el número de llamadas
+por repetición a ~0.2 s y se guarda la mediana y el mínimo por llamada) y
+escribe un JSON con los resultados y los datos del entorno. ``comparar``
+lista los casos de la referencia y termina con código 1 si alguno es más lento
+que en ella en más del umbral (por defecto un 20 %) o falta en el fichero
+nuevo (p. ej. un caso que ha dejado de ejecutarse o una medida con ``--rapido``
+frente a una referencia completa).
+
+Los tiempos dependen de la máquina: la referencia debe generarse en el mismo
+equipo en el que se compara.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_REPO)
+
+from balance_biogas.calculos import ENTRADAS_POR_DEFECTO, calcular_dimensiones_digestor, realizar_calculos_balance  # noqa: E402
+
+TAMANOS_ESCALADO = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+UMBRAL_POR_DEFECTO = 0.20
+_TEXTO_SANITIZAR = (
+    "Cogeneración (CHP) - Eficiencia térmica recuperable: 45.0 % | Calor útil: 1234.56 MJ/día "
+    "| Digestión mesofílica a 38 °C con purín, ensilado de maíz y glicerina ¿añadir más? ¡Sí! 1.000 €"
+)
+
+
+def _entradas_balance():
+    entradas = dict(ENTRADAS_POR_DEFECTO)
+    dimensiones = calcular_dimensiones_digestor(entradas["caudal_sustrato_kg_dia"], entradas["trh_dias"])
+    entradas.update(
+        area_superficial_digestor_m2=dimensiones["area_superficial_digestor_m2"],
+        sustrato_nombre="Residuos Agroindustriales", bmp_fuente_texto="Valor de laboratorio",
+        temp_op_digestor_texto="Mesofílico (~37-42 °C)", uso_biogas_texto="Cogeneración (CHP)",
+    )
+    return entradas, dimensiones
+
+
+def medir(funcion, repeticiones=5, tiempo_objetivo=0.2):
+    """Mediana y mínimo (s por llamada) de ``funcion`` sin argumentos."""
+    temporizador = timeit.Timer(funcion)
+    numero, duracion = temporizador.autorange()
+    if duracion < tiempo_objetivo:
+        numero = max(1, int(numero * tiempo_objetivo / max(duracion, 1e-9)))
+    tiempos = [t / numero for t in temporizador.repeat(repeat=repeticiones, number=numero)]
+    return {"segundos": statistics.median(tiempos), "min": min(tiempos), "llamadas": numero, "repeticiones": repeticiones}
+
+
+def casos_calculo():
+    entradas, _ = _entradas_balance()
+    caudal, trh = entradas["caudal_sustrato_kg_dia"], entradas["trh_dias"]
+    yield "calculos.calcular_dimensiones_digestor", lambda: calcular_dimensiones_digestor(caudal, trh)
+    yield "calculos.realizar_calculos_balance", lambda: realizar_calculos_balance(entradas)
+
+
+def casos_exportacion():
+    from balance_biogas.exportar import FPDF_AVAILABLE, OPENPYXL_AVAILABLE, generar_excel_bytes, generar_pdf_bytes, sanitize_text_for_fpdf
+
+    entradas, dimensiones = _entradas_balance()
+    resultados = realizar_calculos_balance(entradas)
+    info = {"nombre": "Planta de referencia", "analista": "Benchmark", "fecha": "2025-01-01"}
+    yield "exportar.sanitize_text_for_fpdf", lambda: sanitize_text_for_fpdf(_TEXTO_SANITIZAR)
+    if OPENPYXL_AVAILABLE:
+        yield "exportar.generar_excel_bytes", lambda: generar_excel_bytes(entradas, resultados, dimensiones, info)
+    if FPDF_AVAILABLE:
+        yield "exportar.generar_pdf_bytes", lambda: generar_pdf_bytes(entradas, resultados, dimensiones, info)
+
+
+def casos_escalado(tamano_maximo):
+    import numpy as np
+
+    from balance_biogas.vectorizado import evaluar_escenarios_lote
+
+    rng = np.random.default_rng(0)
+    for n in TAMANOS_ESCALADO:
+        if n > tamano_maximo:
+            break
+        columnas = dict(ENTRADAS_POR_DEFECTO)
+        columnas["caudal_sustrato_kg_dia"] = rng.uniform(1_000, 50_000, n)
+        columnas["temp_ambiente_promedio_c"] = rng.uniform(-5, 25, n)
+        yield f"escalado.evaluar_escenarios_lote.n={n}", (lambda c=columnas: evaluar_escenarios_lote(c)), n
+
+
+def casos_sensibilidad():
+    import numpy as np
+
+    from balance_biogas.cache import CacheLRU
+    from balance_biogas.sensibilidad import MAX_BARRIDOS_MEMORIA, analisis_tornado, rejilla_sensibilidad
+
+    entradas, _ = _entradas_balance()
+    trh, temperatura = np.linspace(10, 60, 200), np.linspace(-10, 30, 200)
+    yield "sensibilidad.analisis_tornado", lambda: analisis_tornado(entradas)
+    yield "sensibilidad.rejilla_200x200", lambda: rejilla_sensibilidad(entradas, "trh_dias", trh, "temp_ambiente_promedio_c", temperatura)
+    memoria = CacheLRU(MAX_BARRIDOS_MEMORIA)
+    yield "sensibilidad.rejilla_200x200_memoria_vacia", (
+        lambda: rejilla_sensibilidad(entradas, "trh_dias", trh, "temp_ambiente_promedio_c", temperatura, memoria=CacheLRU(MAX_BARRIDOS_MEMORIA)))
+    rejilla_sensibilidad(entradas, "trh_dias", trh, "temp_ambiente_promedio_c", temperatura, memoria=memoria)
+    yield "sensibilidad.rejilla_200x200_repetida", (
+        lambda: rejilla_sensibilidad(entradas, "trh_dias", trh, "temp_ambiente_promedio_c", temperatura, memoria=memoria))
+
+
+def casos_transitorio():
+    import numpy as np
+
+    from balance_biogas.transitorio import simular_transitorio, simular_transitorio_lote
+
+    entradas, _ = _entradas_balance()
+    minutos = np.arange(525_600)
+    # Año a 1 minuto con ciclo estacional y diario de temperatura ambiente
+    temp_ambiente = 10 + 12 * np.sin(2 * np.pi * minutos / 525_600) + 5 * np.sin(2 * np.pi * minutos / 1440)
+    yield "transitorio.anio_1min", lambda: simular_transitorio(entradas, temp_ambiente=temp_ambiente)
+    columnas = dict(entradas, caudal_sustrato_kg_dia=np.linspace(2_000, 50_000, 100))
+    columnas.pop("area_superficial_digestor_m2")  # cada digestor con el área de su caudal
+    yield "transitorio.lote_100_anio_1h", lambda: simular_transitorio_lote(columnas, temp_ambiente=temp_ambiente[::60], paso_minutos=60)
+
+
+def casos_almacen(n_escenarios=1_000_000):
+    import tempfile
+
+    import numpy as np
+
+    from balance_biogas.almacen import AlmacenEscenarios
+    from balance_biogas.vectorizado import evaluar_escenarios_lote
+
+    entradas, _ = _entradas_balance()
+    rng = np.random.default_rng(0)
+    columnas = dict(entradas, caudal_sustrato_kg_dia=rng.uniform(1_000, 50_000, n_escenarios),
+                    temp_ambiente_promedio_c=rng.uniform(-10, 30, n_escenarios))
+    columnas.update(evaluar_escenarios_lote(columnas))
+    deficit = {"calor_neto_disponible_mj_dia": (None, 500.0)}
+    with tempfile.TemporaryDirectory() as directorio:
+        almacen = AlmacenEscenarios(directorio)
+        almacen.agregar_lote(columnas, etiqueta="bench")
+        yield f"almacen.filtrar_{n_escenarios}", lambda: almacen.filtrar(deficit)
+        yield f"almacen.top20_{n_escenarios}", lambda: almacen.top("electricidad_neta_exportable_kwh_dia", 20, deficit)
+        ids = almacen.top("electricidad_neta_exportable_kwh_dia", 20)
+        yield "almacen.registros_20", lambda: almacen.registros(ids)
+
+
+def caso_streamlit():
+    """Una re-ejecución completa del script con los resultados visibles (AppTest, sin navegador)."""
+    from importlib.util import find_spec
+
+    if find_spec("streamlit") is None:
+        return None
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(RAIZ_REPO, "streamlit_biogas_balance.py"), default_timeout=120)
+    app.run()
+    app.button[0].click().run()
+    if app.exception:
+        raise RuntimeError(f"La aplicación lanzó una excepción: {app.exception[0].value}")
+    return lambda: app.run()
+
+
+def ejecutar(salida, rapido=False, incluir_streamlit=True):
+    repeticiones = 3 if rapido else 5
+    resultados = {}
+
+    def _registrar(nombre, funcion, filas=None, repeticiones_caso=repeticiones, tiempo_objetivo=0.2):
+        medida = medir(funcion, repeticiones_caso, tiempo_objetivo)
+        if filas is not None:
+            medida["filas"] = filas
+            medida["filas_por_segundo"] = filas / medida["segundos"]
+        resultados[nombre] = medida
+        print(f"{nombre:<55} {medida['segundos'] * 1e6:>14.2f} µs", file=sys.stderr)
+
+    for nombre, funcion in casos_calculo():
+        _registrar(nombre, funcion)
+    for nombre, funcion in casos_exportacion():
+        _registrar(nombre, funcion)
+    for nombre, funcion in casos_sensibilidad():
+        _registrar(nombre, funcion)
+    for nombre, funcion in casos_transitorio():
+        _registrar(nombre, funcion, repeticiones_caso=3)
+    for nombre, funcion in casos_almacen(100_000 if rapido else 1_000_000):
+        _registrar(nombre, funcion)
+    for nombre, funcion, n in casos_escalado(100_000 if rapido else TAMANOS_ESCALADO[-1]):
+        _registrar(nombre, funcion, filas=n)
+    if incluir_streamlit:
+        rerun = caso_streamlit()
+        if rerun is not None:
+            _registrar("streamlit.rerun_resultados", rerun, repeticiones_caso=3, tiempo_objetivo=0.0)
+
+    import numpy as np
+
+    documento = {
+        "metadatos": {
+            "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "rapido": rapido,
+        },
+        "resultados": resultados,
+    }
+    with open(salida, "w", encoding="utf-8") as fichero:
+        json.dump(documento, fichero, indent=2, ensure_ascii=False)
+    return documento
+
+
+def comparar(referencia, nuevo, umbral=UMBRAL_POR_DEFECTO):
+    """Devuelve las filas de la comparación ``(nombre, s_ref, s_nuevo, ratio, regresion)``.
+
+    Un caso de la referencia que falta en ``nuevo`` aparece con ``s_nuevo`` y
+    ``ratio`` a ``None`` y cuenta como regresión.
+    """
+    filas = []
+    for nombre, medida_ref in referencia["resultados"].items():
+        medida_nueva = nuevo["resultados"].get(nombre)
+        if medida_nueva is None:
+            filas.append((nombre, medida_ref["segundos"], None, None, True))
+            continue
+        ratio = medida_nueva["segundos"] / medida_ref["segundos"] if medida_ref["segundos"] else float("inf")
+        filas.append((nombre, medida_ref["segundos"], medida_nueva["segundos"], ratio, ratio > 1 + umbral))
+    return filas
+
+
+def _leer_json(ruta):
+    with open(ruta, encoding="utf-8") as fichero:
+        return json.load(fichero)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del balance energético de biogás.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    p_ejecutar = subparsers.add_parser("ejecutar", help="Mide todos los casos y guarda los resultados en JSON.")
+    p_ejecutar.add_argument("-o", "--salida", default=os.path.join(RAIZ_REPO, "benchmarks", "baseline.json"))
+    p_ejecutar.add_argument("--rapido", action="store_true", help="Menos repeticiones y escalado hasta 1e5 filas.")
+    p_ejecutar.add_argument("--sin-streamlit", action="store_true", help="Omite la medida de re-ejecución con AppTest.")
+
+    p_comparar = subparsers.add_parser("comparar", help="Compara dos ficheros de resultados y señala regresiones.")
+    p_comparar.add_argument("referencia")
+    p_comparar.add_argument("nuevo")
+    p_comparar.add_argument("--umbral", type=float, default=UMBRAL_POR_DEFECTO, help="Fracción de empeoramiento tolerada (0.2 = 20 %%).")
+
+    args = parser.parse_args(argv)
+    if args.comando == "ejecutar":
+        ejecutar(args.salida, rapido=args.rapido, incluir_streamlit=not args.sin_streamlit)
+        print(f"Resultados guardados en {args.salida}", file=sys.stderr)
+        return 0
+
+    filas = comparar(_leer_json(args.referencia), _leer_json(args.nuevo), args.umbral)
+    for nombre, s_ref, s_nuevo, ratio, regresion in filas:
+        if s_nuevo is None:
+            print(f"{nombre:<55} {s_ref * 1e6:>12.2f} µs {'—':>15} {'':>8}  FALTA")
+            continue
+        marca = "REGRESIÓN" if regresion else ""
+        print(f"{nombre:<55} {s_ref * 1e6:>12.2f} µs {s_nuevo * 1e6:>12.2f} µs {ratio:>7.2f}x  {marca}")
+    n_faltan = sum(1 for fila in filas if fila[2] is None)
+    n_regresiones = sum(1 for fila in filas if fila[4]) - n_faltan
+    print(f"{len(filas) - n_faltan} casos comparados, {n_regresiones} regresiones (umbral {args.umbral:.0%}), "
+          f"{n_faltan} ausentes en {args.nuevo}")
+    return 1 if n_regresiones or n_faltan else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+# benchmarks/carga_servicio.py
+"""Generador de carga para el servicio HTTP del balance (``python -m balance_biogas servir``).
+
+Uso:
+    python benchmarks/carga_servicio.py --arrancar --conexiones 64 --peticiones 20000
+    python benchmarks/carga_servicio.py --url http://127.0.0.1:8765/balance --duracion 10
+    python benchmarks/carga_servicio.py --arrancar --lote 100 -o carga.json
+
+Abre ``--conexiones`` conexiones persistentes que envían peticiones sin pausa
+(cada una espera su respuesta antes de la siguiente) con plantas de caudal y
+temperatura aleatorios. Mide la latencia de cada petición en el cliente y
+muestra peticiones/s y percentiles (p50, p90, p99, p99.9), más las métricas del
+propio servidor (p99 por histograma y filas por micro-lote). Con ``--arrancar``
+lanza el servicio en un subproceso con un puerto libre y lo detiene al
+terminar.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _cuerpos(n_variantes, lote, semilla=0):
+    rng = random.Random(semilla)
+
+    def _planta():
+        return {"caudal_sustrato_kg_dia": round(rng.uniform(1_000, 50_000), 1), "temp_ambiente_promedio_c": round(rng.uniform(-5, 25), 1)}
+
+    return [json.dumps(_planta() if lote <= 1 else [_planta() for _ in range(lote)]).encode() for _ in range(n_variantes)]
+
+
+async def _peticion(lector, escritor, peticion):
+    escritor.write(peticion)
+    cabecera = await lector.readuntil(b"\r\n\r\n")
+    estado = int(cabecera[9:12])
+    longitud = 0
+    for linea in cabecera.split(b"\r\n"):
+        if linea[:15].lower() == b"content-length:":
+            longitud = int(linea[15:])
+    cuerpo = await lector.readexactly(longitud)
+    return estado, cuerpo
+
+
+async def _conexion(host, puerto, ruta, cuerpos, fin, restantes, latencias, errores):
+    lector, escritor = await asyncio.open_connection(host, puerto)
+    peticiones = [
+        f"POST {ruta} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\nContent-Length: {len(cuerpo)}\r\n\r\n".encode() + cuerpo
+        for cuerpo in cuerpos
+    ]
+    i = 0
+    try:
+        while time.perf_counter() < fin and (restantes is None or restantes[0] > 0):
+            if restantes is not None:
+                restantes[0] -= 1
+            inicio = time.perf_counter()
+            estado, _ = await _peticion(lector, escritor, peticiones[i % len(peticiones)])
+            latencias.append(time.perf_counter() - inicio)
+            if estado != 200:
+                errores[0] += 1
+            i += 1
+    finally:
+        escritor.close()
+
+
+async def _obtener_metricas(host, puerto):
+    lector, escritor = await asyncio.open_connection(host, puerto)
+    try:
+        _, cuerpo = await _peticion(lector, escritor, f"GET /metricas HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+        return json.loads(cuerpo)
+    finally:
+        escritor.close()
+
+
+def _percentil(ordenadas, p):
+    return ordenadas[min(len(ordenadas) - 1, int(p / 100 * len(ordenadas)))]
+
+
+async def medir(url, conexiones=64, peticiones=None, duracion=10.0, lote=1, calentamiento=200):
+    partes = urlsplit(url)
+    host, puerto, ruta = partes.hostname, partes.port or 80, partes.path or "/balance"
+    cuerpos = _cuerpos(100, lote)
+
+    # Calentamiento (imports perezosos, cachés del servidor) fuera de la medida
+    restantes_calentamiento = [calentamiento]
+    await asyncio.gather(*(
+        _conexion(host, puerto, ruta, cuerpos, float("inf"), restantes_calentamiento, [], [0]) for _ in range(min(conexiones, 8))
+    ))
+
+    latencias, errores = [], [0]
+    restantes = None if peticiones is None else [int(peticiones)]
+    fin = time.perf_counter() + (duracion if peticiones is None else float("inf"))
+    inicio = time.perf_counter()
+    await asyncio.gather(*(_conexion(host, puerto, ruta, cuerpos, fin, restantes, latencias, errores) for _ in range(conexiones)))
+    segundos = time.perf_counter() - inicio
+
+    ordenadas = sorted(latencias)
+    return {
+        "url": url,
+        "conexiones": conexiones,
+        "plantas_por_peticion": lote,
+        "peticiones": len(latencias),
+        "errores": errores[0],
+        "segundos": segundos,
+        "peticiones_por_segundo": len(latencias) / segundos,
+        "plantas_por_segundo": len(latencias) * lote / segundos,
+        "latencia_ms": {
+            "media": statistics.fmean(ordenadas) * 1000,
+            "p50": _percentil(ordenadas, 50) * 1000,
+            "p90": _percentil(ordenadas, 90) * 1000,
+            "p99": _percentil(ordenadas, 99) * 1000,
+            "p99.9": _percentil(ordenadas, 99.9) * 1000,
+            "max": ordenadas[-1] * 1000,
+        },
+        "servidor": await _obtener_metricas(host, puerto),
+    }
+
+
+def _arrancar_servicio(ventana_ms, max_lote):
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "balance_biogas", "servir", "--puerto", "0", "--ventana-ms", str(ventana_ms), "--max-lote", str(max_lote)],
+        cwd=RAIZ_REPO, stderr=subprocess.PIPE, text=True,
+    )
+    linea = proceso.stderr.readline()
+    if "http://" not in linea:
+        proceso.kill()
+        raise RuntimeError(f"El servicio no arrancó: {linea.strip()}")
+    return proceso, linea.split("http://", 1)[1].split()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera carga sobre el servicio HTTP del balance y mide la latencia.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765/balance", help="Ruta a probar (/balance o /dimensiones).")
+    parser.add_argument("--arrancar", action="store_true", help="Lanza el servicio en un subproceso (ignora el host y el puerto de --url).")
+    parser.add_argument("--ventana-ms", type=float, default=2.0, help="Ventana de agrupación del servicio lanzado con --arrancar.")
+    parser.add_argument("--max-lote", type=int, default=1024, help="Tamaño máximo de micro-lote del servicio lanzado con --arrancar.")
+    parser.add_argument("--conexiones", type=int, default=64, help="Conexiones concurrentes.")
+    parser.add_argument("--peticiones", type=int, default=None, help="Número total de peticiones (por defecto se usa --duracion).")
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos de carga si no se indica --peticiones.")
+    parser.add_argument("--lote", type=int, default=1, help="Plantas por petición (1 = peticiones individuales).")
+    parser.add_argument("-o", "--salida", help="Guarda el resultado completo en JSON.")
+    args = parser.parse_args(argv)
+
+    proceso = None
+    url = args.url
+    if args.arrancar:
+        proceso, direccion = _arrancar_servicio(args.ventana_ms, args.max_lote)
+        url = f"http://{direccion}{urlsplit(args.url).path or '/balance'}"
+    try:
+        resultado = asyncio.run(medir(url, args.conexiones, args.peticiones, args.duracion, max(1, args.lote)))
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+
+    latencia = resultado["latencia_ms"]
+    print(f"{resultado['peticiones']} peticiones en {resultado['segundos']:.2f} s con {args.conexiones} conexiones: "
+          f"{resultado['peticiones_por_segundo']:.0f} peticiones/s ({resultado['plantas_por_segundo']:.0f} plantas/s), {resultado['errores']} errores")
+    print(f"Latencia cliente (ms): p50 {latencia['p50']:.2f} | p90 {latencia['p90']:.2f} | p99 {latencia['p99']:.2f} | "
+          f"p99.9 {latencia['p99.9']:.2f} | máx {latencia['max']:.2f}")
+    ruta = urlsplit(url).path or "/balance"
+    servidor = resultado["servidor"]
+    if ruta in servidor["latencia"]:
+        print(f"Servidor: p99 <= {servidor['latencia'][ruta]['p99_s'] * 1000:.2f} ms (histograma)", end="")
+        lotes = servidor["lotes"].get(ruta)
+        if lotes and lotes["filas_por_lote"]:
+            print(f", {lotes['filas_por_lote']:.1f} peticiones por micro-lote", end="")
+        print()
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as fichero:
+            json.dump(resultado, fichero, indent=2, ensure_ascii=False)
+    return 1 if resultado["errores"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
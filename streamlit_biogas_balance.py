@@ -1,92 +1,34 @@
 # streamlit_biogas_balance.py
 import streamlit as st
-import math
+import altair as alt
 import datetime
-from io import BytesIO
-
-# --- LIBRERÍAS DE EXPORTACIÓN ---
-OPENPYXL_AVAILABLE = False
-FPDF_AVAILABLE = False
-try:
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment
-    OPENPYXL_AVAILABLE = True
-except ImportError:
-    pass
-
-try:
-    from fpdf import FPDF
-    FPDF_AVAILABLE = True
-except ImportError:
-    pass
-
-# --- FUNCIONES DE CÁLCULO (sin cambios) ---
-def calcular_dimensiones_digestor(caudal_sustrato_kg_dia, trh_dias, densidad_sustrato_kg_m3=1000):
-    volumen_sustrato_diario_m3 = caudal_sustrato_kg_dia / densidad_sustrato_kg_m3
-    volumen_digestor_m3 = volumen_sustrato_diario_m3 * trh_dias
-    diametro_digestor_m = altura_digestor_m = area_superficial_digestor_m2 = 0.0
-    if volumen_digestor_m3 > 0:
-        diametro_digestor_m = (4 * volumen_digestor_m3 / math.pi)**(1/3)
-        altura_digestor_m = diametro_digestor_m
-        area_superficial_digestor_m2 = 1.5 * math.pi * (diametro_digestor_m**2)
-    return {
-        "volumen_digestor_m3": volumen_digestor_m3,
-        "diametro_digestor_m": diametro_digestor_m,
-        "altura_digestor_m": altura_digestor_m,
-        "area_superficial_digestor_m2": area_superficial_digestor_m2
-    }
-
-def realizar_calculos_balance(inputs_calc):
-    results = {}
-    caudal_sustrato_kg_dia = inputs_calc['caudal_sustrato_kg_dia']
-    st_porcentaje = inputs_calc['st_porcentaje']
-    sv_de_st_porcentaje = inputs_calc['sv_de_st_porcentaje']
-    bmp_nm3_ch4_kg_sv = inputs_calc['bmp_nm3_ch4_kg_sv']
-    eficiencia_digestion_porcentaje = inputs_calc['eficiencia_digestion_porcentaje']
-    ch4_en_biogas_porcentaje = inputs_calc['ch4_en_biogas_porcentaje']
-    cp_sustrato_kj_kg_c = inputs_calc['cp_sustrato_kj_kg_c']
-    temp_op_digestor_c = inputs_calc['temp_op_digestor_c']
-    temp_sustrato_entrada_c = inputs_calc['temp_sustrato_entrada_c']
-    u_digestor_w_m2_k = inputs_calc['u_digestor_w_m2_k']
-    area_superficial_digestor_m2 = inputs_calc['area_superficial_digestor_m2']
-    temp_ambiente_promedio_c = inputs_calc['temp_ambiente_promedio_c']
-    uso_biogas_opcion_idx = inputs_calc['uso_biogas_opcion_idx']
-    chp_eficiencia_electrica_porcentaje = inputs_calc.get('chp_eficiencia_electrica_porcentaje', 0)
-    chp_eficiencia_termica_porcentaje = inputs_calc.get('chp_eficiencia_termica_porcentaje', 0)
-    caldera_eficiencia_porcentaje = inputs_calc.get('caldera_eficiencia_porcentaje', 0)
-    consumo_electrico_aux_kwh_ton_sustrato = inputs_calc['consumo_electrico_aux_kwh_ton_sustrato']
-
-    results['sv_alimentado_kg_dia'] = caudal_sustrato_kg_dia * (st_porcentaje / 100) * (sv_de_st_porcentaje / 100)
-    results['ch4_producido_nm3_dia'] = results['sv_alimentado_kg_dia'] * bmp_nm3_ch4_kg_sv * (eficiencia_digestion_porcentaje / 100)
-    results['biogas_producido_nm3_dia'] = 0
-    if ch4_en_biogas_porcentaje > 0:
-        results['biogas_producido_nm3_dia'] = results['ch4_producido_nm3_dia'] / (ch4_en_biogas_porcentaje / 100)
-    pci_ch4_mj_nm3 = 35.8
-    results['pci_biogas_mj_nm3'] = pci_ch4_mj_nm3 * (ch4_en_biogas_porcentaje / 100)
-    results['energia_bruta_biogas_mj_dia'] = results['biogas_producido_nm3_dia'] * results['pci_biogas_mj_nm3']
-    results['energia_bruta_biogas_kwh_dia'] = results['energia_bruta_biogas_mj_dia'] / 3.6
-    results['calor_calentar_sustrato_mj_dia'] = (caudal_sustrato_kg_dia * cp_sustrato_kj_kg_c * (temp_op_digestor_c - temp_sustrato_entrada_c)) / 1000
-    delta_t_digestor_ambiente = temp_op_digestor_c - temp_ambiente_promedio_c
-    results['perdidas_calor_digestor_mj_dia'] = 0.0
-    if delta_t_digestor_ambiente > 0 and area_superficial_digestor_m2 > 0:
-        results['perdidas_calor_digestor_mj_dia'] = (u_digestor_w_m2_k * area_superficial_digestor_m2 * delta_t_digestor_ambiente * 3600 * 24) / 1000000
-    results['demanda_termica_total_digestor_mj_dia'] = results['calor_calentar_sustrato_mj_dia'] + results['perdidas_calor_digestor_mj_dia']
-    results['demanda_termica_total_digestor_kwh_dia'] = results['demanda_termica_total_digestor_mj_dia'] / 3.6
-    results['electricidad_generada_bruta_kwh_dia'] = 0.0
-    results['calor_util_generado_mj_dia'] = 0.0
-    if uso_biogas_opcion_idx == 0: # CHP
-        results['electricidad_generada_bruta_kwh_dia'] = results['energia_bruta_biogas_kwh_dia'] * (chp_eficiencia_electrica_porcentaje / 100)
-        results['calor_util_generado_mj_dia'] = results['energia_bruta_biogas_mj_dia'] * (chp_eficiencia_termica_porcentaje / 100)
-    elif uso_biogas_opcion_idx == 1: # Caldera
-        results['calor_util_generado_mj_dia'] = results['energia_bruta_biogas_mj_dia'] * (caldera_eficiencia_porcentaje / 100)
-    results['consumo_electrico_aux_total_kwh_dia'] = (caudal_sustrato_kg_dia / 1000) * consumo_electrico_aux_kwh_ton_sustrato
-    results['electricidad_neta_exportable_kwh_dia'] = results['electricidad_generada_bruta_kwh_dia'] - results['consumo_electrico_aux_total_kwh_dia']
-    results['calor_neto_disponible_mj_dia'] = results['calor_util_generado_mj_dia'] - results['demanda_termica_total_digestor_mj_dia']
-    results['calor_neto_disponible_kwh_dia'] = results['calor_neto_disponible_mj_dia'] / 3.6
-    return results
+import tempfile
+import uuid
+from io import BytesIO, TextIOWrapper
+
+import numpy as np
+import pandas as pd
+
+from balance_biogas.almacen import CAMPOS_ENTRADA, CAMPOS_SALIDA, RUTA_ALMACEN_POR_DEFECTO, AlmacenEscenarios
+from balance_biogas.cache import CacheLRU, hash_contenido
+from balance_biogas.calculos import OPCIONES_USO_BIOGAS
+from balance_biogas.exportar import (
+    FPDF_AVAILABLE, OPENPYXL_AVAILABLE, generar_excel_bytes_cacheado, generar_excel_escenarios, generar_pdf_bytes_cacheado,
+)
+from balance_biogas.grafo import GrafoBalance
+from balance_biogas.horario import leer_serie_csv, simular_balance_horario
+from balance_biogas.montecarlo import iterar_escenarios_montecarlo, simular_montecarlo
+from balance_biogas.sensibilidad import MAX_BARRIDOS_MEMORIA, PARAMETROS_TORNADO, analisis_tornado, rejilla_sensibilidad, valores_alrededor
+from balance_biogas.perfilado import PERFILADO_POR_DEFECTO, PERFILADOR_GLOBAL, Perfilador, volcar_desde_entorno
+from balance_biogas.solver import LIMITES_VARIABLES, resolver_equilibrio
+from balance_biogas.transitorio import simular_transitorio
+from balance_biogas.upgrading import OPCIONES_UPGRADING, TECNOLOGIAS_UPGRADING
+from balance_biogas.sustratos import CatalogoSustratos, buscar_mezcla_optima, evaluar_mezclas
 
 # --- INTERFAZ DE STREAMLIT ---
 st.set_page_config(page_title="Balance Energético Biogás", layout="wide", page_icon="🔥") # Icono de fuego
+# Perfilado por etapas (desactivado: contexto nulo sin coste apreciable); se activa con la casilla del final de la barra lateral
+perfilador = Perfilador(activo=st.session_state.get("perfilado_activo", PERFILADO_POR_DEFECTO), acumulado=PERFILADOR_GLOBAL)
 
 st.title("🔥 Balance Energético Planta de Biogás") # Título y emoji actualizados
 st.markdown("Esta aplicación realiza un balance de energía preliminar para una planta de biogás en fase de diseño.")
@@ -103,23 +45,94 @@ current_date = datetime.date.today().strftime("%Y-%m-%d")
 st.caption(f"Fecha del análisis: {current_date}")
 st.markdown("---")
 
+perfilador.vuelta("cabecera")
+
 # --- ENTRADAS DEL USUARIO EN LA BARRA LATERAL (EL RESTO DE PARÁMETROS) ---
 st.sidebar.header("Parámetros de Entrada Detallados")
 
+# Parámetros de ajuste fino: campos de la barra lateral o, en modo en vivo, deslizadores junto a los resultados.
+# clave -> (etiqueta, valor inicial, mínimo, máximo, paso, formato, ayuda, rango del deslizador)
+PARAMETROS_AJUSTABLES = {
+    'eficiencia_digestion_porcentaje': ("Eficiencia de digestión estimada (%)", 75.0, 0.0, 100.0, 0.5, "%.1f", None, (0.0, 100.0)),
+    'trh_dias': ("Tiempo de Retención Hidráulica (TRH) (días)", 30.0, 1.0, None, 1.0, "%.1f", None, (1.0, 200.0)),
+    'temp_ambiente_promedio_c': ("Temperatura ambiente promedio anual (°C)", 10.0, None, None, 0.5, "%.1f", None, (-30.0, 45.0)),
+    'u_digestor_w_m2_k': ("Coef. global transf. calor (U) digestor (W/m²K)", 0.5, 0.0, None, 0.01, "%.2f", "Ej: Aislado: 0.3-0.8; No aislado: 1.5-3.0", (0.0, 5.0)),
+    'chp_eficiencia_electrica_porcentaje': ("Eficiencia eléctrica del CHP (%)", 35.0, 0.0, 100.0, 0.1, "%.1f", None, (0.0, 100.0)),
+    'chp_eficiencia_termica_porcentaje': ("Eficiencia térmica recuperable del CHP (%)", 45.0, 0.0, 100.0, 0.1, "%.1f", None, (0.0, 100.0)),
+    'caldera_eficiencia_porcentaje': ("Eficiencia de la caldera de biogás (%)", 85.0, 0.0, 100.0, 0.1, "%.1f", None, (0.0, 100.0)),
+    'consumo_electrico_aux_kwh_ton_sustrato': ("Consumo eléctrico aux. (kWh / ton sustrato)", 30.0, 0.0, None, 1.0, "%.1f", None, (0.0, 200.0)),
+}
+
+
+def sincronizar_modo_en_vivo():
+    """Traslada los valores ajustables entre los campos de la barra lateral y los deslizadores al cambiar de modo."""
+    en_vivo = st.session_state.modo_en_vivo
+    for clave, (_, valor, _, _, _, _, _, (minimo, maximo)) in PARAMETROS_AJUSTABLES.items():
+        origen, destino = (f"barra_{clave}", f"vivo_{clave}") if en_vivo else (f"vivo_{clave}", f"barra_{clave}")
+        valor = st.session_state.get(origen, valor)
+        st.session_state[destino] = min(max(valor, minimo), maximo) if en_vivo else valor
+
+
+def entrada_ajustable(clave):
+    """Valor actual de un parámetro ajustable; fuera del modo en vivo dibuja su campo en la barra lateral."""
+    etiqueta, valor, minimo, maximo, paso, formato, ayuda, _ = PARAMETROS_AJUSTABLES[clave]
+    if modo_en_vivo:
+        valor = st.session_state.get(f"vivo_{clave}", valor)
+    else:
+        # Valor inicial vía session_state (sin ``value=``) para que sincronizar_modo_en_vivo pueda restaurarlo
+        st.session_state.setdefault(f"barra_{clave}", valor)
+        valor = st.sidebar.number_input(etiqueta, min_value=minimo, max_value=maximo, step=paso, format=formato, help=ayuda, key=f"barra_{clave}")
+    valores_ajustables[clave] = valor
+    return valor
+
+
+valores_ajustables = {}  # parámetros ajustables en uso en esta ejecución (los de CHP/caldera según el uso del biogás)
+modo_en_vivo = st.sidebar.toggle(
+    "⚡ Modo en vivo", key="modo_en_vivo", on_change=sincronizar_modo_en_vivo,
+    help="Muestra los resultados sin pulsar el botón y pasa los parámetros de ajuste fino a deslizadores: al soltar un deslizador solo se redibujan las métricas del balance.",
+)
+
 st.sidebar.subheader("1. Características del Sustrato")
-sustrato_nombre_input = st.sidebar.text_input("Nombre/Tipo de sustrato", "Residuos Agroindustriales", key="sustrato_nombre_sidebar")
-caudal_sustrato_kg_dia = st.sidebar.number_input("Caudal de sustrato (kg/día)", min_value=0.0, value=10000.0, step=100.0, format="%.2f")
-st_porcentaje = st.sidebar.number_input("Sólidos Totales (ST) en sustrato (%)", min_value=0.0, max_value=100.0, value=20.0, step=0.1, format="%.1f")
-sv_de_st_porcentaje = st.sidebar.number_input("Sólidos Volátiles (SV) como % de ST (%)", min_value=0.0, max_value=100.0, value=80.0, step=0.1, format="%.1f")
-temp_sustrato_entrada_c = st.sidebar.number_input("Temperatura de entrada del sustrato (°C)", value=15.0, step=0.5, format="%.1f")
-cp_sustrato_kj_kg_c = 4.186
-
-bmp_fuente_opciones = ["Valor de laboratorio", "Estimación de literatura"]
-bmp_fuente_seleccionada_texto = st.sidebar.selectbox("Fuente del BMP", bmp_fuente_opciones, help="Seleccione cómo se obtiene el Potencial Bioquímico de Metano.")
-if "Valor de laboratorio" in bmp_fuente_seleccionada_texto:
-    bmp_nm3_ch4_kg_sv = st.sidebar.number_input("BMP (Nm³ CH₄ / kg SV añadido)", min_value=0.0, value=0.35, step=0.01, format="%.2f")
+catalogo_sustratos = CatalogoSustratos.referencia()
+usar_mezcla_sustratos = st.sidebar.checkbox("Co-digestión (mezcla de sustratos del catálogo)", key="usar_mezcla_sustratos")
+if usar_mezcla_sustratos:
+    sustratos_mezcla = st.sidebar.multiselect("Sustratos de la mezcla", catalogo_sustratos.nombres, default=["Purín de cerdo", "Ensilado de maíz"], key="sustratos_mezcla")
+    masas_mezcla = [
+        st.sidebar.number_input(f"{nombre_mezcla} (kg/día)", min_value=0.0, value=5000.0, step=100.0, format="%.2f", key=f"masa_mezcla_{nombre_mezcla}")
+        for nombre_mezcla in sustratos_mezcla
+    ]
+    caudal_sustrato_kg_dia = float(sum(masas_mezcla))
+    sustrato_nombre_input = "Mezcla: " + ", ".join(sustratos_mezcla) if sustratos_mezcla else "Mezcla vacía"
+    bmp_fuente_seleccionada_texto = "Catálogo de sustratos (mezcla)"
+    cp_sustrato_kj_kg_c = 4.186
+    st_porcentaje = sv_de_st_porcentaje = bmp_nm3_ch4_kg_sv = 0.0
+    if caudal_sustrato_kg_dia > 0:
+        propiedades_mezcla = evaluar_mezclas(catalogo_sustratos, masas_mezcla, catalogo_sustratos.indices(sustratos_mezcla))
+        st_porcentaje = float(propiedades_mezcla['st_porcentaje'][0])
+        sv_de_st_porcentaje = float(propiedades_mezcla['sv_de_st_porcentaje'][0])
+        bmp_nm3_ch4_kg_sv = float(propiedades_mezcla['bmp_nm3_ch4_kg_sv'][0])
+        cp_sustrato_kj_kg_c = float(propiedades_mezcla['cp_sustrato_kj_kg_c'][0])
+        st.sidebar.caption(
+            f"Mezcla equivalente: {caudal_sustrato_kg_dia:.0f} kg/día | ST {st_porcentaje:.1f} % | SV/ST {sv_de_st_porcentaje:.1f} % | "
+            f"BMP {bmp_nm3_ch4_kg_sv:.3f} Nm³ CH₄/kg SV | Cp {cp_sustrato_kj_kg_c:.2f} kJ/kg°C"
+        )
+    else:
+        st.sidebar.warning("Indique al menos un sustrato con caudal mayor que 0.")
+    temp_sustrato_entrada_c = st.sidebar.number_input("Temperatura de entrada del sustrato (°C)", value=15.0, step=0.5, format="%.1f")
 else:
-    bmp_nm3_ch4_kg_sv = st.sidebar.number_input("BMP estimado de literatura (Nm³ CH₄ / kg SV añadido)", min_value=0.0, value=0.30, step=0.01, format="%.2f")
+    sustrato_nombre_input = st.sidebar.text_input("Nombre/Tipo de sustrato", "Residuos Agroindustriales", key="sustrato_nombre_sidebar")
+    caudal_sustrato_kg_dia = st.sidebar.number_input("Caudal de sustrato (kg/día)", min_value=0.0, value=10000.0, step=100.0, format="%.2f")
+    st_porcentaje = st.sidebar.number_input("Sólidos Totales (ST) en sustrato (%)", min_value=0.0, max_value=100.0, value=20.0, step=0.1, format="%.1f")
+    sv_de_st_porcentaje = st.sidebar.number_input("Sólidos Volátiles (SV) como % de ST (%)", min_value=0.0, max_value=100.0, value=80.0, step=0.1, format="%.1f")
+    temp_sustrato_entrada_c = st.sidebar.number_input("Temperatura de entrada del sustrato (°C)", value=15.0, step=0.5, format="%.1f")
+    cp_sustrato_kj_kg_c = 4.186
+
+    bmp_fuente_opciones = ["Valor de laboratorio", "Estimación de literatura"]
+    bmp_fuente_seleccionada_texto = st.sidebar.selectbox("Fuente del BMP", bmp_fuente_opciones, help="Seleccione cómo se obtiene el Potencial Bioquímico de Metano.")
+    if "Valor de laboratorio" in bmp_fuente_seleccionada_texto:
+        bmp_nm3_ch4_kg_sv = st.sidebar.number_input("BMP (Nm³ CH₄ / kg SV añadido)", min_value=0.0, value=0.35, step=0.01, format="%.2f")
+    else:
+        bmp_nm3_ch4_kg_sv = st.sidebar.number_input("BMP estimado de literatura (Nm³ CH₄ / kg SV añadido)", min_value=0.0, value=0.30, step=0.01, format="%.2f")
 
 st.sidebar.subheader("2. Diseño del Proceso de Digestión")
 temp_op_digestor_opciones_dict = {"Mesofílico (~37-42 °C)": 38.0, "Termofílico (~50-55 °C)": 52.0}
@@ -127,44 +140,61 @@ temp_op_digestor_texto_sel = st.sidebar.selectbox("Rango de temperatura del dige
 temp_op_digestor_c = temp_op_digestor_opciones_dict[temp_op_digestor_texto_sel]
 st.sidebar.caption(f"Temperatura de operación seleccionada: {temp_op_digestor_c}°C")
 
-eficiencia_digestion_porcentaje = st.sidebar.number_input("Eficiencia de digestión estimada (%)", min_value=0.0, max_value=100.0, value=75.0, step=0.5, format="%.1f")
-trh_dias = st.sidebar.number_input("Tiempo de Retención Hidráulica (TRH) (días)", min_value=1.0, value=30.0, step=1.0, format="%.1f")
+eficiencia_digestion_porcentaje = entrada_ajustable('eficiencia_digestion_porcentaje')
+trh_dias = entrada_ajustable('trh_dias')
 ch4_en_biogas_porcentaje = st.sidebar.number_input("Contenido de Metano (CH₄) estimado en biogás (%)", min_value=0.0, max_value=100.0, value=60.0, step=0.1, format="%.1f")
 
 st.sidebar.markdown("###### Pérdidas Térmicas del Digestor")
-temp_ambiente_promedio_c = st.sidebar.number_input("Temperatura ambiente promedio anual (°C)", value=10.0, step=0.5, format="%.1f")
-u_digestor_w_m2_k = st.sidebar.number_input("Coef. global transf. calor (U) digestor (W/m²K)", min_value=0.0, value=0.5, step=0.01, format="%.2f", help="Ej: Aislado: 0.3-0.8; No aislado: 1.5-3.0")
+temp_ambiente_promedio_c = entrada_ajustable('temp_ambiente_promedio_c')
+u_digestor_w_m2_k = entrada_ajustable('u_digestor_w_m2_k')
 
 st.sidebar.subheader("3. Utilización del Biogás")
-uso_biogas_opciones_lista = ["Cogeneración (CHP)", "Caldera", "Upgrading a Biometano"]
+uso_biogas_opciones_lista = list(OPCIONES_USO_BIOGAS)
 uso_biogas_seleccionado_texto = st.sidebar.selectbox("Principal uso del biogás", uso_biogas_opciones_lista)
 uso_biogas_opcion_idx = uso_biogas_opciones_lista.index(uso_biogas_seleccionado_texto)
 
 chp_eficiencia_electrica_porcentaje = 0.0
 chp_eficiencia_termica_porcentaje = 0.0
 caldera_eficiencia_porcentaje = 0.0
+upgrading_tecnologia_idx = 0
+presion_inyeccion_bar = 16.0
 
 if uso_biogas_opcion_idx == 0:
-    chp_eficiencia_electrica_porcentaje = st.sidebar.number_input("Eficiencia eléctrica del CHP (%)", min_value=0.0, max_value=100.0, value=35.0, step=0.1, format="%.1f", key="chp_elec_eff")
-    chp_eficiencia_termica_porcentaje = st.sidebar.number_input("Eficiencia térmica recuperable del CHP (%)", min_value=0.0, max_value=100.0, value=45.0, step=0.1, format="%.1f", key="chp_therm_eff")
+    chp_eficiencia_electrica_porcentaje = entrada_ajustable('chp_eficiencia_electrica_porcentaje')
+    chp_eficiencia_termica_porcentaje = entrada_ajustable('chp_eficiencia_termica_porcentaje')
 elif uso_biogas_opcion_idx == 1:
-    caldera_eficiencia_porcentaje = st.sidebar.number_input("Eficiencia de la caldera de biogás (%)", min_value=0.0, max_value=100.0, value=85.0, step=0.1, format="%.1f", key="boiler_eff")
+    caldera_eficiencia_porcentaje = entrada_ajustable('caldera_eficiencia_porcentaje')
+elif uso_biogas_opcion_idx == 2:
+    upgrading_tecnologia_idx = st.sidebar.selectbox(
+        "Tecnología de upgrading", range(len(OPCIONES_UPGRADING)), format_func=OPCIONES_UPGRADING.__getitem__, key="upgrading_tecnologia_idx",
+        help="Consumo eléctrico, calor de regeneración, pérdida de metano, pureza y presión de salida típicos de cada tecnología.",
+    )
+    presion_inyeccion_bar = st.sidebar.number_input("Presión de inyección en red (bar)", min_value=1.0, value=16.0, step=0.5, format="%.1f", key="presion_inyeccion_bar")
+    tecnologia_upgrading = TECNOLOGIAS_UPGRADING[upgrading_tecnologia_idx]
+    st.sidebar.caption(
+        f"{tecnologia_upgrading['consumo_electrico_kwh_nm3']:.2f} kWh/Nm³ biogás | calor {tecnologia_upgrading['calor_mj_nm3']:.2f} MJ/Nm³ | "
+        f"pérdida CH₄ {tecnologia_upgrading['perdida_ch4_porcentaje']:.1f} % | pureza {tecnologia_upgrading['pureza_ch4_porcentaje']:.0f} % | "
+        f"salida {tecnologia_upgrading['presion_salida_bar']:.1f} bar"
+    )
 
 st.sidebar.subheader("4. Consumos Energéticos Auxiliares")
-consumo_electrico_aux_kwh_ton_sustrato = st.sidebar.number_input("Consumo eléctrico aux. (kWh / ton sustrato)", min_value=0.0, value=30.0, step=1.0, format="%.1f")
-
-# --- Botón para ejecutar cálculos ---
-st.markdown("---")
-calcular_button = st.button("📊 RESULTADOS BALANCE ENERGÍA", type="primary", use_container_width=True)
-
-if 'show_results' not in st.session_state:
-    st.session_state.show_results = False
-
-if calcular_button:
-    st.session_state.show_results = True # Mostrar resultados cuando se presiona
-
-if st.session_state.show_results:
-    dim_digestor = calcular_dimensiones_digestor(caudal_sustrato_kg_dia, trh_dias)
+consumo_electrico_aux_kwh_ton_sustrato = entrada_ajustable('consumo_electrico_aux_kwh_ton_sustrato')
+if modo_en_vivo:
+    st.sidebar.caption("Modo en vivo: los parámetros de ajuste fino se modifican con los deslizadores junto a los resultados.")
+
+perfilador.vuelta("barra_lateral")
+
+
+def calcular_balance(ajustables):
+    """Actualiza el grafo de la sesión con las entradas actuales y guarda el balance en ``st.session_state.estado_balance``."""
+    # Grafo de dependencias por sesión: solo se recalculan los nodos afectados por las entradas que cambian
+    if 'grafo_balance' not in st.session_state:
+        st.session_state.grafo_balance = GrafoBalance()
+    grafo_balance = st.session_state.grafo_balance
+    recalculos_previos = dict(grafo_balance.recalculos)
+    with perfilador.etapa("calcular_dimensiones_digestor"):
+        grafo_balance.actualizar({'caudal_sustrato_kg_dia': caudal_sustrato_kg_dia, 'trh_dias': ajustables['trh_dias']})
+        dim_digestor = grafo_balance.dimensiones()
     inputs_balance = {
         'sustrato_nombre': sustrato_nombre_input,
         'caudal_sustrato_kg_dia': caudal_sustrato_kg_dia,
@@ -172,29 +202,37 @@ if st.session_state.show_results:
         'sv_de_st_porcentaje': sv_de_st_porcentaje,
         'bmp_nm3_ch4_kg_sv': bmp_nm3_ch4_kg_sv,
         'bmp_fuente_texto': bmp_fuente_seleccionada_texto,
-        'eficiencia_digestion_porcentaje': eficiencia_digestion_porcentaje,
+        'eficiencia_digestion_porcentaje': ajustables['eficiencia_digestion_porcentaje'],
         'ch4_en_biogas_porcentaje': ch4_en_biogas_porcentaje,
         'cp_sustrato_kj_kg_c': cp_sustrato_kj_kg_c,
         'temp_op_digestor_c': temp_op_digestor_c,
         'temp_op_digestor_texto': temp_op_digestor_texto_sel,
         'temp_sustrato_entrada_c': temp_sustrato_entrada_c,
-        'u_digestor_w_m2_k': u_digestor_w_m2_k,
+        'u_digestor_w_m2_k': ajustables['u_digestor_w_m2_k'],
         'area_superficial_digestor_m2': dim_digestor['area_superficial_digestor_m2'],
-        'temp_ambiente_promedio_c': temp_ambiente_promedio_c,
+        'temp_ambiente_promedio_c': ajustables['temp_ambiente_promedio_c'],
         'uso_biogas_opcion_idx': uso_biogas_opcion_idx,
         'uso_biogas_texto': uso_biogas_seleccionado_texto,
-        'chp_eficiencia_electrica_porcentaje': chp_eficiencia_electrica_porcentaje,
-        'chp_eficiencia_termica_porcentaje': chp_eficiencia_termica_porcentaje,
-        'caldera_eficiencia_porcentaje': caldera_eficiencia_porcentaje,
-        'consumo_electrico_aux_kwh_ton_sustrato': consumo_electrico_aux_kwh_ton_sustrato,
-        'trh_dias': trh_dias
+        'chp_eficiencia_electrica_porcentaje': ajustables.get('chp_eficiencia_electrica_porcentaje', 0.0),
+        'chp_eficiencia_termica_porcentaje': ajustables.get('chp_eficiencia_termica_porcentaje', 0.0),
+        'caldera_eficiencia_porcentaje': ajustables.get('caldera_eficiencia_porcentaje', 0.0),
+        'upgrading_tecnologia_idx': upgrading_tecnologia_idx,
+        'presion_inyeccion_bar': presion_inyeccion_bar,
+        'consumo_electrico_aux_kwh_ton_sustrato': ajustables['consumo_electrico_aux_kwh_ton_sustrato'],
+        'trh_dias': ajustables['trh_dias']
     }
-    results = realizar_calculos_balance(inputs_balance)
-
-    st.header("Resultados del Balance") # Título de la sección de resultados
-    st.markdown(f"Resultados para el proyecto: **{project_name}**")
-    st.markdown("---")
-
+    with perfilador.etapa("realizar_calculos_balance"):
+        grafo_balance.actualizar(inputs_balance)
+        results = grafo_balance.resultados()
+    nodos_recalculados = [nodo for nodo in grafo_balance.nodos if grafo_balance.recalculos[nodo] > recalculos_previos[nodo]]
+    # Las descargas leen de aquí al pulsarse, así exportan los últimos valores aunque vengan de un fragmento
+    st.session_state.setdefault('estado_balance', {}).update(
+        inputs_balance=inputs_balance, results=results, dim_digestor=dim_digestor, nodos_recalculados=nodos_recalculados,
+    )
+
+
+def mostrar_resultados(dim_digestor, results):
+    """Métricas de dimensiones, producción, consumos y balance neto."""
     col_res1, col_res2, col_res3 = st.columns(3)
     with col_res1:
         st.subheader("Dimensiones del Digestor")
@@ -223,10 +261,17 @@ if st.session_state.show_results:
             st.metric("Calor Útil Recuperado (CHP)", f"{results.get('calor_util_generado_mj_dia',0.0):.2f} MJ/día")
         elif uso_biogas_opcion_idx == 1:
             st.metric("Calor Útil Generado (Caldera)", f"{results.get('calor_util_generado_mj_dia',0.0):.2f} MJ/día")
-        else:
-            st.info("El biogás se destina a upgrading. Consumos y producción de biometano no detallados aquí.")
+        elif uso_biogas_opcion_idx == 2:
+            st.metric("Biometano Neto Inyectado", f"{results.get('biometano_neto_nm3_dia',0.0):.2f} Nm³/día", f"{results.get('energia_biometano_kwh_dia',0.0):.2f} kWh/día", delta_color="off")
+            st.write(f"Tecnología: {OPCIONES_UPGRADING[upgrading_tecnologia_idx]} (pureza {TECNOLOGIAS_UPGRADING[upgrading_tecnologia_idx]['pureza_ch4_porcentaje']:.0f} % CH₄)")
+            st.write(f"Pérdida de metano (slip): {results.get('ch4_perdido_upgrading_nm3_dia',0.0):.2f} Nm³ CH₄/día")
+            if results.get('calor_upgrading_mj_dia',0.0) > 0:
+                st.write(f"Calor de regeneración de la amina: {results.get('calor_upgrading_mj_dia',0.0):.2f} MJ/día")
     with col_prod_res2:
         st.metric("Consumo Eléctrico Auxiliar Estimado", f"{results.get('consumo_electrico_aux_total_kwh_dia',0.0):.2f} kWh/día")
+        if uso_biogas_opcion_idx == 2:
+            st.metric("Consumo Eléctrico del Upgrading", f"{results.get('consumo_electrico_upgrading_kwh_dia',0.0):.2f} kWh/día")
+            st.metric(f"Compresión a {presion_inyeccion_bar:.1f} bar", f"{results.get('consumo_electrico_compresion_kwh_dia',0.0):.2f} kWh/día")
 
     st.markdown("---")
     st.subheader("BALANCE NETO DE ENERGÍA")
@@ -238,7 +283,7 @@ if st.session_state.show_results:
             if results.get('electricidad_neta_exportable_kwh_dia',0.0) < 0:
                 st.error("¡ATENCIÓN! Déficit eléctrico.")
         else:
-            st.metric("ELECTRICIDAD NETA (Consumo)", f"{-results.get('consumo_electrico_aux_total_kwh_dia',0.0):.2f} kWh/día")
+            st.metric("ELECTRICIDAD NETA (Consumo)", f"{results.get('electricidad_neta_exportable_kwh_dia',0.0):.2f} kWh/día")
     with col_neto_res2:
         st.markdown("#### Balance Térmico")
         st.metric("CALOR NETO DISPONIBLE/DÉFICIT", f"{results.get('calor_neto_disponible_mj_dia',0.0):.2f} MJ/día", f"{results.get('calor_neto_disponible_kwh_dia',0.0):.2f} kWh/día")
@@ -247,217 +292,697 @@ if st.session_state.show_results:
         elif results.get('calor_neto_disponible_mj_dia',0.0) > 0 and (uso_biogas_opcion_idx == 0 or uso_biogas_opcion_idx ==1):
             st.success("Calor excedentario disponible para otros usos.")
 
-    st.sidebar.markdown("---")
-    st.sidebar.header("Exportar Resultados")
-    project_info_dict = {"nombre": project_name, "analista": analyst_name, "fecha": current_date}
-    
-    def sanitize_text_for_fpdf(text):
-        """Reemplaza caracteres problemáticos para FPDF con la fuente Arial por defecto."""
-        if not isinstance(text, str):
-            text = str(text)
-        # FPDF con fuentes estándar (latin-1) no maneja bien todos los caracteres Unicode.
-        # Esta es una forma simple de reemplazar algunos comunes. Para soporte completo,
-        # se necesitaría usar fuentes TrueType (TTF) que soporten Unicode.
-        replacements = {
-            '€': 'EUR', 'ñ': 'n', 'Ñ': 'N', 'á': 'a', 'é': 'e', 'í': 'i', 'ó': 'o', 'ú': 'u',
-            'Á': 'A', 'É': 'E', 'Í': 'I', 'Ó': 'O', 'Ú': 'U', 'ü': 'u', 'Ü': 'U', '¿': '?', '¡': '!'
-            # Añade más reemplazos según sea necesario
+
+@st.fragment
+def panel_en_vivo():
+    """Deslizadores de ajuste fino y métricas del balance.
+
+    Al soltar un deslizador Streamlit vuelve a ejecutar solo este fragmento (el
+    deslizador no envía valores mientras se arrastra), así que los análisis de
+    abajo, los gráficos y las exportaciones no se recalculan en cada cambio.
+    """
+    ajustables = dict(valores_ajustables)
+    columnas_vivo = st.columns(4)
+    for i, clave in enumerate(valores_ajustables):
+        etiqueta, _, _, _, paso, formato, ayuda, (minimo, maximo) = PARAMETROS_AJUSTABLES[clave]
+        st.session_state.setdefault(f"vivo_{clave}", min(max(valores_ajustables[clave], minimo), maximo))
+        with columnas_vivo[i % 4]:
+            ajustables[clave] = st.slider(etiqueta, min_value=minimo, max_value=maximo, step=paso, format=formato, help=ayuda, key=f"vivo_{clave}")
+    calcular_balance(ajustables)
+    estado = st.session_state.estado_balance
+    with perfilador.etapa("metricas_en_vivo"):
+        mostrar_resultados(estado['dim_digestor'], estado['results'])
+    st.caption("Los análisis de más abajo (Monte Carlo, diseño inverso, mezcla y simulación horaria) usan los valores de la última ejecución completa; las descargas, los actuales.")
+    if st.button("🔄 Actualizar análisis completo", key="actualizar_en_vivo"):
+        st.rerun(scope="app")
+
+
+# --- Botón para ejecutar cálculos ---
+st.markdown("---")
+calcular_button = False if modo_en_vivo else st.button("📊 RESULTADOS BALANCE ENERGÍA", type="primary", use_container_width=True)
+
+if 'show_results' not in st.session_state:
+    st.session_state.show_results = False
+
+if calcular_button or modo_en_vivo:
+    st.session_state.show_results = True # Mostrar resultados cuando se presiona (siempre en modo en vivo)
+
+if st.session_state.show_results:
+    st.header("Resultados del Balance") # Título de la sección de resultados
+    st.markdown(f"Resultados para el proyecto: **{project_name}**")
+    st.markdown("---")
+
+    if modo_en_vivo:
+        panel_en_vivo()
+    else:
+        calcular_balance(valores_ajustables)
+    estado_balance = st.session_state.estado_balance
+    inputs_balance, dim_digestor, results = estado_balance['inputs_balance'], estado_balance['dim_digestor'], estado_balance['results']
+    nodos_recalculados = estado_balance['nodos_recalculados']
+    grafo_balance = st.session_state.grafo_balance
+    if not modo_en_vivo:
+        mostrar_resultados(dim_digestor, results)
+
+    with st.expander("🔗 Dependencias del Cálculo"):
+        st.caption(f"En esta ejecución se han recalculado {len(nodos_recalculados)} de {len(grafo_balance.nodos)} magnitudes; el resto se reutiliza de la ejecución anterior.")
+        if nodos_recalculados:
+            st.write("Recalculadas: " + ", ".join(f"`{nodo}`" for nodo in nodos_recalculados))
+        nodo_explicar = st.selectbox("Magnitud", grafo_balance.nodos, index=grafo_balance.nodos.index('calor_neto_disponible_mj_dia'), key="nodo_explicar")
+        st.markdown(f"**{nodo_explicar}** = {grafo_balance.nodo(nodo_explicar).descripcion}")
+        col_dep1, col_dep2, col_dep3 = st.columns(3)
+        with col_dep1:
+            st.markdown("##### Depende directamente de")
+            st.write("\n".join(f"- `{dependencia}`" for dependencia in grafo_balance.dependencias(nodo_explicar)))
+        with col_dep2:
+            st.markdown("##### Entradas que la afectan")
+            st.write("\n".join(f"- `{entrada}`" for entrada in grafo_balance.entradas_de(nodo_explicar)))
+        with col_dep3:
+            st.markdown("##### Magnitudes que dependen de ella")
+            st.write("\n".join(f"- `{afectado}`" for afectado in grafo_balance.afectados_por(nodo_explicar)) or "Ninguna (resultado final).")
+
+    perfilador.vuelta("metricas")
+
+    # --- Análisis de incertidumbre (Monte Carlo) ---
+    st.markdown("---")
+    with st.expander("🎲 Análisis de Incertidumbre (Monte Carlo)"):
+        st.caption("Asigne una distribución a los parámetros inciertos; el resto se mantiene en el valor de la barra lateral.")
+        parametros_inciertos_mc = {
+            'bmp_nm3_ch4_kg_sv': ("BMP (Nm³ CH₄/kg SV)", bmp_nm3_ch4_kg_sv),
+            'eficiencia_digestion_porcentaje': ("Eficiencia de digestión (%)", eficiencia_digestion_porcentaje),
+            'u_digestor_w_m2_k': ("U digestor (W/m²K)", u_digestor_w_m2_k),
+            'temp_ambiente_promedio_c': ("Temperatura ambiente (°C)", temp_ambiente_promedio_c),
+        }
+        opciones_distribucion_mc = ["Fijo", "Triangular", "Normal", "Uniforme"]
+        distribuciones_mc = {}
+        for clave_mc, (etiqueta_mc, valor_mc) in parametros_inciertos_mc.items():
+            col_mc1, col_mc2, col_mc3, col_mc4 = st.columns(4)
+            with col_mc1:
+                tipo_mc = st.selectbox(etiqueta_mc, opciones_distribucion_mc, key=f"mc_tipo_{clave_mc}")
+            margen_mc = abs(valor_mc) * 0.2 if valor_mc else 1.0
+            if tipo_mc == "Triangular":
+                with col_mc2:
+                    minimo_mc = st.number_input("Mínimo", value=float(valor_mc - margen_mc), key=f"mc_min_{clave_mc}")
+                with col_mc3:
+                    moda_mc = st.number_input("Moda", value=float(valor_mc), key=f"mc_moda_{clave_mc}")
+                with col_mc4:
+                    maximo_mc = st.number_input("Máximo", value=float(valor_mc + margen_mc), key=f"mc_max_{clave_mc}")
+                distribuciones_mc[clave_mc] = {"tipo": "triangular", "min": minimo_mc, "moda": moda_mc, "max": maximo_mc}
+            elif tipo_mc == "Normal":
+                with col_mc2:
+                    media_mc = st.number_input("Media", value=float(valor_mc), key=f"mc_media_{clave_mc}")
+                with col_mc3:
+                    desviacion_mc = st.number_input("Desviación típica", min_value=0.0, value=float(margen_mc / 2), key=f"mc_desv_{clave_mc}")
+                distribuciones_mc[clave_mc] = {"tipo": "normal", "media": media_mc, "desviacion": desviacion_mc}
+            elif tipo_mc == "Uniforme":
+                with col_mc2:
+                    minimo_mc = st.number_input("Mínimo", value=float(valor_mc - margen_mc), key=f"mc_min_{clave_mc}")
+                with col_mc3:
+                    maximo_mc = st.number_input("Máximo", value=float(valor_mc + margen_mc), key=f"mc_max_{clave_mc}")
+                distribuciones_mc[clave_mc] = {"tipo": "uniforme", "min": minimo_mc, "max": maximo_mc}
+
+        col_mc_n, col_mc_semilla = st.columns(2)
+        with col_mc_n:
+            n_muestras_mc = st.select_slider("Número de muestras", options=[100_000, 250_000, 500_000, 1_000_000], value=100_000)
+        with col_mc_semilla:
+            semilla_mc = st.number_input("Semilla", min_value=0, value=42, step=1)
+
+        # El resultado guardado solo se muestra mientras no cambien las entradas ni las distribuciones
+        clave_mc = hash_contenido({clave: valor for clave, valor in inputs_balance.items() if not isinstance(valor, str)},
+                                  distribuciones_mc, n_muestras_mc, int(semilla_mc))
+        if st.button("Ejecutar Monte Carlo", disabled=not distribuciones_mc):
+            st.session_state.pop('resultado_montecarlo', None)
+            try:
+                st.session_state.resultado_montecarlo = simular_montecarlo(inputs_balance, distribuciones_mc, n_muestras=n_muestras_mc, semilla=int(semilla_mc))
+                st.session_state.parametros_montecarlo = (dict(inputs_balance), dict(distribuciones_mc))
+                st.session_state.clave_montecarlo = clave_mc
+            except ValueError as e_mc:
+                st.error(f"Error en el análisis Monte Carlo: {e_mc}")
+
+        resultado_mc = st.session_state.get('resultado_montecarlo') if st.session_state.get('clave_montecarlo') == clave_mc else None
+        if resultado_mc is None and st.session_state.get('resultado_montecarlo'):
+            st.caption("Las entradas han cambiado desde la última simulación: pulse «Ejecutar Monte Carlo» para actualizarla.")
+        if resultado_mc:
+            st.markdown(f"**{resultado_mc['n_muestras']:,} muestras** (semilla {resultado_mc['semilla']})")
+            col_mc_res1, col_mc_res2 = st.columns(2)
+            with col_mc_res1:
+                elec_mc = resultado_mc['electricidad_neta_exportable_kwh_dia']
+                st.markdown("##### Electricidad neta exportable (kWh/día)")
+                st.write(f"P10: {elec_mc['P10']:.2f} | P50: {elec_mc['P50']:.2f} | P90: {elec_mc['P90']:.2f}")
+                st.metric("Probabilidad de déficit eléctrico", f"{resultado_mc['prob_deficit_electrico']:.1%}")
+            with col_mc_res2:
+                calor_mc = resultado_mc['calor_neto_disponible_mj_dia']
+                st.markdown("##### Calor neto disponible (MJ/día)")
+                st.write(f"P10: {calor_mc['P10']:.2f} | P50: {calor_mc['P50']:.2f} | P90: {calor_mc['P90']:.2f}")
+                st.metric("Probabilidad de déficit térmico", f"{resultado_mc['prob_deficit_termico']:.1%}")
+
+            if OPENPYXL_AVAILABLE:
+                def exportar_escenarios_mc():
+                    entradas_mc, distribuciones_exportar_mc = st.session_state.parametros_montecarlo
+                    fichero_mc = tempfile.TemporaryFile()
+                    generar_excel_escenarios(
+                        iterar_escenarios_montecarlo(entradas_mc, distribuciones_exportar_mc, n_muestras=resultado_mc['n_muestras'], semilla=resultado_mc['semilla']),
+                        fichero_mc, project_info={"nombre": project_name, "analista": analyst_name, "fecha": current_date},
+                    )
+                    fichero_mc.seek(0)
+                    return fichero_mc
+
+                st.download_button(
+                    label="📥 Descargar todos los escenarios (Excel)", data=exportar_escenarios_mc,
+                    file_name=f"{project_name.replace(' ', '_')}_Escenarios_MonteCarlo_{current_date}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    on_click="ignore",
+                )
+                st.caption("Una fila por escenario con las entradas muestreadas y todas las salidas, más una hoja de resumen. Con muchos escenarios la generación puede tardar.")
+
+    perfilador.vuelta("montecarlo")
+
+    # --- Diseño inverso (punto de equilibrio) ---
+    with st.expander("🎯 Diseño Inverso (Punto de Equilibrio)"):
+        st.caption("Calcula el valor de una entrada con el que la salida elegida alcanza el objetivo; el resto de entradas se mantiene.")
+        variables_equilibrio = {
+            'trh_dias': ("TRH (días)", trh_dias),
+            'u_digestor_w_m2_k': ("U digestor (W/m²K)", u_digestor_w_m2_k),
+            'chp_eficiencia_electrica_porcentaje': ("Eficiencia eléctrica CHP (%)", chp_eficiencia_electrica_porcentaje),
+            'chp_eficiencia_termica_porcentaje': ("Eficiencia térmica CHP (%)", chp_eficiencia_termica_porcentaje),
+            'caldera_eficiencia_porcentaje': ("Eficiencia caldera (%)", caldera_eficiencia_porcentaje),
+        }
+        salidas_equilibrio = {
+            'calor_neto_disponible_mj_dia': "Calor neto disponible (MJ/día)",
+            'electricidad_neta_exportable_kwh_dia': "Electricidad neta exportable (kWh/día)",
         }
-        for original, replacement in replacements.items():
-            text = text.replace(original, replacement)
-        # Intenta codificar a latin-1, reemplazando caracteres no mapeables
-        return text.encode('latin-1', 'replace').decode('latin-1')
-
-    def generar_excel_bytes(all_inputs, results_dict, dim_digestor_dict, project_info):
-        # ... (código de generar_excel_bytes como antes, usando .get() para seguridad)
-        if not OPENPYXL_AVAILABLE: 
-            st.sidebar.warning("Exportación a Excel no disponible (falta 'openpyxl').")
-            return None
-        wb = Workbook()
-        ws = wb.active
-        # ... (resto de la función como antes, asegurándose de usar all_inputs.get(...) )
-        # EJEMPLO de cómo usar .get():
-        # add_excel_row(ws, ["Sustrato:", all_inputs.get('sustrato_nombre', 'N/A')])
-        # Rellena el resto de la función de Excel como en la versión anterior,
-        # asegurando que todas las claves de 'all_inputs' y 'results_dict' se accedan con .get()
-        ws.title = "Resumen Balance Energético"
-        header_font = Font(bold=True, size=12, color="00FFFFFF")
-        category_font = Font(bold=True)
-        bold_font = Font(bold=True)
-
-        ws['A1'] = f"Balance Energético Preliminar: {project_info['nombre']}"
-        ws.merge_cells('A1:D1'); ws['A1'].font = Font(bold=True, size=14); ws['A1'].alignment = Alignment(horizontal="center")
-        ws['A2'] = f"Fecha: {project_info['fecha']}"; ws['A3'] = f"Analista: {project_info['analista']}"; ws.append([])
-        
-        def add_excel_row(sheet, data, font=None):
-            sheet.append([sanitize_text_for_fpdf(str(d)) for d in data]) # Sanitizar para Excel también puede ser útil
-            if font:
-                for cell in sheet[sheet.max_row]: cell.font = font
-
-        current_row_excel = ws.max_row + 1 
-        add_excel_row(ws, ["PARÁMETROS DE ENTRADA"], font=header_font) 
-        ws.merge_cells(start_row=current_row_excel, start_column=1, end_row=current_row_excel, end_column=3); current_row_excel +=1
-        
-        add_excel_row(ws, ["Sustrato:", all_inputs.get('sustrato_nombre', 'N/A')])
-        add_excel_row(ws, ["Caudal Sustrato (kg/día):", all_inputs.get('caudal_sustrato_kg_dia', 0)])
-        add_excel_row(ws, ["ST (%):", all_inputs.get('st_porcentaje',0)])
-        # ... (muchos más add_excel_row)
-
-        add_excel_row(ws, ["BALANCE NETO:"], font=category_font)
-        add_excel_row(ws, ["  Electricidad Neta Exportable (kWh/día):", results_dict.get('electricidad_neta_exportable_kwh_dia',0)], font=bold_font)
-        add_excel_row(ws, ["  Calor Neto Disponible/Déficit (MJ/día):", results_dict.get('calor_neto_disponible_mj_dia',0)], font=bold_font)
-
-        for col_letter in ['A', 'B', 'C']: ws.column_dimensions[col_letter].width = 35 if col_letter == 'A' else 15
-        
-        excel_stream = BytesIO()
-        wb.save(excel_stream)
-        excel_stream.seek(0)
-        return excel_stream.getvalue()
-
-    def generar_pdf_bytes(all_inputs, results_dict, dim_digestor_dict, project_info):
-        if not FPDF_AVAILABLE:
-            st.sidebar.warning("Exportación a PDF no disponible (falta 'fpdf2').")
-            return None
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_auto_page_break(auto=True, margin=15)
-        
-        # Intentar añadir una fuente Unicode si está disponible (requiere el archivo .ttf)
-        # try:
-        #     pdf.add_font("DejaVu", "", "DejaVuSansCondensed.ttf", uni=True)
-        #     pdf.set_font("DejaVu", "", 10) # Usar la fuente Unicode
-        # except RuntimeError:
-        #     pdf.set_font("Arial", "", 10) # Fallback a Arial
-        #     st.sidebar.caption("Nota PDF: Fuente DejaVu no encontrada, usando Arial (puede limitar caracteres).")
-        
-        pdf.set_font("Arial", "", 10) # Mantener Arial por simplicidad de dependencias
-
-        pdf.set_font("Arial", "B", 16)
-        pdf.cell(0, 10, sanitize_text_for_fpdf(f"Balance Energético Preliminar: {project_info['nombre']}"), 0, 1, "C")
-        pdf.set_font("Arial", "", 10)
-        pdf.cell(0, 6, sanitize_text_for_fpdf(f"Fecha: {project_info['fecha']} | Analista: {project_info['analista']}"), 0, 1, "C")
-        pdf.ln(5)
-        
-        def add_pdf_section(title_pdf, data_dict_pdf):
-            pdf.set_font("Arial", "B", 12)
-            pdf.cell(0, 8, sanitize_text_for_fpdf(title_pdf), 0, 1, "L")
-            pdf.set_font("Arial", "", 9) # Tamaño de fuente más pequeño para contenido
-            for key, value in data_dict_pdf.items():
-                s_key = sanitize_text_for_fpdf(str(key))
-                if isinstance(value, tuple):
-                    s_val0 = sanitize_text_for_fpdf(str(value[0]))
-                    s_val1 = sanitize_text_for_fpdf(str(value[1])) if len(value) > 1 else ''
-                    line = f"  {s_key.ljust(45)}: {s_val0.ljust(15)} {s_val1}"
+        col_eq1, col_eq2, col_eq3 = st.columns(3)
+        with col_eq1:
+            variable_eq = st.selectbox("Variable libre", list(variables_equilibrio), format_func=lambda clave: variables_equilibrio[clave][0], key="eq_variable")
+        with col_eq2:
+            salida_eq = st.selectbox("Salida objetivo", list(salidas_equilibrio), format_func=salidas_equilibrio.get, key="eq_salida")
+        with col_eq3:
+            objetivo_eq = st.number_input("Objetivo", value=0.0, step=100.0, format="%.2f", key="eq_objetivo")
+        minimo_eq, maximo_eq = LIMITES_VARIABLES[variable_eq]
+        col_eq4, col_eq5 = st.columns(2)
+        with col_eq4:
+            minimo_eq = st.number_input("Límite inferior de búsqueda", value=float(minimo_eq), key=f"eq_min_{variable_eq}")
+        with col_eq5:
+            maximo_eq = st.number_input("Límite superior de búsqueda", value=float(maximo_eq), key=f"eq_max_{variable_eq}")
+
+        etiqueta_eq, valor_actual_eq = variables_equilibrio[variable_eq]
+        # La bisección solo se lanza con el botón; el resultado guardado se muestra mientras no cambien las entradas
+        clave_eq = hash_contenido({clave: valor for clave, valor in inputs_balance.items() if not isinstance(valor, str)},
+                                  [variable_eq, salida_eq, objetivo_eq, minimo_eq, maximo_eq])
+        if st.button("Calcular punto de equilibrio", key="calcular_equilibrio") and st.session_state.get('equilibrio', (None,))[0] != clave_eq:
+            st.session_state.pop('equilibrio', None)
+            try:
+                with perfilador.etapa("resolver_equilibrio"):
+                    st.session_state.equilibrio = (clave_eq, resolver_equilibrio(inputs_balance, variable_eq, salida_eq, objetivo_eq, limites=(minimo_eq, maximo_eq)))
+            except ValueError as e_eq:
+                st.error(f"Error en el diseño inverso: {e_eq}")
+        resultado_eq = st.session_state.equilibrio[1] if st.session_state.get('equilibrio', (None,))[0] == clave_eq else None
+        if resultado_eq is None:
+            if 'equilibrio' in st.session_state:
+                st.caption("Las entradas han cambiado desde el último cálculo: pulse «Calcular punto de equilibrio» para actualizarlo.")
+        else:
+            col_eq_res1, col_eq_res2 = st.columns(2)
+            with col_eq_res1:
+                if resultado_eq['valor_equilibrio'] is not None:
+                    st.metric(f"Punto de equilibrio: {etiqueta_eq}", f"{resultado_eq['valor_equilibrio']:.3f}",
+                              f"{resultado_eq['valor_equilibrio'] - valor_actual_eq:+.3f} respecto al valor actual", delta_color="off")
                 else:
-                    s_val = sanitize_text_for_fpdf(str(value))
-                    line = f"  {s_key.ljust(45)}: {s_val}"
-                
-                # Limitar el ancho de multi_cell para evitar problemas
-                # Ancho de página (210mm) - márgenes (15mm*2) = 180mm.
-                # Damos un poco menos para seguridad.
-                try:
-                    pdf.multi_cell(170, 5, line, 0, "L") 
-                except Exception as e_multicell:
-                    print(f"Error en multi_cell con línea: '{line}'. Error: {e_multicell}")
-                    pdf.multi_cell(170, 5, f"Error al renderizar: {s_key}", 0, "L") # Mostrar al menos la clave
-            pdf.ln(3)
-
-        input_data_pdf_content = {
-            "Sustrato": all_inputs.get('sustrato_nombre', 'N/A'),
-            "Caudal Sustrato (kg/día)": all_inputs.get('caudal_sustrato_kg_dia',0),
-            "ST (%)": all_inputs.get('st_porcentaje',0),
-            "SV (% de ST)": all_inputs.get('sv_de_st_porcentaje',0),
-            "Fuente BMP": all_inputs.get('bmp_fuente_texto', 'N/A'),
-            "BMP (Nm³ CH₄/kg SV)": all_inputs.get('bmp_nm3_ch4_kg_sv',0),
-            "Temp. Op. Digestor (°C)": (all_inputs.get('temp_op_digestor_c',0), f"({all_inputs.get('temp_op_digestor_texto','N/A')})"),
-            "Eficiencia Digestión (%)": all_inputs.get('eficiencia_digestion_porcentaje',0),
-            "%CH₄ en biogás": all_inputs.get('ch4_en_biogas_porcentaje',0),
-            "Uso Principal Biogás": all_inputs.get('uso_biogas_texto','N/A'),
+                    st.metric(f"Punto de equilibrio: {etiqueta_eq}", "Sin cruce en el rango")
+            with col_eq_res2:
+                if resultado_eq['factible_min'] is None:
+                    st.error("Ningún valor del rango de búsqueda alcanza el objetivo.")
+                else:
+                    st.success(f"Rango factible: {resultado_eq['factible_min']:.3f} – {resultado_eq['factible_max']:.3f}")
+                    if resultado_eq['factible_min'] <= valor_actual_eq <= resultado_eq['factible_max']:
+                        st.caption("El valor actual cumple el objetivo.")
+                    else:
+                        st.caption("El valor actual no cumple el objetivo.")
+
+    perfilador.vuelta("diseno_inverso")
+
+    # --- Análisis de sensibilidad (tornado y rejillas 2-D) ---
+    with st.expander("📈 Análisis de Sensibilidad (Tornado y Rejillas)"):
+        # Últimos barridos de la sesión: volver a una vista reciente no la recalcula. Tornado y rejilla solo se
+        # calculan con su botón; el gráfico guardado se muestra mientras no cambien las entradas
+        if 'memoria_sensibilidad' not in st.session_state:
+            st.session_state.memoria_sensibilidad = CacheLRU(max_entradas=MAX_BARRIDOS_MEMORIA)
+        entradas_sensibilidad = {clave: valor for clave, valor in inputs_balance.items() if not isinstance(valor, str)}
+        memoria_sensibilidad = st.session_state.memoria_sensibilidad
+        parametros_sensibilidad = {
+            'bmp_nm3_ch4_kg_sv': "BMP (Nm³ CH₄/kg SV)",
+            'st_porcentaje': "Sólidos totales (%)",
+            'eficiencia_digestion_porcentaje': "Eficiencia de digestión (%)",
+            'trh_dias': "TRH (días)",
+            'u_digestor_w_m2_k': "U digestor (W/m²K)",
+            'temp_ambiente_promedio_c': "Temperatura ambiente (°C)",
+            'caudal_sustrato_kg_dia': "Caudal de sustrato (kg/día)",
+            'chp_eficiencia_electrica_porcentaje': "Eficiencia eléctrica CHP (%)",
+            'chp_eficiencia_termica_porcentaje': "Eficiencia térmica CHP (%)",
+            'caldera_eficiencia_porcentaje': "Eficiencia caldera (%)",
+            'consumo_electrico_aux_kwh_ton_sustrato': "Consumo eléctrico aux. (kWh/t)",
         }
-        if all_inputs.get('uso_biogas_opcion_idx') == 0:
-            input_data_pdf_content["Eficiencia Eléctrica CHP (%)"] = all_inputs.get('chp_eficiencia_electrica_porcentaje',0)
-            input_data_pdf_content["Eficiencia Térmica CHP (%)"] = all_inputs.get('chp_eficiencia_termica_porcentaje',0)
-        elif all_inputs.get('uso_biogas_opcion_idx') == 1:
-            input_data_pdf_content["Eficiencia Caldera (%)"] = all_inputs.get('caldera_eficiencia_porcentaje',0)
-        add_pdf_section("PARÁMETROS DE ENTRADA", input_data_pdf_content)
-        
-        results_data_pdf_content = {
-            "Dimensiones Digestor:": {
-                "Volumen Estimado (m³)": f"{dim_digestor_dict.get('volumen_digestor_m3',0):.2f}",
-                "Diámetro Estimado (m)": f"{dim_digestor_dict.get('diametro_digestor_m',0):.2f}",
-                "Área Superficial (m²)": f"{dim_digestor_dict.get('area_superficial_digestor_m2',0):.2f}",
-            },
-            "Producción de Biogás:": {
-                "Metano (CH₄) producido (Nm³/día)": f"{results_dict.get('ch4_producido_nm3_dia',0):.2f}",
-                "Biogás total producido (Nm³/día)": f"{results_dict.get('biogas_producido_nm3_dia',0):.2f}",
-                "Energía bruta en biogás (MJ/día)": f"{results_dict.get('energia_bruta_biogas_mj_dia',0):.2f}",
-            },
-            "Demanda Térmica Digestor:": {
-                "Calor para calentar sustrato (MJ/día)": f"{results_dict.get('calor_calentar_sustrato_mj_dia',0):.2f}",
-                "Pérdidas de calor del digestor (MJ/día)": f"{results_dict.get('perdidas_calor_digestor_mj_dia',0):.2f}",
-                "Demanda térmica TOTAL (MJ/día)": f"{results_dict.get('demanda_termica_total_digestor_mj_dia',0):.2f}",
-            },
-            "Producción Energética (" + all_inputs.get('uso_biogas_texto','N/A') + "):": {
-                "Electricidad bruta generada (kWh/día)": f"{results_dict.get('electricidad_generada_bruta_kwh_dia',0):.2f}" if all_inputs.get('uso_biogas_opcion_idx') == 0 else "N/A",
-                "Calor útil generado (MJ/día)": f"{results_dict.get('calor_util_generado_mj_dia',0):.2f}",
-            },
-             "Consumos Auxiliares:":{
-                "Consumo eléctrico auxiliar (kWh/día)": f"{results_dict.get('consumo_electrico_aux_total_kwh_dia',0):.2f}",
-            },
-            "BALANCE NETO:": {
-                "ELECTRICIDAD NETA EXPORTABLE (kWh/día)": f"{results_dict.get('electricidad_neta_exportable_kwh_dia',0):.2f}" if all_inputs.get('uso_biogas_opcion_idx') == 0 else f"{-results_dict.get('consumo_electrico_aux_total_kwh_dia',0):.2f} (Consumo)",
-                "CALOR NETO DISPONIBLE/DÉFICIT (MJ/día)": f"{results_dict.get('calor_neto_disponible_mj_dia',0):.2f}",
-            }
+        salidas_sensibilidad = {
+            'calor_neto_disponible_mj_dia': "Calor neto disponible (MJ/día)",
+            'electricidad_neta_exportable_kwh_dia': "Electricidad neta exportable (kWh/día)",
         }
-        pdf.set_font("Arial", "B", 12)
-        pdf.cell(0, 10, sanitize_text_for_fpdf("RESULTADOS DEL BALANCE (por día)"), 0, 1, "L")
-        for section_title, data_items in results_data_pdf_content.items():
-            pdf.set_font("Arial", "BU", 10)
-            pdf.cell(0, 6, sanitize_text_for_fpdf(section_title), 0, 1, "L")
-            pdf.set_font("Arial", "", 9)
-            for key, value in data_items.items():
-                s_key = sanitize_text_for_fpdf(str(key))
-                s_val = sanitize_text_for_fpdf(str(value))
-                line = f"  {s_key.ljust(50)}: {s_val}"
+        pestana_tornado, pestana_rejilla = st.tabs(["Tornado (un parámetro cada vez)", "Rejilla 2-D"])
+
+        with pestana_tornado:
+            col_tor1, col_tor2 = st.columns(2)
+            with col_tor1:
+                salida_tornado = st.selectbox("Salida", list(salidas_sensibilidad), format_func=salidas_sensibilidad.get, key="tornado_salida")
+            with col_tor2:
+                variacion_tornado = st.slider("Variación de cada parámetro (± %)", min_value=5, max_value=50, value=20, step=5, key="tornado_variacion")
+            parametros_tornado_defecto = [parametro for parametro in PARAMETROS_TORNADO if uso_biogas_opcion_idx == 0 or not parametro.startswith('chp_')]
+            if uso_biogas_opcion_idx == 1:
+                parametros_tornado_defecto.append('caldera_eficiencia_porcentaje')
+            parametros_tornado = st.multiselect("Parámetros", list(parametros_sensibilidad), default=parametros_tornado_defecto,
+                                                format_func=parametros_sensibilidad.get, key=f"tornado_parametros_{uso_biogas_opcion_idx}")
+            clave_tornado = hash_contenido(entradas_sensibilidad, [parametros_tornado, variacion_tornado, salida_tornado])
+            if st.button("Calcular tornado", key="calcular_tornado", disabled=not parametros_tornado) and st.session_state.get('tornado_sensibilidad', (None,))[0] != clave_tornado:
+                with perfilador.etapa("analisis_tornado"):
+                    resultado_tornado = analisis_tornado(inputs_balance, parametros_tornado, variacion_tornado / 100, salida_tornado, memoria=memoria_sensibilidad)
+                salida_base_tornado = resultado_tornado['salida_base']
+                barras_tornado = pd.DataFrame(
+                    [
+                        {"Parámetro": parametros_sensibilidad[fila['parametro']], "Extremo": extremo, "Valor": fila[f'valor_{sufijo}'],
+                         "Desde": salida_base_tornado, "Hasta": fila[f'salida_{sufijo}']}
+                        for fila in resultado_tornado['filas']
+                        for extremo, sufijo in ((f"-{variacion_tornado} %", "bajo"), (f"+{variacion_tornado} %", "alto"))
+                    ]
+                )
+                orden_tornado = [parametros_sensibilidad[fila['parametro']] for fila in resultado_tornado['filas']]
+                grafico_tornado = alt.Chart(barras_tornado).mark_bar().encode(
+                    y=alt.Y("Parámetro:N", sort=orden_tornado, title=None),
+                    x=alt.X("Desde:Q", title=salidas_sensibilidad[salida_tornado], scale=alt.Scale(zero=False)),
+                    x2="Hasta:Q",
+                    color=alt.Color("Extremo:N", title="Variación"),
+                    tooltip=["Parámetro", "Extremo", alt.Tooltip("Valor:Q", format=".3f"), alt.Tooltip("Hasta:Q", title="Salida", format=",.2f")],
+                )
+                linea_base_tornado = alt.Chart(pd.DataFrame({"Base": [salida_base_tornado]})).mark_rule(color="black").encode(x="Base:Q")
+                st.session_state.tornado_sensibilidad = (clave_tornado, (grafico_tornado + linea_base_tornado).to_dict(),
+                                                         f"Valor base: {salida_base_tornado:,.2f}. Parámetros ordenados por amplitud del efecto.")
+            if st.session_state.get('tornado_sensibilidad', (None,))[0] == clave_tornado:
+                st.vega_lite_chart(st.session_state.tornado_sensibilidad[1], use_container_width=True)
+                st.caption(st.session_state.tornado_sensibilidad[2])
+            elif 'tornado_sensibilidad' in st.session_state:
+                st.caption("Las entradas han cambiado desde el último cálculo: pulse «Calcular tornado» para actualizarlo.")
+
+        with pestana_rejilla:
+            col_rej1, col_rej2, col_rej3, col_rej4 = st.columns(4)
+            with col_rej1:
+                parametro_x_rejilla = st.selectbox("Eje X", list(parametros_sensibilidad), index=list(parametros_sensibilidad).index('trh_dias'),
+                                                   format_func=parametros_sensibilidad.get, key="rejilla_x")
+            with col_rej2:
+                parametro_y_rejilla = st.selectbox("Eje Y", list(parametros_sensibilidad), index=list(parametros_sensibilidad).index('temp_ambiente_promedio_c'),
+                                                   format_func=parametros_sensibilidad.get, key="rejilla_y")
+            with col_rej3:
+                salida_rejilla = st.selectbox("Salida", list(salidas_sensibilidad), format_func=salidas_sensibilidad.get, key="rejilla_salida")
+            with col_rej4:
+                resolucion_rejilla = st.select_slider("Puntos por eje", options=[25, 50, 100, 200], value=100, key="rejilla_resolucion")
+
+            limites_rejilla = {}
+            col_rej5, col_rej6, col_rej7, col_rej8 = st.columns(4)
+            for eje_rejilla, parametro_rejilla, col_min_rejilla, col_max_rejilla in (("x", parametro_x_rejilla, col_rej5, col_rej6), ("y", parametro_y_rejilla, col_rej7, col_rej8)):
+                minimo_rejilla, maximo_rejilla = valores_alrededor(inputs_balance, parametro_rejilla, 0.5)
+                if minimo_rejilla == maximo_rejilla:
+                    minimo_rejilla, maximo_rejilla = minimo_rejilla - 10.0, maximo_rejilla + 10.0
+                with col_min_rejilla:
+                    minimo_rejilla = st.number_input(f"Mín. {parametros_sensibilidad[parametro_rejilla]}", value=float(minimo_rejilla), key=f"rejilla_min_{eje_rejilla}_{parametro_rejilla}")
+                with col_max_rejilla:
+                    maximo_rejilla = st.number_input(f"Máx. {parametros_sensibilidad[parametro_rejilla]}", value=float(maximo_rejilla), key=f"rejilla_max_{eje_rejilla}_{parametro_rejilla}")
+                limites_rejilla[eje_rejilla] = (minimo_rejilla, maximo_rejilla)
+
+            if parametro_x_rejilla == parametro_y_rejilla:
+                st.warning("Elija dos parámetros distintos para los ejes.")
+            else:
+                clave_rejilla = hash_contenido(entradas_sensibilidad, [parametro_x_rejilla, parametro_y_rejilla, salida_rejilla, resolucion_rejilla, limites_rejilla])
+                if st.button("Calcular rejilla", key="calcular_rejilla") and st.session_state.get('rejilla_sensibilidad', (None,))[0] != clave_rejilla:
+                    eje_x, eje_y = (np.linspace(minimo, maximo, resolucion_rejilla) for minimo, maximo in (limites_rejilla["x"], limites_rejilla["y"]))
+                    with perfilador.etapa("rejilla_sensibilidad"):
+                        resultado_rejilla = rejilla_sensibilidad(
+                            inputs_balance, parametro_x_rejilla, eje_x, parametro_y_rejilla, eje_y,
+                            memoria=memoria_sensibilidad,
+                        )
+                        # Celdas centradas en cada punto de la rejilla
+                        paso_x = (eje_x[1] - eje_x[0]) / 2 if len(eje_x) > 1 else 0.5
+                        paso_y = (eje_y[1] - eje_y[0]) / 2 if len(eje_y) > 1 else 0.5
+                        malla_x, malla_y = np.meshgrid(eje_x, eje_y)
+                        celdas_rejilla = pd.DataFrame({
+                            "x": (malla_x - paso_x).ravel(), "x2": (malla_x + paso_x).ravel(),
+                            "y": (malla_y - paso_y).ravel(), "y2": (malla_y + paso_y).ravel(),
+                            "X": malla_x.ravel(), "Y": malla_y.ravel(),
+                            "Salida": resultado_rejilla[salida_rejilla].ravel(),
+                        })
+                    grafico_rejilla = alt.Chart(celdas_rejilla).mark_rect().encode(
+                        x=alt.X("x:Q", title=parametros_sensibilidad[parametro_x_rejilla], scale=alt.Scale(zero=False, nice=False)),
+                        x2="x2:Q",
+                        y=alt.Y("y:Q", title=parametros_sensibilidad[parametro_y_rejilla], scale=alt.Scale(zero=False, nice=False)),
+                        y2="y2:Q",
+                        color=alt.Color("Salida:Q", title=salidas_sensibilidad[salida_rejilla], scale=alt.Scale(scheme="redblue", domainMid=0)),
+                        tooltip=[alt.Tooltip("X:Q", title=parametros_sensibilidad[parametro_x_rejilla], format=".3f"),
+                                 alt.Tooltip("Y:Q", title=parametros_sensibilidad[parametro_y_rejilla], format=".3f"),
+                                 alt.Tooltip("Salida:Q", format=",.2f")],
+                    )
+                    salida_matriz_rejilla = resultado_rejilla[salida_rejilla]
+                    with alt.data_transformers.disable_max_rows():  # hasta 40 000 celdas (st.altair_chart también quita el límite)
+                        especificacion_rejilla = grafico_rejilla.to_dict()
+                    st.session_state.rejilla_sensibilidad = (clave_rejilla, especificacion_rejilla,
+                                                             f"{salida_matriz_rejilla.size:,} puntos: {np.count_nonzero(salida_matriz_rejilla < 0):,} en déficit (rojo).")
+                if st.session_state.get('rejilla_sensibilidad', (None,))[0] == clave_rejilla:
+                    st.vega_lite_chart(st.session_state.rejilla_sensibilidad[1], use_container_width=True)
+                    st.caption(st.session_state.rejilla_sensibilidad[2])
+                elif 'rejilla_sensibilidad' in st.session_state:
+                    st.caption("Las entradas han cambiado desde el último cálculo: pulse «Calcular rejilla» para actualizarla.")
+
+    perfilador.vuelta("sensibilidad")
+
+    # --- Optimización de la mezcla de co-digestión ---
+    with st.expander("🧪 Optimización de Mezcla de Sustratos"):
+        st.caption("Busca las proporciones con mayor producción de metano para el caudal total indicado, respetando la masa disponible de cada sustrato y el rango de ST.")
+        sustratos_opt = st.multiselect(
+            "Sustratos disponibles", catalogo_sustratos.nombres, key="sustratos_opt",
+            default=sustratos_mezcla if usar_mezcla_sustratos and sustratos_mezcla else ["Purín de cerdo", "Ensilado de maíz", "Glicerina bruta"],
+        )
+        col_opt1, col_opt2, col_opt3 = st.columns(3)
+        with col_opt1:
+            caudal_total_opt = st.number_input("Caudal total (kg/día)", min_value=1.0, value=max(1.0, float(caudal_sustrato_kg_dia)), step=100.0, key="caudal_total_opt")
+        with col_opt2:
+            st_min_opt = st.number_input("ST mínimo de la mezcla (%)", min_value=0.0, max_value=100.0, value=0.0, step=0.5, key="st_min_opt")
+        with col_opt3:
+            st_max_opt = st.number_input("ST máximo de la mezcla (%)", min_value=0.0, max_value=100.0, value=12.0, step=0.5, key="st_max_opt",
+                                         help="Vía húmeda: habitualmente ST <= 12-15 %.")
+        limites_opt = st.data_editor(
+            [{"Sustrato": nombre_opt, "Mínimo (kg/día)": 0.0, "Máximo (kg/día)": float(caudal_total_opt)} for nombre_opt in sustratos_opt],
+            disabled=["Sustrato"], hide_index=True, use_container_width=True, key=f"limites_opt_{'|'.join(sustratos_opt)}",
+        )
+        if st.button("Buscar mezcla óptima", disabled=not sustratos_opt):
+            try:
+                st.session_state.resultado_mezcla_optima = buscar_mezcla_optima(
+                    catalogo_sustratos, sustratos_opt, caudal_total_opt,
+                    masa_min_kg_dia=[fila_opt["Mínimo (kg/día)"] or 0.0 for fila_opt in limites_opt],
+                    masa_max_kg_dia=[fila_opt["Máximo (kg/día)"] if fila_opt["Máximo (kg/día)"] is not None else caudal_total_opt for fila_opt in limites_opt],
+                    st_min_porcentaje=st_min_opt, st_max_porcentaje=st_max_opt,
+                )
+                if st.session_state.resultado_mezcla_optima is None:
+                    st.warning("Ninguna mezcla evaluada cumple las restricciones.")
+            except ValueError as e_opt:
+                st.session_state.resultado_mezcla_optima = None
+                st.error(f"Error en la optimización de la mezcla: {e_opt}")
+
+        resultado_opt = st.session_state.get('resultado_mezcla_optima')
+        if resultado_opt:
+            propiedades_opt = resultado_opt['propiedades']
+            col_opt_res1, col_opt_res2 = st.columns(2)
+            with col_opt_res1:
+                st.metric("CH₄ Producido Estimado", f"{resultado_opt['ch4_potencial_nm3_dia'] * eficiencia_digestion_porcentaje / 100:.2f} Nm³/día",
+                          f"Potencial: {resultado_opt['ch4_potencial_nm3_dia']:.2f} Nm³/día", delta_color="off")
+                st.write(f"ST {propiedades_opt['st_porcentaje']:.2f} % | SV/ST {propiedades_opt['sv_de_st_porcentaje']:.1f} % | "
+                         f"BMP {propiedades_opt['bmp_nm3_ch4_kg_sv']:.3f} Nm³ CH₄/kg SV")
+                st.caption(f"{resultado_opt['n_factibles']:,} de {resultado_opt['n_evaluadas']:,} mezclas evaluadas cumplen las restricciones.")
+            with col_opt_res2:
+                st.dataframe(
+                    [{"Sustrato": nombre_opt, "kg/día": masa_opt, "Fracción (%)": resultado_opt['fracciones'][nombre_opt] * 100}
+                     for nombre_opt, masa_opt in resultado_opt['masas_kg_dia'].items()],
+                    hide_index=True, use_container_width=True,
+                )
+
+    perfilador.vuelta("mezcla_sustratos")
+
+    # --- Simulación horaria con datos climáticos ---
+    @st.cache_data(max_entries=4, show_spinner=False)
+    def leer_serie_subida(contenido):
+        """Bloques de la serie de un CSV subido, leídos una vez por contenido y no en cada ejecución."""
+        return list(leer_serie_csv(TextIOWrapper(BytesIO(contenido), encoding="utf-8-sig", newline="")))
+
+    with st.expander("⏱️ Simulación Horaria (CSV climático)"):
+        st.caption("CSV con cabecera, columna de fecha/hora ISO y columna de temperatura (°C). Admite resolución horaria o inferior y varios años.")
+        archivo_ambiente_csv = st.file_uploader("Temperatura ambiente", type=["csv", "txt"], key="csv_temp_ambiente")
+        archivo_sustrato_csv = st.file_uploader("Temperatura de entrada del sustrato (opcional)", type=["csv", "txt"], key="csv_temp_sustrato")
+        if archivo_ambiente_csv is not None:
+            # La simulación solo se lanza con el botón; el resultado guardado se muestra mientras no cambien
+            # las entradas del balance ni los ficheros subidos
+            clave_horario = hash_contenido({clave: valor for clave, valor in inputs_balance.items() if not isinstance(valor, str)},
+                                           archivo_ambiente_csv.file_id, archivo_sustrato_csv.file_id if archivo_sustrato_csv is not None else None)
+            if st.button("Simular serie horaria", key="simular_horario") and st.session_state.get('resultado_horario', (None,))[0] != clave_horario:
+                st.session_state.pop('resultado_horario', None)
                 try:
-                    pdf.multi_cell(170, 5, line, 0, "L")
-                except Exception as e_multicell_res:
-                    print(f"Error en multi_cell resultados: '{line}'. Error: {e_multicell_res}")
-                    pdf.multi_cell(170, 5, f"Error al renderizar: {s_key}", 0, "L")
-            pdf.ln(2)
-
-        pdf.ln(5); pdf.set_font("Arial", "B", 10); pdf.cell(0, 6, sanitize_text_for_fpdf("Notas Importantes:"), 0, 1, "L")
-        pdf.set_font("Arial", "I", 9)
-        pdf.multi_cell(170, 5, sanitize_text_for_fpdf(
-            "- Este es un balance PRELIMINAR basado en estimaciones y supuestos.\n"
-            "- Los valores de BMP, eficiencias y pérdidas pueden variar significativamente.\n"
-            "- Se recomienda un análisis detallado con datos específicos del proyecto y de proveedores."
-            ), 0, "L")
-        
+                    serie_sustrato_csv = None
+                    if archivo_sustrato_csv is not None:
+                        serie_sustrato_csv = leer_serie_subida(archivo_sustrato_csv.getvalue())
+                    with perfilador.etapa("simular_balance_horario"):
+                        st.session_state.resultado_horario = (clave_horario, simular_balance_horario(
+                            inputs_balance, leer_serie_subida(archivo_ambiente_csv.getvalue()), serie_sustrato=serie_sustrato_csv,
+                        ))
+                except (ValueError, IndexError) as e_horario:
+                    st.error(f"No se pudo procesar la serie climática: {e_horario}")
+            resultado_horario = st.session_state.resultado_horario[1] if st.session_state.get('resultado_horario', (None,))[0] == clave_horario else None
+            if resultado_horario is None:
+                if 'resultado_horario' in st.session_state:
+                    st.caption("Las entradas han cambiado desde la última simulación: pulse «Simular serie horaria» para actualizarla.")
+            else:
+                col_hor1, col_hor2, col_hor3 = st.columns(3)
+                with col_hor1:
+                    st.metric("Pico de Déficit Térmico", f"{resultado_horario['pico_deficit_kw']:.2f} kW")
+                    if resultado_horario['fecha_pico_deficit']:
+                        st.caption(f"Registrado el {resultado_horario['fecha_pico_deficit']}")
+                with col_hor2:
+                    st.metric("Horas en Déficit", f"{resultado_horario['horas_deficit']:.0f} h")
+                with col_hor3:
+                    st.metric("Déficit Acumulado", f"{resultado_horario['deficit_total_mj']:.2f} MJ")
+                st.markdown("##### Totales mensuales (MJ)")
+                st.dataframe(resultado_horario['mensual'], use_container_width=True, hide_index=True)
+                st.bar_chart(resultado_horario['mensual'], x="mes", y="neto_mj", x_label="Mes", y_label="Calor neto (MJ)")
+
+    perfilador.vuelta("simulacion_horaria")
+
+    # --- Arranque y respuesta transitoria (masa térmica con termostato) ---
+    with st.expander("🌡️ Arranque y Respuesta Transitoria del Digestor"):
+        st.caption("El digestor se simula como una masa térmica con pérdidas U·A, calentamiento de la alimentación y una calefacción de potencia fija "
+                   "con termostato (banda de histéresis alrededor de la temperatura de operación). Por defecto la potencia es el calor útil del balance.")
+        calor_util_kw = results['calor_util_generado_mj_dia'] / 86.4
+        demanda_kw = results['demanda_termica_total_digestor_mj_dia'] / 86.4
+        col_tr1, col_tr2, col_tr3, col_tr4 = st.columns(4)
+        with col_tr1:
+            temp_inicial_tr = st.number_input("Temperatura inicial (°C)", value=float(temp_sustrato_entrada_c), step=0.5, key="temp_inicial_tr",
+                                              help="Para un arranque, la temperatura del digestor lleno antes de calentar.")
+        with col_tr2:
+            potencia_tr = st.number_input("Potencia de calefacción (kW)", min_value=0.0, value=round(max(calor_util_kw, demanda_kw), 1), step=10.0,
+                                          key="potencia_tr", help=f"Demanda en régimen: {demanda_kw:.1f} kW.")
+        with col_tr3:
+            duracion_tr = st.number_input("Duración (días)", min_value=1, max_value=730, value=60, step=5, key="duracion_tr")
+        with col_tr4:
+            paso_tr = st.selectbox("Paso de tiempo (min)", (1, 5, 15, 60), key="paso_tr")
+        histeresis_tr = st.slider("Histéresis del termostato (°C)", 0.0, 5.0, 1.0, 0.1, key="histeresis_tr")
+        col_ev1, col_ev2 = st.columns(2)
+        with col_ev1:
+            st.markdown("##### Corte de alimentación")
+            inicio_corte_tr = st.number_input("Día de inicio", min_value=0.0, value=30.0, step=1.0, key="inicio_corte_tr")
+            dias_corte_tr = st.number_input("Duración (días)", min_value=0.0, value=0.0, step=0.5, key="dias_corte_tr")
+        with col_ev2:
+            st.markdown("##### Ola de frío")
+            inicio_frio_tr = st.number_input("Día de inicio", min_value=0.0, value=40.0, step=1.0, key="inicio_frio_tr")
+            dias_frio_tr = st.number_input("Duración (días)", min_value=0.0, value=0.0, step=0.5, key="dias_frio_tr")
+            temp_frio_tr = st.number_input("Temperatura ambiente (°C)", value=-10.0, step=1.0, key="temp_frio_tr")
+
+        pasos_por_dia_tr = 1440 / paso_tr
+        n_pasos_tr = int(duracion_tr * pasos_por_dia_tr)
+        # La simulación (hasta cientos de miles de pasos) solo se lanza con el botón; el resultado guardado se
+        # muestra mientras no cambien las entradas del balance ni los parámetros del transitorio
+        clave_tr = hash_contenido({clave: valor for clave, valor in inputs_balance.items() if not isinstance(valor, str)},
+                                  [temp_inicial_tr, potencia_tr, duracion_tr, paso_tr, histeresis_tr,
+                                   inicio_corte_tr, dias_corte_tr, inicio_frio_tr, dias_frio_tr, temp_frio_tr])
+        if st.button("Simular transitorio", key="simular_transitorio") and st.session_state.get('clave_transitorio') != clave_tr:
+            alimentacion_tr = np.ones(n_pasos_tr)
+            alimentacion_tr[int(inicio_corte_tr * pasos_por_dia_tr):int((inicio_corte_tr + dias_corte_tr) * pasos_por_dia_tr)] = 0.0
+            temp_ambiente_tr = np.full(n_pasos_tr, float(inputs_balance['temp_ambiente_promedio_c']))
+            temp_ambiente_tr[int(inicio_frio_tr * pasos_por_dia_tr):int((inicio_frio_tr + dias_frio_tr) * pasos_por_dia_tr)] = temp_frio_tr
+            st.session_state.pop('resultado_transitorio', None)
+            try:
+                with perfilador.etapa("simular_transitorio"):
+                    st.session_state.resultado_transitorio = simular_transitorio(
+                        inputs_balance, temp_ambiente=temp_ambiente_tr, alimentacion=alimentacion_tr, paso_minutos=paso_tr,
+                        potencia_calefaccion_kw=potencia_tr, histeresis_c=histeresis_tr, temp_inicial_c=temp_inicial_tr,
+                    )
+                st.session_state.clave_transitorio = clave_tr
+            except ValueError as e_tr:
+                st.session_state.pop('clave_transitorio', None)
+                st.error(f"No se pudo simular el transitorio: {e_tr}")
+        resultado_tr = st.session_state.get('resultado_transitorio') if st.session_state.get('clave_transitorio') == clave_tr else None
+        if resultado_tr is None:
+            if st.session_state.get('resultado_transitorio') is not None:
+                st.caption("Las entradas han cambiado desde la última simulación: pulse «Simular transitorio» para actualizarla.")
+        else:
+            col_tr_res1, col_tr_res2, col_tr_res3, col_tr_res4 = st.columns(4)
+            with col_tr_res1:
+                horas_consigna_tr = resultado_tr['horas_hasta_consigna']
+                st.metric("Tiempo hasta Consigna", "No se alcanza" if np.isnan(horas_consigna_tr) else f"{horas_consigna_tr / 24:.1f} días")
+            with col_tr_res2:
+                st.metric("Energía de Calefacción", f"{resultado_tr['energia_calefaccion_mj']:,.0f} MJ")
+            with col_tr_res3:
+                st.metric("Horas bajo Consigna", f"{resultado_tr['horas_bajo_consigna']:.1f} h")
+            with col_tr_res4:
+                st.metric("Arranques de la Calefacción", f"{resultado_tr['arranques_calefaccion']:,}")
+            st.caption(f"Capacidad térmica del digestor: {resultado_tr['capacidad_termica_mj_c']:,.0f} MJ/°C. "
+                       f"Pérdidas: {resultado_tr['perdidas_calor_mj']:,.0f} MJ; calentamiento de la alimentación: {resultado_tr['calor_calentar_sustrato_mj']:,.0f} MJ.")
+            # Gráfico construido una vez por simulación, como mucho un punto por hora (Altair directo: st.line_chart añade ~50 ms)
+            if st.session_state.get('grafico_transitorio', (None,))[0] != clave_tr:
+                cada_tr = max(1, int(60 / paso_tr))
+                serie_tr = pd.DataFrame({
+                    "Día": np.arange(cada_tr, n_pasos_tr + 1, cada_tr) / pasos_por_dia_tr,
+                    "Temperatura (°C)": resultado_tr['temperatura_c'][cada_tr - 1::cada_tr],
+                })
+                st.session_state.grafico_transitorio = (clave_tr, (
+                    alt.Chart(serie_tr).mark_line().encode(x="Día:Q", y=alt.Y("Temperatura (°C):Q", scale=alt.Scale(zero=False)))
+                    + alt.Chart(pd.DataFrame({"Consigna": [temp_op_digestor_c]})).mark_rule(strokeDash=[4, 4], color="gray").encode(y="Consigna:Q")
+                ).to_dict())
+            st.vega_lite_chart(st.session_state.grafico_transitorio[1], use_container_width=True)
+
+    perfilador.vuelta("simulacion_transitoria")
+
+    # --- Historial de escenarios (almacén en disco compartido por todas las sesiones) ---
+    @st.cache_resource
+    def abrir_almacen(ruta):
+        return AlmacenEscenarios(ruta)
+
+    def guardar_escenario_actual():
+        # El almacén (directorio y ficheros en disco) solo se abre al guardar o al desplegar el historial
         try:
-            return pdf.output(dest='S').encode('latin-1')
-        except Exception as e_pdf_output:
-            st.error(f"Error final al generar bytes del PDF: {e_pdf_output}")
-            return None
+            almacen = abrir_almacen(RUTA_ALMACEN_POR_DEFECTO)
+        except (OSError, ValueError) as e_almacen:
+            st.session_state.aviso_almacen = ("warning", f"No se pudo abrir el almacén de escenarios ({RUTA_ALMACEN_POR_DEFECTO}): {e_almacen}")
+            return
+        estado = st.session_state.estado_balance
+        id_guardado = almacen.agregar(estado['inputs_balance'], estado['results'], estado['dim_digestor'], etiqueta=st.session_state.project_name_main)
+        st.session_state.aviso_almacen = ("success", f"Escenario #{id_guardado} guardado.")
+
+    with st.expander("🗂️ Historial y Comparación de Escenarios", key="expander_historial", on_change="rerun") as expander_historial:
+        st.button("💾 Guardar escenario actual", on_click=guardar_escenario_actual)
+        if 'aviso_almacen' in st.session_state:
+            tipo_aviso, texto_aviso = st.session_state.pop('aviso_almacen')
+            getattr(st, tipo_aviso)(texto_aviso)
+        almacen_escenarios = None
+        if expander_historial.open:
+            try:
+                almacen_escenarios = abrir_almacen(RUTA_ALMACEN_POR_DEFECTO)
+            except (OSError, ValueError) as e_almacen:
+                st.warning(f"No se pudo abrir el almacén de escenarios ({RUTA_ALMACEN_POR_DEFECTO}): {e_almacen}")
+        if almacen_escenarios is not None:
+            almacen_escenarios.recargar()  # escenarios añadidos desde otras sesiones o con 'python -m balance_biogas almacenar'
+            st.caption(f"{len(almacen_escenarios):,} escenarios guardados en `{almacen_escenarios.ruta}`. Solo se leen del disco las filas que se muestran.")
+
+            campos_almacen = list(almacen_escenarios.campos_numericos[1:])  # sin la fecha
+            filtros_almacen = st.data_editor(
+                [{"Campo": "calor_neto_disponible_mj_dia", "Mínimo": None, "Máximo": None}],
+                num_rows="dynamic", hide_index=True, use_container_width=True, key="filtros_almacen",
+                column_config={
+                    "Campo": st.column_config.SelectboxColumn("Campo", options=campos_almacen, required=True),
+                    "Mínimo": st.column_config.NumberColumn("Mínimo"),
+                    "Máximo": st.column_config.NumberColumn("Máximo"),
+                },
+            )
+            col_alm1, col_alm2, col_alm3 = st.columns(3)
+            with col_alm1:
+                orden_almacen = st.selectbox("Ordenar por", campos_almacen, index=campos_almacen.index('electricidad_neta_exportable_kwh_dia'), key="orden_almacen")
+            with col_alm2:
+                n_almacen = st.number_input("Escenarios a mostrar", min_value=1, max_value=1000, value=20, step=5, key="n_almacen")
+            with col_alm3:
+                descendente_almacen = st.toggle("De mayor a menor", value=True, key="descendente_almacen")
+
+            filtros_consulta = {
+                fila_filtro["Campo"]: (fila_filtro["Mínimo"], fila_filtro["Máximo"])
+                for fila_filtro in filtros_almacen
+                if fila_filtro["Campo"] and (fila_filtro["Mínimo"] is not None or fila_filtro["Máximo"] is not None)
+            }
+            # La consulta se repite solo si cambian los filtros, el orden o el número de escenarios guardados
+            clave_consulta = hash_contenido(filtros_consulta, orden_almacen, int(n_almacen), descendente_almacen, len(almacen_escenarios))
+            if st.session_state.get('consulta_almacen', (None,))[0] != clave_consulta:
+                with perfilador.etapa("consulta_almacen"):
+                    ids_almacen = almacen_escenarios.top(orden_almacen, int(n_almacen), filtros_consulta, descendente=descendente_almacen)
+                    campos_tabla = ["etiqueta", "fecha_unix", "caudal_sustrato_kg_dia", "trh_dias", "temp_ambiente_promedio_c",
+                                    "volumen_digestor_m3", "electricidad_neta_exportable_kwh_dia", "calor_neto_disponible_mj_dia"]
+                    if orden_almacen not in campos_tabla:
+                        campos_tabla.append(orden_almacen)
+                    st.session_state.consulta_almacen = (
+                        clave_consulta,
+                        pd.DataFrame(almacen_escenarios.registros(ids_almacen, campos_tabla), columns=["id", *campos_tabla[:1], *campos_tabla[2:], "fecha"]),
+                        almacen_escenarios.contar(filtros_consulta) if filtros_consulta else None,
+                    )
+            _, tabla_almacen, n_cumplen_almacen = st.session_state.consulta_almacen
+            if n_cumplen_almacen is not None:
+                st.caption(f"{n_cumplen_almacen:,} escenarios cumplen los filtros.")
+            seleccion_almacen = st.dataframe(tabla_almacen, hide_index=True, use_container_width=True, key="tabla_almacen",
+                                             on_select="rerun", selection_mode="multi-row")
+
+            filas_comparar = seleccion_almacen.selection.rows or list(range(min(2, len(tabla_almacen))))
+            if filas_comparar:
+                st.markdown("##### Comparación" + ("" if seleccion_almacen.selection.rows else " (seleccione filas de la tabla para elegir los escenarios)"))
+                comparados = almacen_escenarios.registros(tabla_almacen["id"].iloc[filas_comparar], ["etiqueta", *CAMPOS_ENTRADA, *CAMPOS_SALIDA])
+                st.dataframe(
+                    pd.DataFrame(
+                        {f"#{registro['id']} {registro['etiqueta']}": [registro[campo] for campo in CAMPOS_ENTRADA + CAMPOS_SALIDA] for registro in comparados},
+                        index=list(CAMPOS_ENTRADA + CAMPOS_SALIDA),
+                    ),
+                    use_container_width=True,
+                )
+
+    perfilador.vuelta("historial_escenarios")
+
+    st.sidebar.markdown("---")
+    st.sidebar.header("Exportar Resultados")
+    project_info_dict = {"nombre": project_name, "analista": analyst_name, "fecha": current_date}
 
+    if not OPENPYXL_AVAILABLE:
+        st.sidebar.warning("Exportación a Excel no disponible (falta 'openpyxl').")
+    if not FPDF_AVAILABLE:
+        st.sidebar.warning("Exportación a PDF no disponible (falta 'fpdf2').")
 
-    excel_data = generar_excel_bytes(inputs_balance, results, dim_digestor, project_info_dict)
-    if excel_data:
+    # Los ficheros se generan solo al pulsar el botón de descarga (y se reutilizan si el contenido no cambia),
+    # con el último balance calculado, también si procede de un deslizador del modo en vivo
+    if OPENPYXL_AVAILABLE:
         st.sidebar.download_button(
-            label="📥 Descargar Resultados en Excel", data=excel_data,
+            label="📥 Descargar Resultados en Excel",
+            data=perfilador.envolver("generar_excel_bytes", lambda: generar_excel_bytes_cacheado(estado_balance["inputs_balance"], estado_balance["results"], estado_balance["dim_digestor"], project_info_dict)),
             file_name=f"{project_name.replace(' ', '_')}_Balance_Energia_{current_date}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            on_click="ignore",
         )
 
-    pdf_data = generar_pdf_bytes(inputs_balance, results, dim_digestor, project_info_dict)
-    if pdf_data:
+    if FPDF_AVAILABLE:
         st.sidebar.download_button(
-            label="📄 Descargar Resultados en PDF", data=pdf_data,
+            label="📄 Descargar Resultados en PDF",
+            data=perfilador.envolver("generar_pdf_bytes", lambda: generar_pdf_bytes_cacheado(estado_balance["inputs_balance"], estado_balance["results"], estado_balance["dim_digestor"], project_info_dict)),
             file_name=f"{project_name.replace(' ', '_')}_Balance_Energia_{current_date}.pdf",
-            mime="application/pdf"
+            mime="application/pdf",
+            on_click="ignore",
         )
+    perfilador.vuelta("botones_exportacion")
 else:
     st.info("ℹ️ Configure los parámetros en la barra lateral y presione 'RESULTADOS BALANCE ENERGÍA' para ver el análisis.")
 
 st.sidebar.markdown("---")
 st.sidebar.info("Desarrollado como herramienta preliminar.")
+st.sidebar.checkbox("Mostrar panel de rendimiento", value=PERFILADO_POR_DEFECTO, key="perfilado_activo",
+                    help="Mide el tiempo de cada etapa de la ejecución (se aplica a partir de la siguiente interacción).")
+
+if perfilador.activo:
+    perfilador.vuelta("pie")
+
+    def tabla_rendimiento(filas):
+        return [
+            {
+                "Etapa": f"↳ {fila['etapa']}" if fila['subetapa'] else fila['etapa'], "Llamadas": fila['llamadas'],
+                "Total (ms)": fila['segundos'] * 1000, "Máx. (ms)": fila['segundos_max'] * 1000,
+                "Pico RSS del proceso (MB)": fila['memoria_pico_bytes'] / 1e6 if fila['memoria_pico_bytes'] is not None else None,
+            }
+            for fila in filas
+        ]
+
+    with st.expander("⚙️ Rendimiento", expanded=True):
+        resumen_ejecucion = perfilador.resumen()
+        st.caption(f"Ejecución actual: {sum(fila['segundos'] for fila in resumen_ejecucion if not fila['subetapa']) * 1000:.1f} ms. "
+                   "Las filas con ↳ son subtiempos incluidos en la sección que las contiene. La memoria es el pico de memoria "
+                   "residente del proceso (ru_maxrss) al terminar cada medida, no lo que asigna cada etapa.")
+        st.dataframe(tabla_rendimiento(resumen_ejecucion), hide_index=True, use_container_width=True)
+        st.markdown("##### Acumulado del proceso (todas las sesiones)")
+        st.dataframe(tabla_rendimiento(PERFILADOR_GLOBAL.resumen()), hide_index=True, use_container_width=True)
+    volcar_desde_entorno(perfilador, sesion=st.session_state.setdefault("id_sesion_perfilado", uuid.uuid4().hex))
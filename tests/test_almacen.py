@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pytest
+
+from balance_biogas import almacen as almacen_modulo
+from balance_biogas.almacen import ESQUEMA_ESCENARIOS, AlmacenEscenarios
+
+
+def _columnas(valores):
+    return {"caudal_sustrato_kg_dia": np.asarray(valores, dtype=np.float64), "trh_dias": 30.0}
+
+
+def test_agregar_lote_y_releer(tmp_path):
+    almacen = AlmacenEscenarios(str(tmp_path))
+    ids = almacen.agregar_lote(_columnas([1_000.0, 2_000.0, 3_000.0]), etiqueta=["a", "b", "ñandú" * 10], fecha_unix=0.0)
+    assert ids == range(0, 3)
+    assert almacen.agregar_lote(_columnas([4_000.0]), etiqueta="d")[0] == 3
+
+    reabierto = AlmacenEscenarios(str(tmp_path))
+    assert len(reabierto) == 4
+    filas = reabierto.filas([0, 2, 3])
+    assert filas["caudal_sustrato_kg_dia"].tolist() == [1_000.0, 3_000.0, 4_000.0]
+    assert filas["trh_dias"].tolist() == [30.0, 30.0, 30.0]
+    assert np.isnan(filas["st_porcentaje"]).all()  # campos ausentes
+    registros = reabierto.registros([2], ["etiqueta", "fecha_unix"])
+    assert list(registros[0]) == reabierto.claves_registros(["etiqueta", "fecha_unix"])
+    assert len(registros[0]["etiqueta"].encode("utf-8")) <= ESQUEMA_ESCENARIOS["etiqueta"].itemsize
+    assert registros[0]["etiqueta"].startswith("ñandú")
+
+
+def test_consultas_ignoran_nan(tmp_path):
+    almacen = AlmacenEscenarios(str(tmp_path))
+    almacen.agregar_lote(_columnas([5.0, np.nan, 1.0, 9.0, np.nan, 5.0, 3.0]))
+    assert almacen.filtrar({"caudal_sustrato_kg_dia": (3.0, None)}).tolist() == [0, 3, 5, 6]
+    assert almacen.filtrar({"caudal_sustrato_kg_dia": (3.0, None)}, limite=2).tolist() == [0, 3]
+    assert almacen.contar({"caudal_sustrato_kg_dia": (None, 5.0)}) == 4
+    assert almacen.contar() == 7
+    # Los NaN no entran en el ranking; los empates mantienen el orden de id
+    assert almacen.top("caudal_sustrato_kg_dia", 10).tolist() == [3, 0, 5, 6, 2]
+    assert almacen.top("caudal_sustrato_kg_dia", 2, descendente=False).tolist() == [2, 6]
+    assert almacen.top("caudal_sustrato_kg_dia", 3, filtros={"caudal_sustrato_kg_dia": (None, 5.0)}).tolist() == [0, 5, 6]
+    with pytest.raises(ValueError, match="No se puede ordenar"):
+        almacen.top("etiqueta")
+
+
+def test_escritura_fallida_deja_el_almacen_como_estaba(tmp_path, monkeypatch):
+    almacen = AlmacenEscenarios(str(tmp_path))
+    almacen.agregar_lote(_columnas([1.0, 2.0]))
+    tamanos = {nombre: os.path.getsize(tmp_path / nombre) for nombre in os.listdir(tmp_path) if nombre.endswith(".bin")}
+
+    aperturas = []
+
+    def open_que_falla(ruta, *args, **kwargs):
+        # Falla la quinta columna del lote; el recorte posterior abre los ficheros con normalidad
+        aperturas.append(ruta)
+        if len(aperturas) == 5:
+            raise OSError("disco lleno")
+        return open(ruta, *args, **kwargs)
+
+    monkeypatch.setattr(almacen_modulo, "open", open_que_falla, raising=False)
+    with pytest.raises(OSError, match="disco lleno"):
+        almacen.agregar_lote(_columnas([3.0, 4.0, 5.0]))
+    monkeypatch.undo()
+
+    assert len(almacen) == 2
+    assert {nombre: os.path.getsize(tmp_path / nombre) for nombre in tamanos} == tamanos
+    assert almacen.agregar_lote(_columnas([6.0]))[0] == 2
+    assert AlmacenEscenarios(str(tmp_path)).columna("caudal_sustrato_kg_dia").tolist() == [1.0, 2.0, 6.0]
+
+
+def test_columnas_de_distinta_longitud_se_recortan(tmp_path):
+    almacen = AlmacenEscenarios(str(tmp_path))
+    almacen.agregar_lote(_columnas([1.0, 2.0, 3.0]))
+    # Escritura interrumpida: una fila de más en una columna
+    with open(tmp_path / "trh_dias.bin", "ab") as fichero:
+        fichero.write(np.array([99.0]).tobytes())
+    with open(tmp_path / "caudal_sustrato_kg_dia.bin", "ab") as fichero:
+        fichero.truncate(2 * 8)
+    reabierto = AlmacenEscenarios(str(tmp_path))
+    assert len(reabierto) == 2
+    assert all(os.path.getsize(tmp_path / f"{campo}.bin") == 2 * ESQUEMA_ESCENARIOS[campo].itemsize for campo in ESQUEMA_ESCENARIOS.names)
+    assert reabierto.columna("trh_dias").tolist() == [30.0, 30.0]
+
+
+def test_campo_nuevo_se_rellena_con_nan(tmp_path):
+    antiguo = np.dtype([(campo, ESQUEMA_ESCENARIOS[campo]) for campo in ESQUEMA_ESCENARIOS.names if campo != "trh_dias"])
+    AlmacenEscenarios(str(tmp_path), antiguo).agregar_lote(_columnas([1.0, 2.0]))
+    almacen = AlmacenEscenarios(str(tmp_path))
+    assert len(almacen) == 2
+    assert np.isnan(almacen.columna("trh_dias")).all()
+    assert almacen.columna("caudal_sustrato_kg_dia").tolist() == [1.0, 2.0]
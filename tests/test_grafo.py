@@ -0,0 +1,82 @@
+import pytest
+
+from balance_biogas.calculos import (
+    CLAVES_DIMENSIONES, CLAVES_RESULTADOS, ENTRADAS_POR_DEFECTO, calcular_dimensiones_digestor, realizar_calculos_balance,
+)
+from balance_biogas.grafo import GrafoBalance, GrafoCalculo, Nodo
+
+
+def _escalar(entradas):
+    dimensiones = calcular_dimensiones_digestor(entradas["caudal_sustrato_kg_dia"], entradas["trh_dias"])
+    return dict(dimensiones, **realizar_calculos_balance(dict(entradas, area_superficial_digestor_m2=dimensiones["area_superficial_digestor_m2"])))
+
+
+def _valores_grafo(grafo):
+    return dict(grafo.dimensiones(), **grafo.resultados())
+
+
+def _comparar(grafo, entradas):
+    esperado = _escalar(entradas)
+    obtenido = _valores_grafo(grafo)
+    for clave in (*CLAVES_DIMENSIONES, *CLAVES_RESULTADOS):
+        assert obtenido[clave] == pytest.approx(esperado[clave], rel=1e-12, abs=1e-12), clave
+
+
+@pytest.mark.parametrize("uso", [0, 1, 2, 3])
+def test_grafo_igual_que_escalar(uso):
+    entradas = dict(ENTRADAS_POR_DEFECTO, uso_biogas_opcion_idx=uso, upgrading_tecnologia_idx=3)
+    grafo = GrafoBalance()
+    grafo.actualizar(entradas)
+    _comparar(grafo, entradas)
+
+
+def test_actualizacion_incremental_solo_recalcula_descendientes():
+    entradas = dict(ENTRADAS_POR_DEFECTO)
+    grafo = GrafoBalance()
+    grafo.actualizar(entradas)
+    grafo.resultados()
+    assert grafo.actualizar({"chp_eficiencia_electrica_porcentaje": 38.0}) == {"chp_eficiencia_electrica_porcentaje"}
+    entradas["chp_eficiencia_electrica_porcentaje"] = 38.0
+    _comparar(grafo, entradas)
+    assert set(grafo.ultimos_recalculados) == {"electricidad_generada_bruta_kwh_dia", "electricidad_neta_exportable_kwh_dia"}
+
+    # Mismo valor: no cambia nada ni se recalcula nada
+    assert grafo.actualizar({"chp_eficiencia_electrica_porcentaje": 38.0}) == set()
+    grafo.resultados()
+    assert grafo.ultimos_recalculados == ()
+
+
+def test_cambios_sucesivos_coinciden_con_calculo_completo():
+    entradas = dict(ENTRADAS_POR_DEFECTO)
+    grafo = GrafoBalance()
+    grafo.actualizar(entradas)
+    cambios = (
+        {"caudal_sustrato_kg_dia": 25_000.0},
+        {"trh_dias": 0.0},  # área 0: sin pérdidas
+        {"temp_ambiente_promedio_c": 45.0, "trh_dias": 20.0},  # ambiente por encima del digestor
+        {"ch4_en_biogas_porcentaje": 0.0},
+        {"ch4_en_biogas_porcentaje": 55.0, "uso_biogas_opcion_idx": 2, "upgrading_tecnologia_idx": 1},
+        {"presion_inyeccion_bar": 4.0},  # por debajo de la salida de la tecnología: sin compresión
+        {"uso_biogas_opcion_idx": 1},
+    )
+    for cambio in cambios:
+        grafo.actualizar(cambio)
+        entradas.update(cambio)
+        _comparar(grafo, entradas)
+
+
+def test_claves_ajenas_se_ignoran():
+    grafo = GrafoBalance()
+    assert grafo.actualizar({"nombre_proyecto": "Planta", "area_superficial_digestor_m2": 1.0}) == set()
+
+
+def test_entrada_obligatoria_ausente():
+    grafo = GrafoBalance()
+    grafo.actualizar({clave: valor for clave, valor in ENTRADAS_POR_DEFECTO.items() if clave != "trh_dias"})
+    with pytest.raises(KeyError, match="trh_dias"):
+        grafo.resultados()
+
+
+def test_dependencia_circular():
+    with pytest.raises(ValueError, match="circular"):
+        GrafoCalculo((Nodo("a", ("b",), lambda b: b), Nodo("b", ("a",), lambda a: a)))
@@ -0,0 +1,37 @@
+import io
+
+import numpy as np
+import pytest
+
+from balance_biogas.calculos import ENTRADAS_POR_DEFECTO
+from balance_biogas.horario import leer_serie_csv, simular_balance_horario
+
+FECHAS = np.arange("2023-01-01T00", "2023-01-03T00", dtype="datetime64[h]").astype("datetime64[s]")
+
+
+def _serie(fechas, valores, tam_bloque=1_000):
+    texto = "fecha,temperatura\n" + "".join(f"{fecha},{valor}\n" for fecha, valor in zip(fechas, valores))
+    return leer_serie_csv(io.StringIO(texto), tam_bloque=tam_bloque)
+
+
+def test_sustrato_constante_igual_que_sin_serie():
+    temp_amb = np.linspace(-5, 15, len(FECHAS))
+    temp_sus = np.full(len(FECHAS), ENTRADAS_POR_DEFECTO["temp_sustrato_entrada_c"])
+    sin_serie = simular_balance_horario(ENTRADAS_POR_DEFECTO, _serie(FECHAS, temp_amb))
+    con_serie = simular_balance_horario(ENTRADAS_POR_DEFECTO, _serie(FECHAS, temp_amb, 7), _serie(FECHAS, temp_sus, 7))
+    for clave in ("n_pasos", "horas_deficit", "deficit_total_mj", "demanda_total_mj", "suministro_total_mj"):
+        assert con_serie[clave] == pytest.approx(sin_serie[clave]), clave
+
+
+def test_fechas_distintas_en_sustrato():
+    temp = np.full(len(FECHAS), 10.0)
+    desplazadas = FECHAS.copy()
+    desplazadas[30:] += np.timedelta64(1, "h")
+    with pytest.raises(ValueError, match=r"no tienen las mismas fechas \(registro 2023-01-02T06:00:00"):
+        simular_balance_horario(ENTRADAS_POR_DEFECTO, _serie(FECHAS, temp, 20), _serie(desplazadas, temp, 20))
+
+
+def test_longitudes_distintas_en_sustrato():
+    temp = np.full(len(FECHAS), 10.0)
+    with pytest.raises(ValueError, match="no tienen la misma longitud"):
+        simular_balance_horario(ENTRADAS_POR_DEFECTO, _serie(FECHAS, temp), _serie(FECHAS[:-1], temp[:-1]))
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from balance_biogas.calculos import ENTRADAS_POR_DEFECTO, LIMITES_FISICOS
+from balance_biogas.montecarlo import iterar_escenarios_montecarlo, simular_montecarlo
+
+DISTRIBUCIONES = {
+    "bmp_nm3_ch4_kg_sv": {"tipo": "triangular", "min": 0.25, "moda": 0.35, "max": 0.42},
+    "st_porcentaje": {"tipo": "normal", "media": 95.0, "desviacion": 10.0},  # se sale de 0-100
+    "ch4_en_biogas_porcentaje": {"tipo": "normal", "media": 5.0, "desviacion": 10.0},
+    "caudal_sustrato_kg_dia": {"tipo": "uniforme", "min": 5_000.0, "max": 15_000.0},
+}
+
+
+@pytest.mark.parametrize("procesos", [None, 2])
+def test_misma_semilla_mismo_resultado(procesos):
+    en_serie = simular_montecarlo(ENTRADAS_POR_DEFECTO, DISTRIBUCIONES, n_muestras=10_000, semilla=7, tam_bloque=3_000, procesos=1)
+    assert simular_montecarlo(
+        ENTRADAS_POR_DEFECTO, DISTRIBUCIONES, n_muestras=10_000, semilla=7, tam_bloque=3_000, procesos=procesos,
+    ) == en_serie
+    otra_semilla = simular_montecarlo(ENTRADAS_POR_DEFECTO, DISTRIBUCIONES, n_muestras=10_000, semilla=8, tam_bloque=3_000, procesos=1)
+    assert otra_semilla["electricidad_neta_exportable_kwh_dia"] != en_serie["electricidad_neta_exportable_kwh_dia"]
+
+
+def test_muestras_acotadas_a_limites_fisicos():
+    bloques = list(iterar_escenarios_montecarlo(ENTRADAS_POR_DEFECTO, DISTRIBUCIONES, n_muestras=10_000, semilla=7, tam_bloque=3_000))
+    assert sum(len(bloque["st_porcentaje"]) for bloque in bloques) == 10_000
+    for clave in ("st_porcentaje", "ch4_en_biogas_porcentaje"):
+        valores = np.concatenate([bloque[clave] for bloque in bloques])
+        minimo, maximo = LIMITES_FISICOS[clave]
+        assert valores.min() == minimo or valores.max() == maximo, clave  # el recorte ha actuado
+        assert np.all((valores >= minimo) & (valores <= maximo)), clave
+
+
+def test_escenarios_exportados_coinciden_con_resumen():
+    resumen = simular_montecarlo(ENTRADAS_POR_DEFECTO, DISTRIBUCIONES, n_muestras=5_000, semilla=3, tam_bloque=2_000, procesos=1)
+    bloques = iterar_escenarios_montecarlo(ENTRADAS_POR_DEFECTO, DISTRIBUCIONES, n_muestras=5_000, semilla=3, tam_bloque=2_000)
+    electricidad = np.concatenate([bloque["electricidad_neta_exportable_kwh_dia"] for bloque in bloques])
+    assert resumen["electricidad_neta_exportable_kwh_dia"]["P50"] == np.percentile(electricidad, 50)
+    assert resumen["prob_deficit_electrico"] == np.count_nonzero(electricidad < 0) / 5_000
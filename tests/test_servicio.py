@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+import pytest
+
+from balance_biogas.calculos import CLAVES_DIMENSIONES, CLAVES_RESULTADOS, ENTRADAS_POR_DEFECTO, calcular_dimensiones_digestor, realizar_calculos_balance
+from balance_biogas.servicio import AgrupadorLotes, ServicioBalance
+
+
+def _escalar(entradas):
+    dimensiones = calcular_dimensiones_digestor(entradas["caudal_sustrato_kg_dia"], entradas["trh_dias"])
+    return dict(dimensiones, **realizar_calculos_balance(dict(entradas, area_superficial_digestor_m2=dimensiones["area_superficial_digestor_m2"])))
+
+
+async def _peticiones(servicio, ruta, cuerpos):
+    """Envía las peticiones a la vez (``bytes`` tal cual; el resto, como JSON)."""
+    return await asyncio.gather(*(
+        servicio.despachar("POST", ruta, "", cuerpo if isinstance(cuerpo, bytes) else json.dumps(cuerpo).encode()) for cuerpo in cuerpos
+    ))
+
+
+def test_peticiones_agrupadas_igual_que_escalar():
+    plantas = [
+        dict(ENTRADAS_POR_DEFECTO, caudal_sustrato_kg_dia=caudal, uso_biogas_opcion_idx=uso)
+        for caudal, uso in ((2_000.0, 0), (15_000.0, 1), (40_000.0, 2), (8_000.0, 0))
+    ]
+    servicio = ServicioBalance(ventana_s=0.05)
+    respuestas = asyncio.run(_peticiones(servicio, "/balance", plantas))
+    assert servicio.agrupadores["/balance"].lotes == 1
+    for planta, (codigo, contenido, _) in zip(plantas, respuestas):
+        assert codigo == 200
+        esperado = _escalar(planta)
+        for clave in (*CLAVES_DIMENSIONES, *CLAVES_RESULTADOS):
+            assert contenido[clave] == pytest.approx(esperado[clave], rel=1e-12, abs=1e-9), clave
+
+
+def test_entradas_no_validas_devuelven_400():
+    servicio = ServicioBalance(ventana_s=0.01)
+    cuerpos = [b"{no es json", b'{"caudal_sustrato_kg_dia": "mucho"}', b'[{"trh_dias": 30}, {"trh_dias": "x"}]', b"[1]"]
+    respuestas = asyncio.run(_peticiones(servicio, "/balance", cuerpos))
+    assert [codigo for codigo, _, _ in respuestas] == [400, 400, 400, 400]
+    assert respuestas[1][1]["error"].startswith("Fila 1: valor no numérico para 'caudal_sustrato_kg_dia'")
+    assert respuestas[2][1]["error"].startswith("Fila 2:")
+    assert asyncio.run(servicio.despachar("GET", "/balance", "", b""))[0] == 405
+
+
+def _evaluar_dobles(filas):
+    if any(fila.get("malo") for fila in filas):
+        raise ValueError("fila mala")
+    return [2 * fila["x"] for fila in filas]
+
+
+async def _enviar_todas(agrupador, filas):
+    return await asyncio.gather(*(agrupador.enviar(fila) for fila in filas), return_exceptions=True)
+
+
+@pytest.mark.parametrize("filas_en_hilo", [1_000, 1])
+def test_lote_fallido_se_evalua_fila_a_fila(filas_en_hilo):
+    agrupador = AgrupadorLotes(_evaluar_dobles, ventana_s=0.01, filas_en_hilo=filas_en_hilo)
+    resultados = asyncio.run(_enviar_todas(agrupador, [{"x": 1}, {"x": 2, "malo": True}, {"x": 3}]))
+    assert agrupador.lotes == 1
+    assert resultados[0] == 2 and resultados[2] == 6
+    assert isinstance(resultados[1], ValueError) and str(resultados[1]) == "fila mala"
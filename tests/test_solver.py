@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from balance_biogas.calculos import ENTRADAS_POR_DEFECTO, calcular_dimensiones_digestor, realizar_calculos_balance
+from balance_biogas.solver import resolver_equilibrio, resolver_equilibrio_lote
+
+FRIO = dict(ENTRADAS_POR_DEFECTO, u_digestor_w_m2_k=5.0, temp_ambiente_promedio_c=-10.0)
+
+
+def _balance(entradas):
+    area = calcular_dimensiones_digestor(entradas["caudal_sustrato_kg_dia"], entradas["trh_dias"])["area_superficial_digestor_m2"]
+    return realizar_calculos_balance(dict(entradas, area_superficial_digestor_m2=area))
+
+
+@pytest.mark.parametrize("entradas, variable, salida, objetivo", [
+    (ENTRADAS_POR_DEFECTO, "u_digestor_w_m2_k", "calor_neto_disponible_mj_dia", 0.0),
+    (FRIO, "trh_dias", "calor_neto_disponible_mj_dia", 0.0),
+    (FRIO, "chp_eficiencia_termica_porcentaje", "calor_neto_disponible_mj_dia", 0.0),
+    (ENTRADAS_POR_DEFECTO, "chp_eficiencia_electrica_porcentaje", "electricidad_neta_exportable_kwh_dia", 1_000.0),
+])
+def test_equilibrio_lleva_la_salida_al_objetivo(entradas, variable, salida, objetivo):
+    resultado = resolver_equilibrio(entradas, variable, salida, objetivo)
+    assert resultado["valor_equilibrio"] is not None
+    escala = abs(_balance(entradas)[salida]) + abs(objetivo)
+    assert _balance(dict(entradas, **{variable: resultado["valor_equilibrio"]}))[salida] == pytest.approx(objetivo, abs=1e-6 * escala)
+    # El equilibrio es uno de los extremos del rango factible
+    assert resultado["valor_equilibrio"] in (resultado["factible_min"], resultado["factible_max"])
+
+
+def test_sin_cruce_dentro_de_los_limites():
+    # Siempre se cumple: todo el intervalo es factible
+    assert resolver_equilibrio(ENTRADAS_POR_DEFECTO, "trh_dias") == {"valor_equilibrio": None, "factible_min": 1.0, "factible_max": 200.0}
+    # Nunca se cumple: ni equilibrio ni rango factible
+    assert resolver_equilibrio(ENTRADAS_POR_DEFECTO, "u_digestor_w_m2_k", objetivo=1e12) == {
+        "valor_equilibrio": None, "factible_min": None, "factible_max": None,
+    }
+
+
+def test_objetivo_en_los_extremos_de_busqueda():
+    limites = (0.0, 10.0)
+    extremos = [_balance(dict(ENTRADAS_POR_DEFECTO, u_digestor_w_m2_k=u))["calor_neto_disponible_mj_dia"] for u in limites]
+    # El calor neto baja con la U: con el objetivo en el valor del límite inferior, solo ese punto es factible
+    en_minimo = resolver_equilibrio(ENTRADAS_POR_DEFECTO, "u_digestor_w_m2_k", objetivo=extremos[0], limites=limites)
+    assert en_minimo == {"valor_equilibrio": 0.0, "factible_min": 0.0, "factible_max": 0.0}
+    # Con el del límite superior se cumple en todo el intervalo y no hay cruce
+    en_maximo = resolver_equilibrio(ENTRADAS_POR_DEFECTO, "u_digestor_w_m2_k", objetivo=extremos[1], limites=limites)
+    assert en_maximo == {"valor_equilibrio": None, "factible_min": 0.0, "factible_max": 10.0}
+
+
+def test_lote_igual_que_escalar():
+    temp_ambiente = np.array([-20.0, -10.0, 0.0, 10.0, 25.0])
+    lote = resolver_equilibrio_lote(dict(FRIO, temp_ambiente_promedio_c=temp_ambiente), "trh_dias")
+    for i, temp in enumerate(temp_ambiente):
+        escalar = resolver_equilibrio(dict(FRIO, temp_ambiente_promedio_c=temp), "trh_dias")
+        for clave, valor in escalar.items():
+            assert (np.isnan(lote[clave][i]) if valor is None else lote[clave][i] == pytest.approx(valor, abs=1e-8)), (i, clave)
+
+
+def test_argumentos_no_validos():
+    with pytest.raises(ValueError, match="Variable libre desconocida"):
+        resolver_equilibrio(ENTRADAS_POR_DEFECTO, "st_porcentaje")
+    with pytest.raises(ValueError, match="Salida objetivo desconocida"):
+        resolver_equilibrio(ENTRADAS_POR_DEFECTO, "trh_dias", salida="biogas_bruto_nm3_dia")
+    with pytest.raises(ValueError, match="límite inferior"):
+        resolver_equilibrio(ENTRADAS_POR_DEFECTO, "trh_dias", limites=(50.0, 10.0))
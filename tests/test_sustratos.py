@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from balance_biogas.sustratos import CatalogoSustratos, buscar_mezcla_optima, evaluar_mezclas
+
+PROPIEDADES = ("st_porcentaje", "sv_de_st_porcentaje", "bmp_nm3_ch4_kg_sv", "cp_sustrato_kj_kg_c")
+
+
+def test_mezcla_de_un_sustrato_reproduce_sus_propiedades():
+    catalogo = CatalogoSustratos.referencia()
+    # Cada fila es un sustrato puro, en fracción 1 o mezclado con un 0 % de otro
+    puros = evaluar_mezclas(catalogo, np.eye(len(catalogo)))
+    con_cero = evaluar_mezclas(catalogo, np.c_[np.full(len(catalogo), 3.0), np.zeros(len(catalogo))],
+                               np.c_[np.arange(len(catalogo)), np.roll(np.arange(len(catalogo)), 1)])
+    for i, nombre in enumerate(catalogo.nombres):
+        esperado = catalogo.propiedades(nombre)
+        for clave in PROPIEDADES:
+            assert puros[clave][i] == pytest.approx(esperado[clave], rel=1e-14), (nombre, clave)
+            assert con_cero[clave][i] == pytest.approx(esperado[clave], rel=1e-14), (nombre, clave)
+
+
+def test_mezcla_pondera_por_masa_sv_y_st():
+    catalogo = CatalogoSustratos.referencia()
+    indices = catalogo.indices(["Purín de cerdo", "Ensilado de maíz"])
+    mezcla = {clave: float(valor[0]) for clave, valor in evaluar_mezclas(catalogo, [3.0, 1.0], indices).items()}
+    st = 0.75 * 5.0 + 0.25 * 33.0
+    sv = 0.75 * 5.0 * 0.75 + 0.25 * 33.0 * 0.95
+    assert mezcla["st_porcentaje"] == pytest.approx(st)
+    assert mezcla["sv_de_st_porcentaje"] == pytest.approx(100 * sv / st)
+    assert mezcla["bmp_nm3_ch4_kg_sv"] == pytest.approx((0.75 * 5.0 * 0.75 * 0.30 + 0.25 * 33.0 * 0.95 * 0.34) / sv)
+
+
+@pytest.mark.parametrize("fracciones", [[0.0, 0.0], [0.5, -0.1]])
+def test_fracciones_no_validas(fracciones):
+    with pytest.raises(ValueError, match="no negativas"):
+        evaluar_mezclas(CatalogoSustratos.referencia(), fracciones, [0, 1])
+
+
+def test_busqueda_determinista_y_factible():
+    catalogo = CatalogoSustratos.referencia()
+    nombres = ["Purín de vacuno", "Ensilado de maíz", "Glicerina bruta"]
+    argumentos = dict(masa_max_kg_dia=[50_000.0, 8_000.0, 1_500.0], st_max_porcentaje=15.0, n_candidatos=20_000, semilla=11)
+    primera = buscar_mezcla_optima(catalogo, nombres, 40_000.0, **argumentos)
+    assert buscar_mezcla_optima(catalogo, nombres, 40_000.0, **argumentos) == primera
+    assert buscar_mezcla_optima(catalogo, nombres, 40_000.0, **dict(argumentos, semilla=12)) != primera
+    assert sum(primera["masas_kg_dia"].values()) == pytest.approx(40_000.0)
+    assert all(primera["masas_kg_dia"][nombre] <= maximo for nombre, maximo in zip(nombres, argumentos["masa_max_kg_dia"]))
+    assert primera["propiedades"]["st_porcentaje"] <= 15.0
+
+
+def test_busqueda_sin_mezcla_factible():
+    catalogo = CatalogoSustratos.referencia()
+    assert buscar_mezcla_optima(catalogo, ["Paja de cereal", "Glicerina bruta"], 1_000.0, st_max_porcentaje=10.0, n_candidatos=1_000) is None
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from balance_biogas.calculos import ENTRADAS_POR_DEFECTO
+from balance_biogas.transitorio import CLAVES_TRANSITORIO, simular_transitorio, simular_transitorio_lote
+
+
+def _comparar(lote, escalares):
+    for i, escalar in enumerate(escalares):
+        for clave in CLAVES_TRANSITORIO:
+            np.testing.assert_allclose(lote[clave][i], escalar[clave], rtol=1e-9, atol=1e-9, err_msg=clave)
+
+
+@pytest.mark.parametrize("n_digestores", [4, 5])  # 4 = número de pasos: la columna no debe tomarse como serie
+def test_lote_con_columnas_por_digestor_igual_que_escalar(n_digestores):
+    rng = np.random.default_rng(n_digestores)
+    columnas = dict(
+        ENTRADAS_POR_DEFECTO,
+        caudal_sustrato_kg_dia=rng.uniform(2_000, 40_000, n_digestores),
+        temp_ambiente_promedio_c=rng.uniform(-5, 25, n_digestores),
+        temp_sustrato_entrada_c=rng.uniform(5, 20, n_digestores),
+    )
+    lote = simular_transitorio_lote(columnas, duracion_dias=1, paso_minutos=360, temp_inicial_c=20.0, potencia_calefaccion_kw=80.0)
+    escalares = [
+        simular_transitorio({clave: np.asarray(valor).reshape(-1)[i] if np.ndim(valor) else valor for clave, valor in columnas.items()},
+                            duracion_dias=1, paso_minutos=360, temp_inicial_c=20.0, potencia_calefaccion_kw=80.0)
+        for i in range(n_digestores)
+    ]
+    _comparar(lote, escalares)
+
+
+def test_lote_con_series_igual_que_escalar():
+    n_pasos = 24 * 7
+    rng = np.random.default_rng(0)
+    temp_ambiente = 10 + 8 * np.sin(np.arange(n_pasos) / 24 * 2 * np.pi) + rng.normal(0, 1, n_pasos)
+    alimentacion = np.where((np.arange(n_pasos) >= 48) & (np.arange(n_pasos) < 72), 0.0, 1.0)
+    caudales = np.array([5_000.0, 12_000.0, 30_000.0])
+    lote = simular_transitorio_lote(dict(ENTRADAS_POR_DEFECTO, caudal_sustrato_kg_dia=caudales), temp_ambiente=temp_ambiente,
+                                    alimentacion=alimentacion, paso_minutos=60, temp_inicial_c=15.0)
+    escalares = [
+        simular_transitorio(dict(ENTRADAS_POR_DEFECTO, caudal_sustrato_kg_dia=caudal), temp_ambiente=temp_ambiente,
+                            alimentacion=alimentacion, paso_minutos=60, temp_inicial_c=15.0)
+        for caudal in caudales
+    ]
+    _comparar(lote, escalares)
+
+
+def test_cierre_del_balance_de_energia():
+    resultado = simular_transitorio(dict(ENTRADAS_POR_DEFECTO), duracion_dias=3, paso_minutos=10, temp_inicial_c=20.0)
+    variacion_mj = resultado["capacidad_termica_mj_c"] * (resultado["temp_final_c"] - 20.0)
+    assert resultado["energia_calefaccion_mj"] == pytest.approx(
+        resultado["perdidas_calor_mj"] + resultado["calor_calentar_sustrato_mj"] + variacion_mj, rel=1e-9)
@@ -0,0 +1,85 @@
+import math
+
+import numpy as np
+import pytest
+
+from balance_biogas.cli import filas_a_columnas
+from balance_biogas.exportar import generar_excel_bytes, generar_pdf_bytes
+from balance_biogas.servicio import validar_planta
+from balance_biogas.upgrading import (
+    CLAVES_UPGRADING, RELACION_MAX_ETAPA, TECNOLOGIAS_UPGRADING, calcular_upgrading, calcular_upgrading_lote,
+    energia_compresion_kwh_nm3, nombre_tecnologia_upgrading, tecnologia_upgrading, tecnologia_valida,
+)
+
+
+def test_lote_igual_que_escalar():
+    rng = np.random.default_rng(0)
+    n = 200
+    biogas = rng.uniform(0, 10_000, n)
+    ch4 = biogas * rng.uniform(0.4, 0.75, n)
+    indices = rng.integers(0, len(TECNOLOGIAS_UPGRADING), n).astype(float)
+    presion = rng.uniform(0, 80, n)  # incluye presiones por debajo de la salida de cada tecnología
+    lote = calcular_upgrading_lote(biogas, ch4, indices, presion)
+    for i in range(n):
+        escalar = calcular_upgrading(biogas[i], ch4[i], indices[i], presion[i])
+        for clave in CLAVES_UPGRADING:
+            np.testing.assert_allclose(lote[clave][i], escalar[clave], rtol=1e-12, atol=1e-12, err_msg=f"fila {i}: {clave}")
+
+
+def test_lote_difunde_escalares():
+    lote = calcular_upgrading_lote(np.array([1_000.0, 2_000.0]), np.array([600.0, 1_200.0]), 3, 16.0)
+    assert lote["calor_upgrading_mj_dia"].tolist() == pytest.approx([1_980.0, 3_960.0])
+
+
+@pytest.mark.parametrize("entrada, salida", [(12.0, 12.0), (12.0, 5.0), (0.0, 16.0), (-1.0, 16.0)])
+def test_sin_compresion(entrada, salida):
+    assert energia_compresion_kwh_nm3(entrada, salida) == 0.0
+
+
+def test_etapas_de_compresion():
+    # Hasta RELACION_MAX_ETAPA una sola etapa; por encima, la refrigeración intermedia reduce el trabajo frente a una etapa
+    una_etapa = energia_compresion_kwh_nm3(1.0, RELACION_MAX_ETAPA)
+    exponente = (1.31 - 1) / 1.31
+    assert una_etapa == pytest.approx(101.325 * 293.15 / 273.15 / exponente * (RELACION_MAX_ETAPA**exponente - 1) / 0.70 / 3600)
+    dos_etapas = energia_compresion_kwh_nm3(1.0, RELACION_MAX_ETAPA * 2)
+    sin_refrigerar = 101.325 * 293.15 / 273.15 / exponente * ((RELACION_MAX_ETAPA * 2)**exponente - 1) / 0.70 / 3600
+    assert una_etapa < dos_etapas < sin_refrigerar
+    # El trabajo solo depende de la relación de presiones
+    assert energia_compresion_kwh_nm3(2.0, 16.0) == pytest.approx(energia_compresion_kwh_nm3(1.0, 8.0))
+
+
+def test_balance_de_metano():
+    for idx, tecnologia in enumerate(TECNOLOGIAS_UPGRADING):
+        resultado = calcular_upgrading(1_000.0, 600.0, idx, 16.0)
+        perdido = 600.0 * tecnologia["perdida_ch4_porcentaje"] / 100
+        assert resultado["ch4_perdido_upgrading_nm3_dia"] == pytest.approx(perdido)
+        assert resultado["biometano_neto_nm3_dia"] * tecnologia["pureza_ch4_porcentaje"] / 100 == pytest.approx(600.0 - perdido)
+
+
+@pytest.mark.parametrize("idx", [-1, 4, 1.5, math.nan, math.inf])
+def test_indice_no_valido(idx):
+    assert not tecnologia_valida(idx)
+    with pytest.raises(ValueError, match="Tecnología de upgrading desconocida"):
+        tecnologia_upgrading(idx)
+    with pytest.raises(ValueError, match="Tecnología de upgrading desconocida"):
+        nombre_tecnologia_upgrading(idx)
+    with pytest.raises(ValueError, match="Tecnología de upgrading desconocida"):
+        calcular_upgrading_lote([1_000.0, 1_000.0], [600.0, 600.0], [0.0, idx], 16.0)
+
+
+def test_indice_no_valido_se_detecta_por_fila():
+    filas = [{"upgrading_tecnologia_idx": "1"}, {"upgrading_tecnologia_idx": "7"}]
+    with pytest.raises(ValueError, match=r"^Fila 2: tecnología de upgrading desconocida"):
+        filas_a_columnas(filas)
+    with pytest.raises(ValueError, match=r"^Fila 3: tecnología de upgrading desconocida"):
+        validar_planta({"upgrading_tecnologia_idx": 2.5}, n_fila=3)
+    assert validar_planta({"upgrading_tecnologia_idx": 3}) == {"upgrading_tecnologia_idx": 3}
+
+
+@pytest.mark.parametrize("generar", [generar_excel_bytes, generar_pdf_bytes])
+def test_informes_con_indice_no_valido(generar):
+    proyecto = {"nombre": "Prueba", "fecha": "2025-01-01", "analista": "-"}
+    entradas = {"uso_biogas_opcion_idx": 2, "upgrading_tecnologia_idx": 3}
+    assert generar(entradas, {}, {}, proyecto)
+    with pytest.raises(ValueError, match="Tecnología de upgrading desconocida: 7"):
+        generar(dict(entradas, upgrading_tecnologia_idx=7), {}, {}, proyecto)
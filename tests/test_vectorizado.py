@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from balance_biogas.calculos import (
+    CLAVES_DIMENSIONES, CLAVES_RESULTADOS, ENTRADAS_POR_DEFECTO, calcular_dimensiones_digestor, realizar_calculos_balance,
+)
+from balance_biogas.vectorizado import calcular_dimensiones_digestor_lote, evaluar_escenarios_lote, realizar_calculos_balance_lote
+
+
+def _columnas_aleatorias(n, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return dict(
+        ENTRADAS_POR_DEFECTO,
+        caudal_sustrato_kg_dia=rng.uniform(0, 50_000, n),
+        st_porcentaje=rng.uniform(2, 40, n),
+        sv_de_st_porcentaje=rng.uniform(50, 95, n),
+        bmp_nm3_ch4_kg_sv=rng.uniform(0.1, 0.6, n),
+        eficiencia_digestion_porcentaje=rng.uniform(40, 95, n),
+        ch4_en_biogas_porcentaje=rng.uniform(0, 75, n),
+        temp_op_digestor_c=rng.uniform(30, 55, n),
+        temp_sustrato_entrada_c=rng.uniform(0, 30, n),
+        u_digestor_w_m2_k=rng.uniform(0.2, 1.5, n),
+        temp_ambiente_promedio_c=rng.uniform(-15, 60, n),  # incluye filas con el ambiente por encima del digestor
+        uso_biogas_opcion_idx=rng.integers(0, 4, n).astype(float),  # 3 = sin conversión
+        upgrading_tecnologia_idx=rng.integers(0, 4, n).astype(float),
+        presion_inyeccion_bar=rng.uniform(0, 60, n),
+        trh_dias=rng.uniform(0, 60, n),
+    )
+
+
+def _fila(columnas, i):
+    return {clave: float(valor[i]) if np.ndim(valor) else valor for clave, valor in columnas.items()}
+
+
+def _escalar(entradas):
+    dimensiones = calcular_dimensiones_digestor(entradas["caudal_sustrato_kg_dia"], entradas["trh_dias"])
+    return dict(dimensiones, **realizar_calculos_balance(dict(entradas, area_superficial_digestor_m2=dimensiones["area_superficial_digestor_m2"])))
+
+
+def _comparar(lote, columnas, n):
+    for i in range(n):
+        escalar = _escalar(_fila(columnas, i))
+        for clave in (*CLAVES_DIMENSIONES, *CLAVES_RESULTADOS):
+            # La raíz cúbica del diámetro puede diferir en el último bit respecto a math
+            np.testing.assert_allclose(lote[clave][i], escalar[clave], rtol=1e-12, atol=1e-9, err_msg=f"fila {i}: {clave}")
+
+
+def test_lote_igual_que_escalar_en_filas_aleatorias():
+    n = 500
+    columnas = _columnas_aleatorias(n)
+    _comparar(evaluar_escenarios_lote(columnas), columnas, n)
+
+
+def test_protecciones_frente_a_cero():
+    columnas = dict(
+        ENTRADAS_POR_DEFECTO,
+        caudal_sustrato_kg_dia=np.array([0.0, 10_000.0, 10_000.0, 10_000.0, 10_000.0]),
+        ch4_en_biogas_porcentaje=np.array([60.0, 0.0, 60.0, 60.0, 60.0]),
+        temp_ambiente_promedio_c=np.array([10.0, 10.0, 38.0, 45.0, 10.0]),  # delta_t = 0 y < 0
+        trh_dias=np.array([30.0, 30.0, 30.0, 30.0, 0.0]),  # área 0
+    )
+    lote = evaluar_escenarios_lote(columnas)
+    assert lote["area_superficial_digestor_m2"][0] == 0.0 and lote["diametro_digestor_m"][0] == 0.0
+    assert lote["biogas_producido_nm3_dia"][1] == 0.0
+    assert lote["perdidas_calor_digestor_mj_dia"][2] == 0.0
+    assert lote["perdidas_calor_digestor_mj_dia"][3] == 0.0
+    assert lote["area_superficial_digestor_m2"][4] == 0.0 and lote["perdidas_calor_digestor_mj_dia"][4] == 0.0
+    assert all(np.all(np.isfinite(valores)) for valores in lote.values())
+    _comparar(lote, columnas, 5)
+
+
+@pytest.mark.parametrize("uso", [0, 1, 2, 3, -1])
+def test_ramas_de_uso_del_biogas(uso):
+    columnas = dict(ENTRADAS_POR_DEFECTO, caudal_sustrato_kg_dia=np.array([5_000.0, 20_000.0]), uso_biogas_opcion_idx=uso)
+    lote = evaluar_escenarios_lote(columnas)
+    _comparar(lote, columnas, 2)
+    assert np.all((lote["electricidad_generada_bruta_kwh_dia"] > 0) == (uso == 0))
+    assert np.all((lote["calor_util_generado_mj_dia"] > 0) == (uso in (0, 1)))
+    assert np.all((lote["biometano_neto_nm3_dia"] > 0) == (uso == 2))
+
+
+def test_entradas_opcionales_ausentes():
+    entradas = {clave: valor for clave, valor in ENTRADAS_POR_DEFECTO.items()
+                if clave not in ("chp_eficiencia_electrica_porcentaje", "chp_eficiencia_termica_porcentaje", "caldera_eficiencia_porcentaje",
+                                 "upgrading_tecnologia_idx", "presion_inyeccion_bar")}
+    entradas["area_superficial_digestor_m2"] = 400.0
+    for uso in (0, 1, 2):
+        entradas["uso_biogas_opcion_idx"] = uso
+        lote = realizar_calculos_balance_lote(entradas)
+        escalar = realizar_calculos_balance(entradas)
+        for clave in CLAVES_RESULTADOS:
+            np.testing.assert_allclose(lote[clave][0], escalar[clave], rtol=1e-12, err_msg=clave)
+
+
+def test_dimensiones_difunden_escalares():
+    dimensiones = calcular_dimensiones_digestor_lote(np.array([1_000.0, 8_000.0]), 25.0)
+    for i, caudal in enumerate((1_000.0, 8_000.0)):
+        escalar = calcular_dimensiones_digestor(caudal, 25.0)
+        for clave in CLAVES_DIMENSIONES:
+            np.testing.assert_allclose(dimensiones[clave][i], escalar[clave], rtol=1e-12, err_msg=clave)